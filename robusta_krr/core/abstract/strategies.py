@@ -2,17 +2,20 @@ from __future__ import annotations
 
 import abc
 import datetime
+from dataclasses import dataclass
 from textwrap import dedent
-from typing import TYPE_CHECKING, Annotated, Generic, Literal, Optional, Sequence, TypeVar, get_args
+from typing import TYPE_CHECKING, Annotated, Generic, Iterable, Literal, Optional, Sequence, TypeVar, Union, get_args
 
 import numpy as np
 import pydantic as pd
 from numpy.typing import NDArray
 
+from robusta_krr.core.abstract.timeseries import SteppedSeries
 from robusta_krr.core.models.result import K8sObjectData, ResourceType
+from robusta_krr.utils.sketch import DDSketch
 
 if TYPE_CHECKING:
-    from robusta_krr.core.abstract.metrics import BaseMetric  # noqa: F401
+    from robusta_krr.core.abstract.metrics import BaseMetric
     from robusta_krr.core.integrations.prometheus.metrics import PrometheusMetric
 
 SelfRR = TypeVar("SelfRR", bound="ResourceRecommendation")
@@ -50,6 +53,13 @@ class StrategySettings(pd.BaseModel):
         24 * 7 * 2, ge=1, description="The duration of the history data to use (in hours)."
     )
     timeframe_duration: float = pd.Field(1.25, gt=0, description="The step for the history data (in minutes).")
+    points_required: int = pd.Field(
+        100, ge=1, description="The number of data points required to make a recommendation for a resource."
+    )
+    allow_hpa: bool = pd.Field(
+        False,
+        description="Whether to calculate recommendations even when there is an HPA scaler defined on that resource.",
+    )
 
     @property
     def history_timedelta(self) -> datetime.timedelta:
@@ -69,9 +79,183 @@ class StrategySettings(pd.BaseModel):
 ArrayNx2 = Annotated[NDArray[np.float64], Literal["N", 2]]
 
 
-PodsTimeData = dict[str, ArrayNx2]  # Mapping: pod -> [(time, value)]
+# Loaded metrics are SteppedSeries, which can be used the same way as ArrayNx2 (see SteppedSeries),
+# or DDSketch of the values for the sketched metrics (see SketchedMetric)
+PodsTimeData = dict[str, Union[ArrayNx2, SteppedSeries, DDSketch]]  # Mapping: pod -> [(time, value)]
 MetricsPodData = dict[str, PodsTimeData]
 
+
+class RaggedArray:
+    """The values of a metric for many objects, concatenated into a single flat array.
+
+    The values of the i-th object (the values of all its pods, pod after pod) are `values[offsets[i]:offsets[i + 1]]`.
+    Timestamps are dropped, as the reductions do not depend on the order of the values.
+    The reductions are evaluated for all the objects at once, returning an array with a value for each object.
+    """
+
+    def __init__(self, values: NDArray[np.float64], offsets: NDArray[np.intp]) -> None:
+        self.values = values
+        self.offsets = offsets
+
+    @classmethod
+    def from_pods_data(cls, data: Sequence[PodsTimeData]) -> RaggedArray:
+        pods_values = [values[:, 1] for pods_data in data for values in pods_data.values()]
+        offsets = np.zeros(len(data) + 1, dtype=np.intp)
+        np.cumsum([sum(len(values) for values in pods_data.values()) for pods_data in data], out=offsets[1:])
+        return cls(np.concatenate(pods_values) if pods_values else np.empty(0), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def lengths(self) -> NDArray[np.intp]:
+        return np.diff(self.offsets)
+
+    def _reduce(self, ufunc: np.ufunc, empty: float) -> NDArray[np.float64]:
+        result = np.full(len(self), empty, dtype=np.float64)
+        filled = self.lengths > 0
+        if filled.any():
+            # NOTE: reduceat reduces up to the next index, so the empty segments have to be skipped
+            result[filled] = ufunc.reduceat(self.values, self.offsets[:-1][filled])
+        return result
+
+    def max(self) -> NDArray[np.float64]:
+        """The maximum of each object, NaN for the objects without values."""
+
+        return self._reduce(np.maximum, float("NaN"))
+
+    def sum(self) -> NDArray[np.float64]:
+        """The sum of each object, 0 for the objects without values."""
+
+        return self._reduce(np.add, 0.0)
+
+    def percentile(self, percentile: float) -> NDArray[np.float64]:
+        """The percentile of each object, interpolated linearly like `np.percentile`. NaN for the objects without values."""
+
+        lengths = self.lengths
+        result = np.full(len(self), float("NaN"))
+        filled = lengths > 0
+        if not filled.any():
+            return result
+
+        # Sorting by the object, then by the value, orders the values within each object with a single sort
+        ordered = self.values[np.lexsort((self.values, np.repeat(np.arange(len(self)), lengths)))]
+
+        position = self.offsets[:-1][filled] + (lengths[filled] - 1) * (percentile / 100)
+        lower = np.floor(position).astype(np.intp)
+        upper = np.minimum(lower + 1, self.offsets[1:][filled] - 1)
+        result[filled] = ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+        return result
+
+
+class SketchArray:
+    """The sketches of a sketched metric (see `SketchedMetric`) for many objects, the sketches of the pods of each
+    object merged into a single one. It provides the same `lengths` and `percentile` as `RaggedArray`.
+    """
+
+    def __init__(self, sketches: Sequence[DDSketch]) -> None:
+        self.sketches = sketches
+
+    @classmethod
+    def from_pods_data(cls, data: Sequence[PodsTimeData]) -> SketchArray:
+        return cls([DDSketch.merged(pods_data.values()) for pods_data in data])  # type: ignore
+
+    def __len__(self) -> int:
+        return len(self.sketches)
+
+    @property
+    def lengths(self) -> NDArray[np.intp]:
+        return np.array([sketch.count for sketch in self.sketches], dtype=np.intp)
+
+    def percentile(self, percentile: float) -> NDArray[np.float64]:
+        """The estimated percentile of each object (see `DDSketch.quantile`). NaN for the objects without values."""
+
+        return np.array([sketch.percentile(percentile) for sketch in self.sketches], dtype=np.float64)
+
+
+BatchMetricsData = dict[str, Union[RaggedArray, SketchArray]]
+
+
+def concatenate_metrics(history_data: Sequence[MetricsPodData]) -> BatchMetricsData:
+    """Concatenates the metrics of many objects, for `BaseStrategy.run_batch`. The sketches are merged instead."""
+
+    names = {name: None for data in history_data for name in data}
+    result: BatchMetricsData = {}
+    for name in names:
+        pods_data = [data.get(name, {}) for data in history_data]
+        sketched = any(isinstance(values, DDSketch) for data in pods_data for values in data.values())
+        result[name] = SketchArray.from_pods_data(pods_data) if sketched else RaggedArray.from_pods_data(pods_data)
+    return result
+
+
+# The key of the single value of the reductions over all the pods of a workload
+WORKLOAD_REDUCTION_KEY = "*"
+
+
+@dataclass(frozen=True)
+class Reduction:
+    """
+    A declarative reduction of the samples of a range metric to a single value, of each pod or of the whole workload.
+
+    Strategies declare the reductions they need (see `BaseStrategy.reductions`) instead of loading all the samples.
+    The reductions are pushed down into the metrics backend when it supports them (e.g. `quantile_over_time`),
+    otherwise the samples are loaded and reduced client-side by `reduce`, with the same result:
+    a single `[timestamp, value]` point for each pod, or for the workload under `WORKLOAD_REDUCTION_KEY`.
+
+    The percentiles are interpolated linearly (like `np.percentile` and `quantile_over_time`).
+    """
+
+    metric: type[BaseMetric]
+    function: Literal["max", "percentile", "count"]
+    percentile: Optional[float] = None
+    scope: Literal["pod", "workload"] = "pod"
+
+    def __post_init__(self) -> None:
+        if (self.function == "percentile") != (self.percentile is not None):
+            raise ValueError("percentile should be set only for the percentile reductions")
+        if self.percentile is not None and not 0 <= self.percentile <= 100:
+            raise ValueError("percentile must be between 0 and 100")
+
+    @property
+    def composable(self) -> bool:
+        """Whether the value of the workload can be combined from the values of its pods (which percentiles can not)."""
+
+        return self.function != "percentile"
+
+    def _reduce_values(self, values: NDArray[np.float64]) -> float:
+        if self.function == "count":
+            return float(len(values))
+        if self.function == "max":
+            return float(np.max(values))
+        return float(np.percentile(values, self.percentile))
+
+    def reduce(self, data: PodsTimeData) -> PodsTimeData:
+        """Reduces the samples of the pods client-side."""
+
+        data = {pod: values for pod, values in data.items() if len(values) > 0}
+        if self.scope == "pod":
+            return {pod: np.array([[values[-1, 0], self._reduce_values(values[:, 1])]]) for pod, values in data.items()}
+        if len(data) == 0:
+            return {}
+
+        timestamp = max(values[-1, 0] for values in data.values())
+        samples = np.concatenate([values[:, 1] for values in data.values()])
+        return {WORKLOAD_REDUCTION_KEY: np.array([[timestamp, self._reduce_values(samples)]])}
+
+    def combine(self, data: PodsTimeData) -> PodsTimeData:
+        """Combines the reduced values of the pods into the value of the workload, for the workload scope."""
+
+        if self.scope == "pod" or len(data) == 0:
+            return data
+        if not self.composable:
+            raise ValueError(f"The {self.function} of a workload can not be combined from the values of its pods")
+
+        timestamp = max(values[0, 0] for values in data.values())
+        pods_values = np.array([values[0, 1] for values in data.values()], dtype=np.float64)
+        value = np.sum(pods_values) if self.function == "count" else np.max(pods_values)
+        return {WORKLOAD_REDUCTION_KEY: np.array([[timestamp, value]])}
+
+
 RunResult = dict[ResourceType, ResourceRecommendation]
 
 SelfBS = TypeVar("SelfBS", bound="BaseStrategy")
@@ -107,6 +291,12 @@ class BaseStrategy(abc.ABC, Generic[_StrategySettings]):
     def metrics(self) -> Sequence[type[PrometheusMetric]]:
         pass
 
+    # Optional reductions of range metrics to single values, by the name they are put under in the history data.
+    # Unlike the metrics, they are pushed down into the metrics backend when it supports them (see Reduction).
+    @property
+    def reductions(self) -> dict[str, Reduction]:
+        return {}
+
     def __init__(self, settings: _StrategySettings):
         self.settings = settings
 
@@ -127,6 +317,65 @@ class BaseStrategy(abc.ABC, Generic[_StrategySettings]):
     def run(self, history_data: MetricsPodData, object_data: K8sObjectData) -> RunResult:
         pass
 
+    # Optional method, calculating the recommendations of many objects at once, with vectorized reductions.
+    # If implemented, it is used instead of 'run' and has to return the same results, in the order of the objects.
+    def run_batch(self, history_data: BatchMetricsData, objects_data: Sequence[K8sObjectData]) -> list[RunResult]:
+        raise NotImplementedError()
+
+    @classmethod
+    def supports_batch(cls) -> bool:
+        return cls.run_batch is not BaseStrategy.run_batch
+
+    def check_data(
+        self, resource: ResourceType, has_data: bool, points_count: float, object_data: K8sObjectData
+    ) -> Optional[ResourceRecommendation]:
+        """
+        Checks whether there is enough data to recommend the resource of the object.
+        Returns the undefined recommendation (with the reason as the info) if not, otherwise None.
+        """
+
+        if not has_data:
+            return ResourceRecommendation.undefined(info="No data")
+
+        if points_count < self.settings.points_required:
+            return ResourceRecommendation.undefined(info="Not enough data")
+
+        if object_data.hpa is not None and not self.settings.allow_hpa:
+            if resource == ResourceType.CPU:
+                target_utilization = object_data.hpa.target_cpu_utilization_percentage
+            else:
+                target_utilization = object_data.hpa.target_memory_utilization_percentage
+            if target_utilization is not None:
+                return ResourceRecommendation.undefined(info="HPA detected")
+
+        return None
+
+    def check_batch_data(
+        self,
+        resource: ResourceType,
+        data: Union[RaggedArray, SketchArray],
+        points_counts: NDArray[np.float64],
+        objects_data: Sequence[K8sObjectData],
+        recommendations: Iterable[ResourceRecommendation],
+    ) -> list[ResourceRecommendation]:
+        """
+        The batched version of `check_data`: returns the recommendations of the objects,
+        replaced by the undefined ones for the objects without enough data.
+        """
+
+        return [
+            self.check_data(resource, has_data, points_count, object_data) or recommendation
+            for has_data, points_count, object_data, recommendation in zip(
+                data.lengths > 0, points_counts, objects_data, recommendations
+            )
+        ]
+
+    @staticmethod
+    def combine_batch_proposals(proposals: dict[ResourceType, list[ResourceRecommendation]]) -> list[RunResult]:
+        """Combines the recommendations of each resource for the objects into the results of the objects."""
+
+        return [dict(zip(proposals, recommendations)) for recommendations in zip(*proposals.values())]
+
     # This method is intended to return a strategy by its name.
     @classmethod
     def find(cls: type[SelfBS], name: str) -> type[SelfBS]:
@@ -157,7 +406,15 @@ __all__ = [
     "BaseStrategy",
     "StrategySettings",
     "PodsTimeData",
+    "SteppedSeries",
     "MetricsPodData",
+    "RaggedArray",
+    "SketchArray",
+    "DDSketch",
+    "BatchMetricsData",
+    "concatenate_metrics",
+    "Reduction",
+    "WORKLOAD_REDUCTION_KEY",
     "K8sObjectData",
     "ResourceType",
 ]
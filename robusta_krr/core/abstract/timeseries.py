@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from typing import Any, Optional, Sequence, Union
+
+import numpy as np
+from numpy.typing import DTypeLike, NDArray
+
+
+class SteppedSeries:
+    """
+    The samples of a pod's series at a regular step, stored as a single (float32 by default) values buffer,
+    with NaN for the missing steps. The timestamps are implied by `start` and `step`, instead of being stored.
+
+    For compatibility it behaves like the `[timestamp, value]` array (N x 2) of the present samples, which is what
+    the strategies expect: `series[:, 1]`, `series[0, 1]`, `len(series)` and `np.asarray(series)` all work
+    (the indexing fast paths do not materialize the timestamps).
+    """
+
+    __slots__ = ("start", "step", "values", "_present")
+
+    ndim = 2
+
+    def __init__(self, start: float, step: float, values: NDArray[Any]) -> None:
+        self.start = start
+        self.step = step
+        self.values = values
+        self._present: Optional[NDArray[np.bool_]] = None
+
+    @classmethod
+    def from_samples(
+        cls, samples: Any, step: float, dtype: DTypeLike = np.float32
+    ) -> Union[SteppedSeries, NDArray[np.float64]]:
+        """
+        Converts `[timestamp, value]` samples to a stepped series.
+        Samples that are not aligned to the step (which range queries always are) are returned as a float64 array.
+        """
+
+        samples = np.asarray(samples, dtype=np.float64)
+        if len(samples) == 0 or step <= 0:
+            return samples.reshape(-1, 2)
+
+        start = samples[0, 0]
+        offsets = (samples[:, 0] - start) / step
+        indexes = np.rint(offsets).astype(np.intp)
+        if np.any(np.abs(offsets - indexes) > 1e-6) or np.any(np.diff(indexes) <= 0):
+            return samples
+
+        values = np.full(indexes[-1] + 1, np.nan, dtype=dtype)
+        values[indexes] = samples[:, 1]
+        return cls(float(start), float(step), values)
+
+    @classmethod
+    def concatenate(cls, parts: Sequence[SteppedSeries]) -> SteppedSeries:
+        """Concatenates consecutive parts (e.g. time shards) of the same series, with the same step."""
+
+        start = parts[0].start
+        step = parts[0].step
+        end = max(part.start + (len(part.values) - 1) * step for part in parts)
+
+        values = np.full(round((end - start) / step) + 1, np.nan, dtype=parts[0].values.dtype)
+        for part in parts:
+            offset = round((part.start - start) / step)
+            target = values[offset : offset + len(part.values)]
+            # NOTE: Overlapping steps keep the present samples of the previous parts
+            np.copyto(target, part.values, where=np.isnan(target))
+        return cls(start, step, values)
+
+    @property
+    def present(self) -> NDArray[np.bool_]:
+        if self._present is None:
+            self._present = ~np.isnan(self.values)
+        return self._present
+
+    @property
+    def timestamps(self) -> NDArray[np.float64]:
+        """The timestamps of the present samples."""
+
+        return self.start + self.step * np.flatnonzero(self.present)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return (len(self), 2)
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.present))
+
+    def __array__(self, dtype: DTypeLike = None, copy: Optional[bool] = None) -> NDArray[Any]:
+        result = np.stack([self.timestamps, self.values[self.present].astype(np.float64)], axis=1)
+        return result if dtype is None else result.astype(dtype)
+
+    def __getitem__(self, key: Any) -> Any:
+        if isinstance(key, tuple) and len(key) == 2 and isinstance(key[1], int) and key[1] in (0, 1):
+            index, column = key
+            if isinstance(index, slice) and index == slice(None):
+                return self.timestamps if column == 0 else self.values[self.present]
+            if isinstance(index, (int, np.integer)):
+                position = np.flatnonzero(self.present)[index]
+                return self.start + self.step * position if column == 0 else self.values[position]
+        return np.asarray(self)[key]
+
+    def __repr__(self) -> str:
+        return f"SteppedSeries(start={self.start}, step={self.step}, values={self.values!r})"
@@ -7,28 +7,17 @@ from typing import Any, Awaitable, Callable, Iterable, Optional, Union, Literal
 
 from kubernetes import client, config  # type: ignore
 from kubernetes.client import ApiException
-from kubernetes.client.models import (
-    V1Container,
-    V1DaemonSet,
-    V1Deployment,
-    V1Job,
-    V1Pod,
-    V1PodList,
-    V1StatefulSet,
-    V2HorizontalPodAutoscaler,
-)
+from kubernetes.client.models import V2HorizontalPodAutoscaler
 
 from robusta_krr.core.models.config import settings
 from robusta_krr.core.models.objects import HPAData, K8sObjectData, KindLiteral, PodData
 from robusta_krr.core.models.result import ResourceAllocations
-from robusta_krr.utils.object_like_dict import ObjectLikeDict
-from robusta_krr.utils.progress_bar import ProgressBar
 
 from . import config_patch as _
+from .projection import Container, LabelSelector, Workload, load_items, loads
 
 logger = logging.getLogger("krr")
 
-AnyKubernetesAPIObject = Union[V1Deployment, V1DaemonSet, V1StatefulSet, V1Pod, V1Job]
 HPAKey = tuple[str, str, str]
 
 
@@ -47,7 +36,7 @@ class ClusterLoader:
 
         self.__kind_available: defaultdict[KindLiteral, bool] = defaultdict(lambda: True)
 
-        self.__jobs_for_cronjobs: dict[str, list[V1Job]] = {}
+        self.__jobs_for_cronjobs: dict[str, list[Workload]] = {}
         self.__jobs_loading_locks: defaultdict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
         self.__namespaces: Union[list[str, None]] = None
 
@@ -118,17 +107,21 @@ class ClusterLoader:
             if not (self.namespaces == "*" and object.namespace == "kube-system")
         ]
 
-    async def _list_jobs_for_cronjobs(self, namespace: str) -> list[V1Job]:
+    async def _list_jobs_for_cronjobs(self, namespace: str) -> list[Workload]:
         if namespace not in self.__jobs_for_cronjobs:
             loop = asyncio.get_running_loop()
 
             async with self.__jobs_loading_locks[namespace]:
                 logging.debug(f"Loading jobs for cronjobs in {namespace}")
-                ret = await loop.run_in_executor(
+                self.__jobs_for_cronjobs[namespace] = await loop.run_in_executor(
                     self.executor,
-                    lambda: self.batch.list_namespaced_job(namespace=namespace),
+                    lambda: [
+                        Workload.from_json(item, "Job")
+                        for item in load_items(
+                            self.batch.list_namespaced_job(namespace=namespace, _preload_content=False).data
+                        )
+                    ],
                 )
-                self.__jobs_for_cronjobs[namespace] = ret.items
 
         return self.__jobs_for_cronjobs[namespace]
 
@@ -142,7 +135,7 @@ class ClusterLoader:
                 for job in namespace_jobs
                 if any(
                     owner.kind == "CronJob" and owner.uid == object._api_resource.metadata.uid
-                    for owner in job.metadata.owner_references or []
+                    for owner in job.metadata.owner_references
                 )
             ]
             selector = f"batch.kubernetes.io/controller-uid in ({','.join(ownered_jobs_uids)})"
@@ -155,14 +148,19 @@ class ClusterLoader:
             if selector is None:
                 return []
 
-        ret: V1PodList = await loop.run_in_executor(
+        # NOTE: Only the names of the pods are needed, so they are not deserialized into the models
+        pods = await loop.run_in_executor(
             self.executor,
-            lambda: self.core.list_namespaced_pod(
-                namespace=object._api_resource.metadata.namespace, label_selector=selector
+            lambda: load_items(
+                self.core.list_namespaced_pod(
+                    namespace=object._api_resource.metadata.namespace,
+                    label_selector=selector,
+                    _preload_content=False,
+                ).data
             ),
         )
 
-        return [PodData(name=pod.metadata.name, deleted=False) for pod in ret.items]
+        return [PodData(name=pod["metadata"]["name"], deleted=False) for pod in pods]
 
     @staticmethod
     def _get_match_expression_filter(expression) -> str:
@@ -175,7 +173,7 @@ class ClusterLoader:
         return f"{expression.key} {expression.operator} ({values})"
 
     @staticmethod
-    def _build_selector_query(selector: Any) -> Union[str, None]:
+    def _build_selector_query(selector: LabelSelector) -> Union[str, None]:
         label_filters = []
 
         if selector.match_labels is not None:
@@ -185,46 +183,15 @@ class ClusterLoader:
             label_filters += [
                 ClusterLoader._get_match_expression_filter(expression) for expression in selector.match_expressions
             ]
-        
-        # normally the kubernetes API client renames matchLabels to match_labels in python
-        # but for CRDs like ArgoRollouts that renaming doesn't happen and we have selector={'matchLabels': {'app': 'test-app'}}
-        if getattr(selector, "matchLabels", None):
-            label_filters += [f"{label[0]}={label[1]}" for label in getattr(selector, "matchLabels").items()]
-        if getattr(selector, "matchExpressions", None):
-            label_filters += [
-                ClusterLoader._get_match_expression_filter(expression) for expression in getattr(selector, "matchExpressions").items()
-            ]
 
         if label_filters == []:
-            # NOTE: This might mean that we have DeploymentConfig,
-            # which uses ReplicationController and it has a dict like matchLabels
-            if len(selector) != 0:
-                label_filters += [f"{label[0]}={label[1]}" for label in selector.items()]
-            else:
-                return None
+            return None
 
         return ",".join(label_filters)
 
-    def __build_scannable_object(
-        self, item: AnyKubernetesAPIObject, container: V1Container, kind: Optional[str] = None
-    ) -> K8sObjectData:
+    def __build_scannable_object(self, item: Workload, container: Container, kind: KindLiteral) -> K8sObjectData:
         name = item.metadata.name
         namespace = item.metadata.namespace
-        kind = kind or item.__class__.__name__[2:]
-
-        labels = {}
-        annotations = {}
-        if item.metadata.labels:
-            if type(item.metadata.labels) is ObjectLikeDict:
-                labels = item.metadata.labels.__dict__
-            else:  
-                labels = item.metadata.labels
-
-        if item.metadata.annotations:
-            if type(item.metadata.annotations) is ObjectLikeDict:
-                annotations = item.metadata.annotations.__dict__
-            else:
-                annotations = item.metadata.annotations
 
         obj = K8sObjectData(
             cluster=self.cluster,
@@ -234,8 +201,8 @@ class ClusterLoader:
             container=container.name,
             allocations=ResourceAllocations.from_container(container),
             hpa=self.__hpa_list.get((namespace, kind, name)),
-            labels=labels,
-            annotations= annotations
+            labels=item.metadata.labels,
+            annotations=item.metadata.annotations,
         )
         obj._api_resource = item
         return obj
@@ -249,39 +216,35 @@ class ClusterLoader:
         self,
         kind: KindLiteral,
         all_namespaces_request: Callable,
-        namespaced_request: Callable
+        namespaced_request: Callable,
+        project: Optional[Callable[[dict[str, Any]], Any]] = None,
     ) -> list[Any]:
+        """
+        Lists the objects of a kind, in all the namespaces or in each of the scanned ones.
+
+        If `project` is set, the objects are not deserialized into the models of the Kubernetes client:
+        the raw JSON of the responses is parsed, and each of the items is projected instead.
+        """
+
         logger.debug(f"Listing {kind}s in {self.cluster}")
         loop = asyncio.get_running_loop()
 
+        def _list(request: Callable, **kwargs: Any) -> list[Any]:
+            if project is None:
+                return request(watch=False, label_selector=settings.selector, **kwargs).items
+
+            response = request(watch=False, label_selector=settings.selector, _preload_content=False, **kwargs)
+            return [project(item) for item in load_items(response.data)]
+
         if self.namespaces == "*":
-            requests = [
-                loop.run_in_executor(
-                    self.executor,
-                    lambda: all_namespaces_request(
-                        watch=False,
-                        label_selector=settings.selector,
-                    ),
-                )
-            ]
+            requests = [loop.run_in_executor(self.executor, lambda: _list(all_namespaces_request))]
         else:
             requests = [
-                loop.run_in_executor(
-                    self.executor,
-                    lambda ns=namespace: namespaced_request(
-                        namespace=ns,
-                        watch=False,
-                        label_selector=settings.selector,
-                    ),
-                )
+                loop.run_in_executor(self.executor, lambda ns=namespace: _list(namespaced_request, namespace=ns))
                 for namespace in self.namespaces
             ]
 
-        result = [
-            item
-            for request_result in await asyncio.gather(*requests)
-            for item in request_result.items
-        ]
+        result = [item for items in await asyncio.gather(*requests) for item in items]
 
         logger.debug(f"Found {len(result)} {kind} in {self.cluster}")
         return result
@@ -291,8 +254,10 @@ class ClusterLoader:
         kind: KindLiteral,
         all_namespaces_request: Callable,
         namespaced_request: Callable,
-        extract_containers: Callable[[Any], Union[Iterable[V1Container], Awaitable[Iterable[V1Container]]]],
-        filter_workflows: Optional[Callable[[Any], bool]] = None,
+        extract_containers: Callable[[Workload], Union[Iterable[Container], Awaitable[Iterable[Container]]]] = (
+            lambda item: item.containers or []
+        ),
+        filter_workflows: Optional[Callable[[Workload], bool]] = None,
     ) -> list[K8sObjectData]:
         if not self._should_list_resource(kind):
             logger.debug(f"Skipping {kind}s in {self.cluster}")
@@ -303,7 +268,10 @@ class ClusterLoader:
         
         result = []
         try:
-            for item in await self._list_namespaced_or_global_objects(kind, all_namespaces_request, namespaced_request):
+            items = await self._list_namespaced_or_global_objects(
+                kind, all_namespaces_request, namespaced_request, project=lambda item: Workload.from_json(item, kind)
+            )
+            for item in items:
                 if filter_workflows is not None and not filter_workflows(item):
                     continue
 
@@ -328,13 +296,12 @@ class ClusterLoader:
             kind="Deployment",
             all_namespaces_request=self.apps.list_deployment_for_all_namespaces,
             namespaced_request=self.apps.list_namespaced_deployment,
-            extract_containers=lambda item: item.spec.template.spec.containers,
         )
 
     def _list_rollouts(self) -> list[K8sObjectData]:
-        async def _extract_containers(item: Any) -> list[V1Container]:
-            if item.spec.template is not None:
-                return item.spec.template.spec.containers
+        async def _extract_containers(item: Workload) -> list[Container]:
+            if item.containers is not None:
+                return item.containers
 
             loop = asyncio.get_running_loop()
 
@@ -343,87 +310,66 @@ class ClusterLoader:
             )
 
             # Template can be None and object might have workloadRef
-            workloadRef = item.spec.workloadRef
-            if workloadRef is not None:
+            if item.workload_ref is not None:
                 ret = await loop.run_in_executor(
                     self.executor,
                     lambda: self.apps.read_namespaced_deployment(
-                        namespace=item.metadata.namespace, name=workloadRef.name
+                        namespace=item.metadata.namespace, name=item.workload_ref, _preload_content=False
                     ),
                 )
-                return ret.spec.template.spec.containers
+                return Workload.from_json(loads(ret.data), "Deployment").containers or []
 
             return []
 
-        # NOTE: Using custom objects API returns dicts, but all other APIs return objects
-        # We need to handle this difference using a small wrapper
         return self._list_scannable_objects(
             kind="Rollout",
-            all_namespaces_request=lambda **kwargs: ObjectLikeDict(
-                self.custom_objects.list_cluster_custom_object(
-                    group="argoproj.io",
-                    version="v1alpha1",
-                    plural="rollouts",
-                    **kwargs,
-                )
+            all_namespaces_request=lambda **kwargs: self.custom_objects.list_cluster_custom_object(
+                group="argoproj.io",
+                version="v1alpha1",
+                plural="rollouts",
+                **kwargs,
             ),
-            namespaced_request=lambda **kwargs: ObjectLikeDict(
-                self.custom_objects.list_namespaced_custom_object(
-                    group="argoproj.io",
-                    version="v1alpha1",
-                    plural="rollouts",
-                    **kwargs,
-                )
+            namespaced_request=lambda **kwargs: self.custom_objects.list_namespaced_custom_object(
+                group="argoproj.io",
+                version="v1alpha1",
+                plural="rollouts",
+                **kwargs,
             ),
             extract_containers=_extract_containers,
         )
 
     def _list_strimzipodsets(self) -> list[K8sObjectData]:
-        # NOTE: Using custom objects API returns dicts, but all other APIs return objects
-        # We need to handle this difference using a small wrapper
         return self._list_scannable_objects(
             kind="StrimziPodSet",
-            all_namespaces_request=lambda **kwargs: ObjectLikeDict(
-                self.custom_objects.list_cluster_custom_object(
-                    group="core.strimzi.io",
-                    version="v1beta2",
-                    plural="strimzipodsets",
-                    **kwargs,
-                )
+            all_namespaces_request=lambda **kwargs: self.custom_objects.list_cluster_custom_object(
+                group="core.strimzi.io",
+                version="v1beta2",
+                plural="strimzipodsets",
+                **kwargs,
             ),
-            namespaced_request=lambda **kwargs: ObjectLikeDict(
-                self.custom_objects.list_namespaced_custom_object(
-                    group="core.strimzi.io",
-                    version="v1beta2",
-                    plural="strimzipodsets",
-                    **kwargs,
-                )
+            namespaced_request=lambda **kwargs: self.custom_objects.list_namespaced_custom_object(
+                group="core.strimzi.io",
+                version="v1beta2",
+                plural="strimzipodsets",
+                **kwargs,
             ),
-            extract_containers=lambda item: item.spec.pods[0].spec.containers,
         )
 
     def _list_deploymentconfig(self) -> list[K8sObjectData]:
-        # NOTE: Using custom objects API returns dicts, but all other APIs return objects
-        # We need to handle this difference using a small wrapper
         return self._list_scannable_objects(
             kind="DeploymentConfig",
-            all_namespaces_request=lambda **kwargs: ObjectLikeDict(
-                self.custom_objects.list_cluster_custom_object(
-                    group="apps.openshift.io",
-                    version="v1",
-                    plural="deploymentconfigs",
-                    **kwargs,
-                )
+            all_namespaces_request=lambda **kwargs: self.custom_objects.list_cluster_custom_object(
+                group="apps.openshift.io",
+                version="v1",
+                plural="deploymentconfigs",
+                **kwargs,
             ),
-            namespaced_request=lambda **kwargs: ObjectLikeDict(
-                self.custom_objects.list_namespaced_custom_object(
-                    group="apps.openshift.io",
-                    version="v1",
-                    plural="deploymentconfigs",
-                    **kwargs,
-                )
+            namespaced_request=lambda **kwargs: self.custom_objects.list_namespaced_custom_object(
+                group="apps.openshift.io",
+                version="v1",
+                plural="deploymentconfigs",
+                **kwargs,
             ),
-            extract_containers=lambda item: item.spec.template.spec.containers,
         )
 
     def _list_all_statefulsets(self) -> list[K8sObjectData]:
@@ -431,7 +377,6 @@ class ClusterLoader:
             kind="StatefulSet",
             all_namespaces_request=self.apps.list_stateful_set_for_all_namespaces,
             namespaced_request=self.apps.list_namespaced_stateful_set,
-            extract_containers=lambda item: item.spec.template.spec.containers,
         )
 
     def _list_all_daemon_set(self) -> list[K8sObjectData]:
@@ -439,7 +384,6 @@ class ClusterLoader:
             kind="DaemonSet",
             all_namespaces_request=self.apps.list_daemon_set_for_all_namespaces,
             namespaced_request=self.apps.list_namespaced_daemon_set,
-            extract_containers=lambda item: item.spec.template.spec.containers,
         )
 
     def _list_all_jobs(self) -> list[K8sObjectData]:
@@ -447,11 +391,8 @@ class ClusterLoader:
             kind="Job",
             all_namespaces_request=self.batch.list_job_for_all_namespaces,
             namespaced_request=self.batch.list_namespaced_job,
-            extract_containers=lambda item: item.spec.template.spec.containers,
             # NOTE: If the job has ownerReference and it is a CronJob, then we should skip it
-            filter_workflows=lambda item: not any(
-                owner.kind == "CronJob" for owner in item.metadata.owner_references or []
-            ),
+            filter_workflows=lambda item: not any(owner.kind == "CronJob" for owner in item.metadata.owner_references),
         )
 
     def _list_all_cronjobs(self) -> list[K8sObjectData]:
@@ -459,7 +400,6 @@ class ClusterLoader:
             kind="CronJob",
             all_namespaces_request=self.batch.list_cron_job_for_all_namespaces,
             namespaced_request=self.batch.list_namespaced_cron_job,
-            extract_containers=lambda item: item.spec.job_template.spec.template.spec.containers,
         )
 
     async def __list_hpa_v1(self) -> dict[HPAKey, HPAData]:
@@ -552,7 +492,7 @@ class ClusterLoader:
 
 class KubernetesLoader:
     def __init__(self) -> None:
-        self._cluster_loaders: dict[Optional[str], ClusterLoader] = {}
+        self.cluster_loaders: dict[Optional[str], ClusterLoader] = {}
 
     async def list_clusters(self) -> Optional[list[str]]:
         """List all clusters.
@@ -601,31 +541,37 @@ class KubernetesLoader:
             logger.error(f"Could not load cluster {cluster} and will skip it: {e}")
             return None
 
+    async def _try_list_cluster_objects(self, cluster: Optional[str]) -> list[K8sObjectData]:
+        loop = asyncio.get_running_loop()
+        # NOTE: Loading the kubeconfig of the cluster is blocking, so it is done in a thread
+        cluster_loader = await loop.run_in_executor(None, self._try_create_cluster_loader, cluster)
+        if cluster_loader is None:
+            return []
+
+        self.cluster_loaders[cluster] = cluster_loader
+        try:
+            return await cluster_loader.list_scannable_objects()
+        except Exception as e:
+            logger.error(f"Could not list scannable objects in cluster {cluster} and will skip it: {e}")
+            return []
+
     async def list_scannable_objects(self, clusters: Optional[list[str]]) -> list[K8sObjectData]:
         """List all scannable objects.
 
-        Yields:
-            Each scannable object as it is loaded.
+        The clusters are discovered concurrently, so a slow cluster does not hold up the others,
+        and a cluster that fails to be discovered is skipped.
+
+        Returns:
+            A list of scannable objects of all the clusters.
         """
-        if clusters is None:
-            _cluster_loaders = [self._try_create_cluster_loader(None)]
-        else:
-            _cluster_loaders = [self._try_create_cluster_loader(cluster) for cluster in clusters]
 
-        self.cluster_loaders = {cl.cluster: cl for cl in _cluster_loaders if cl is not None}
-        if self.cluster_loaders == {}:
+        _clusters: list[Optional[str]] = [None] if clusters is None else list(clusters)
+        cluster_objects = await asyncio.gather(*[self._try_list_cluster_objects(cluster) for cluster in _clusters])
+        if not any(cluster in self.cluster_loaders for cluster in _clusters):
             logger.error("Could not load any cluster.")
             return []
-        
-        total_objects = []
-        with ProgressBar(total=len(self.cluster_loaders), title="Discovering workloads") as progress:
-            for cluster_loader in self.cluster_loaders.values():
-                cluster_name = cluster_loader.cluster or "current"
-                progress.progress(description=f"Scanning {cluster_name}")
-                cluster_objects = await cluster_loader.list_scannable_objects()
-                total_objects.extend(cluster_objects)
-        
-        return total_objects
+
+        return [object for objects in cluster_objects for object in objects]
 
     async def load_pods(self, object: K8sObjectData) -> list[PodData]:
         try:
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Optional, Union
+
+try:
+    import orjson
+
+    loads = orjson.loads
+except ImportError:
+    import json
+
+    loads = json.loads
+
+Path = tuple[Union[str, int], ...]
+
+# The paths of the spec with the selector and the replicas, and of the pod spec with the containers, by kind
+SPEC_PATHS: dict[str, tuple[Path, Path]] = {
+    "CronJob": (("spec", "jobTemplate", "spec"), ("spec", "jobTemplate", "spec", "template", "spec")),
+    "StrimziPodSet": (("spec",), ("spec", "pods", 0, "spec")),
+}
+DEFAULT_SPEC_PATHS: tuple[Path, Path] = (("spec",), ("spec", "template", "spec"))
+
+
+def _get(data: Any, path: Path) -> Any:
+    for key in path:
+        if isinstance(key, int):
+            if not isinstance(data, list) or len(data) <= key:
+                return None
+        elif not isinstance(data, dict):
+            return None
+        data = data[key] if isinstance(key, int) else data.get(key)
+    return data
+
+
+@dataclass(frozen=True)
+class OwnerReference:
+    kind: str
+    uid: str
+
+
+@dataclass(frozen=True)
+class ObjectMeta:
+    name: str
+    namespace: str
+    uid: Optional[str] = None
+    labels: dict[str, str] = field(default_factory=dict)
+    annotations: dict[str, str] = field(default_factory=dict)
+    owner_references: list[OwnerReference] = field(default_factory=list)
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> ObjectMeta:
+        return cls(
+            name=data["name"],
+            namespace=data.get("namespace", ""),
+            uid=data.get("uid"),
+            labels=data.get("labels") or {},
+            annotations=data.get("annotations") or {},
+            owner_references=[
+                OwnerReference(kind=owner["kind"], uid=owner["uid"]) for owner in data.get("ownerReferences") or []
+            ],
+        )
+
+
+@dataclass(frozen=True)
+class LabelSelectorRequirement:
+    key: str
+    operator: str
+    values: Optional[list[str]] = None
+
+
+@dataclass(frozen=True)
+class LabelSelector:
+    match_labels: Optional[dict[str, str]] = None
+    match_expressions: Optional[list[LabelSelectorRequirement]] = None
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> LabelSelector:
+        if "matchLabels" not in data and "matchExpressions" not in data:
+            # NOTE: The selector of a DeploymentConfig (like of a ReplicationController) is a plain label map
+            return cls(match_labels=dict(data))
+
+        return cls(
+            match_labels=data.get("matchLabels"),
+            match_expressions=[
+                LabelSelectorRequirement(
+                    key=expression["key"], operator=expression["operator"], values=expression.get("values")
+                )
+                for expression in data.get("matchExpressions") or []
+            ],
+        )
+
+
+@dataclass(frozen=True)
+class ContainerResources:
+    requests: dict[str, str] = field(default_factory=dict)
+    limits: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class Container:
+    """The name and the resources of a container, readable by `ResourceAllocations.from_container`."""
+
+    name: str
+    resources: ContainerResources
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> Container:
+        resources = data.get("resources") or {}
+        return cls(
+            name=data["name"],
+            resources=ContainerResources(
+                requests=resources.get("requests") or {}, limits=resources.get("limits") or {}
+            ),
+        )
+
+
+@dataclass(frozen=True)
+class Workload:
+    """
+    A slim projection of a workload, with only the fields needed to scan it:
+    its metadata, selector, replicas and the resources of its containers.
+
+    `containers` is None if the workload has no pod template (e.g. a Rollout with a `workloadRef` instead).
+    """
+
+    metadata: ObjectMeta
+    selector: Optional[LabelSelector]
+    replicas: Optional[int]
+    containers: Optional[list[Container]]
+    workload_ref: Optional[str] = None
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any], kind: str) -> Workload:
+        spec_path, pod_spec_path = SPEC_PATHS.get(kind, DEFAULT_SPEC_PATHS)
+        spec = _get(data, spec_path) or {}
+        pod_spec = _get(data, pod_spec_path)
+        selector = spec.get("selector")
+
+        return cls(
+            metadata=ObjectMeta.from_json(data["metadata"]),
+            selector=LabelSelector.from_json(selector) if selector is not None else None,
+            replicas=spec.get("replicas"),
+            containers=(
+                [Container.from_json(container) for container in pod_spec.get("containers") or []]
+                if pod_spec is not None
+                else None
+            ),
+            workload_ref=_get(data, ("spec", "workloadRef", "name")),
+        )
+
+
+def load_items(body: bytes) -> list[dict[str, Any]]:
+    """Parses the raw JSON body of a list call (made with `_preload_content=False`) into its items."""
+
+    return loads(body).get("items") or []
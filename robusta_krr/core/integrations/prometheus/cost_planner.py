@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import datetime
+import json
+import logging
+import math
+from dataclasses import asdict, dataclass
+from typing import Any, Optional
+
+from robusta_krr.core.abstract.strategies import Reduction
+from robusta_krr.core.models.objects import K8sObjectData
+
+from .metrics import PrometheusMetric
+
+logger = logging.getLogger("krr")
+
+
+@dataclass(frozen=True)
+class PlanChoice:
+    """A recorded choice of `QueryCostPlanner`, with the estimated costs of both plans."""
+
+    object: str
+    metric: str
+    function: str
+    pods: int
+    points: int
+    pushdown: bool
+    pushdown_cost: float
+    client_cost: float
+    reason: str
+
+
+class QueryCostPlanner:
+    """
+    Chooses for each workload whether a reduction (see `Reduction`) is pushed down into a subquery
+    (see `ReducedMetric`), or the samples of its metric are loaded by a range query and reduced client-side,
+    by estimating the cost of both.
+
+    The costs are estimated in samples, from the number of series (`series_per_pod` for each pod),
+    the history duration and the step, counting only what differs between the two plans:
+    - The pushed down plan is a single query, whose subquery reads all the raw samples of each series at once
+      (one per `SCRAPE_INTERVAL` of the history), `subquery_cost` each, and transfers a single point per series.
+    - The client-side plan is a range query split into time shards (see `PrometheusMetric.split_time_range`),
+      which transfers all the points of each series (one per step), to be decoded and reduced client-side,
+      `transfer_cost` each. If the raw samples are exported instead (see `VictoriaMetricsService`),
+      a single export transfers all the raw samples.
+    - Each query costs `query_cost` on top, for its round trip and planning.
+    - A subquery loading more than `max_samples` samples (e.g. `--query.max-samples` of Prometheus) would be rejected
+      by the backend, so it is never chosen.
+
+    So the pushed down plan is cheaper for the small workloads, where the fixed cost of the shards dominates,
+    while for the large ones it depends on whether reading the raw samples costs more than transferring the points.
+
+    `series_per_pod` can be calibrated from the TSDB status of the backend, see `calibrate`.
+    All the choices are recorded in `choices` (and can be saved with `save`), so that the weights can be tuned.
+    """
+
+    # The assumed scrape interval of the raw metrics, for the number of the raw samples
+    SCRAPE_INTERVAL = datetime.timedelta(seconds=30)
+
+    def __init__(
+        self,
+        *,
+        subquery_cost: float = 1.0,
+        transfer_cost: float = 1.0,
+        query_cost: float = 100_000.0,
+        max_samples: Optional[int] = None,
+        max_range_points: Optional[int] = None,
+        range_shard_duration: Optional[datetime.timedelta] = None,
+        export: bool = False,
+    ) -> None:
+        self.subquery_cost = subquery_cost
+        self.transfer_cost = transfer_cost
+        self.query_cost = query_cost
+        self.max_samples = max_samples
+        self.max_range_points = max_range_points
+        self.range_shard_duration = range_shard_duration
+        self.export = export
+
+        # The series of each raw metric per pod, by the metric name
+        self.series_per_pod: dict[str, float] = {}
+        self.choices: list[PlanChoice] = []
+
+    def get_series_per_pod(self, metric: type[PrometheusMetric]) -> float:
+        if metric.exported_metric is None:
+            return 1.0
+        return self.series_per_pod.get(metric.exported_metric, 1.0)
+
+    def calibrate(self, tsdb_status: dict[str, Any]) -> None:
+        """
+        Estimates the series per pod of the raw metrics from the TSDB status of the backend (`/api/v1/status/tsdb`),
+        as the number of their series divided by the number of the pods.
+        Only the metrics of the top series counts are listed in the status, the others keep the default.
+        """
+
+        pods = next(
+            (item["value"] for item in tsdb_status.get("labelValueCountByLabelName", []) if item["name"] == "pod"), 0
+        )
+        if pods <= 0:
+            return
+
+        for item in tsdb_status.get("seriesCountByMetricName", []):
+            self.series_per_pod[item["name"]] = max(item["value"] / pods, 1.0)
+
+    def _get_shards(self, period: datetime.timedelta, points: int) -> int:
+        shards = 1
+        if self.max_range_points is not None:
+            shards = max(shards, math.ceil(points / self.max_range_points))
+        if self.range_shard_duration is not None:
+            shards = max(shards, math.ceil(period / self.range_shard_duration))
+        return shards
+
+    def choose(
+        self,
+        reduction: Reduction,
+        objects: list[K8sObjectData],
+        period: datetime.timedelta,
+        step: datetime.timedelta,
+    ) -> bool:
+        """
+        Chooses whether to push the reduction down for the objects (e.g. the containers of a workload),
+        and records the choice.
+        """
+
+        metric: type[PrometheusMetric] = reduction.metric  # type: ignore
+        pods = len({(object.namespace, pod.name) for object in objects for pod in object.pods})
+        points = max(math.ceil(period / step), 1)
+        series = pods * len({object.container for object in objects}) * self.get_series_per_pod(metric)
+        raw_samples = math.ceil(period / self.SCRAPE_INTERVAL)
+
+        pushdown_cost = self.query_cost + series * (raw_samples * self.subquery_cost + self.transfer_cost)
+        if self.export and metric.supports_export():
+            client_cost = self.query_cost + series * raw_samples * self.transfer_cost
+        else:
+            client_cost = self._get_shards(period, points) * self.query_cost + series * points * self.transfer_cost
+
+        if self.max_samples is not None and series * (points + raw_samples) > self.max_samples:
+            pushdown, reason = False, "the subquery would load too many samples"
+        else:
+            pushdown = pushdown_cost <= client_cost
+            reason = "cheaper" if pushdown_cost != client_cost else "equal costs"
+
+        choice = PlanChoice(
+            object=", ".join(str(object) for object in objects),
+            metric=metric.__name__,
+            function=reduction.function,
+            pods=pods,
+            points=points,
+            pushdown=pushdown,
+            pushdown_cost=pushdown_cost,
+            client_cost=client_cost,
+            reason=reason,
+        )
+        logger.debug(f"Query plan of {choice.function} of {choice.metric} for {choice.object}: {choice}")
+        self.choices.append(choice)
+        return pushdown
+
+    def save(self, path: str) -> None:
+        """Appends the recorded choices to a file, as JSON lines."""
+
+        with open(path, "a") as file:
+            for choice in self.choices:
+                file.write(json.dumps(asdict(choice)) + "\n")
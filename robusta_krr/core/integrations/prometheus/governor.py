@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Optional
+
+logger = logging.getLogger("krr")
+
+
+class ConcurrencyGovernor:
+    """
+    Adaptively limits the number of in-flight queries to a single metrics backend, shared by the whole scan.
+
+    The limit follows AIMD (additive increase, multiplicative decrease):
+    every successful query raises it by `1 / limit` (so by one per "window" of queries), up to `max_limit`,
+    while overload halves it - down to `min_limit`, at most once per observed latency.
+    Overload is either an error, a 429/503 response, or the recent latency (a short EWMA)
+    growing over `LATENCY_TOLERANCE` times the long term one.
+
+    A Retry-After response pauses all the new queries to the backend for the requested time.
+
+    Retries are limited by a budget shared between all the queries, rather than by a number of attempts per query:
+    the budget starts with `MIN_RETRIES` and every successful query adds `RETRY_RATIO` of a retry to it.
+    This way a failing backend is not hammered with `attempts * queries` requests.
+    """
+
+    LATENCY_TOLERANCE = 2.0
+    SHORT_LATENCY_WEIGHT = 0.3
+    LONG_LATENCY_WEIGHT = 0.02
+    DECREASE_FACTOR = 0.5
+
+    MIN_RETRIES = 10
+    RETRY_RATIO = 0.1
+
+    def __init__(self, name: str, *, max_limit: int, min_limit: int = 1, initial_limit: Optional[int] = None) -> None:
+        self.name = name
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.limit = float(initial_limit or max(self.min_limit, max_limit // 2))
+
+        self.retry_budget = float(self.MIN_RETRIES)
+
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._short_latency: Optional[float] = None
+        self._long_latency: Optional[float] = None
+        self._waiters: deque[asyncio.Future[None]] = deque()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def acquire(self) -> None:
+        """
+        Waits for the backend to be not paused and for a free slot under the current limit, and takes it.
+        """
+
+        delay = self._paused_until - time.monotonic()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self._paused_until - time.monotonic()
+
+        while self._in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # Pass the wake up to the next waiter, if this one was already woken up
+                if waiter.done() and not waiter.cancelled():
+                    self._wake_up()
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+        self._in_flight += 1
+
+    def release(self) -> None:
+        self._in_flight -= 1
+        self._wake_up()
+
+    def _wake_up(self) -> None:
+        free_slots = int(self.limit) - self._in_flight
+        while free_slots > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free_slots -= 1
+
+    def on_success(self, latency: float) -> None:
+        self.retry_budget = min(self.retry_budget + self.RETRY_RATIO, float(self.MIN_RETRIES) + self.max_limit)
+
+        if self._short_latency is None or self._long_latency is None:
+            self._short_latency = self._long_latency = latency
+        else:
+            self._short_latency += self.SHORT_LATENCY_WEIGHT * (latency - self._short_latency)
+            self._long_latency += self.LONG_LATENCY_WEIGHT * (latency - self._long_latency)
+
+        if self._short_latency > self.LATENCY_TOLERANCE * self._long_latency:
+            self._decrease("latency is growing")
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+
+    def on_error(self) -> None:
+        self._decrease("query failed")
+
+    def on_overload(self, retry_after: Optional[float]) -> None:
+        self._decrease("backend is overloaded")
+        if retry_after is not None and retry_after > 0:
+            logger.info(f"{self.name} asked to retry after {retry_after:.0f}s, pausing the queries to it")
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def try_retry(self) -> bool:
+        """
+        Takes a retry from the shared budget, if there is one left.
+        """
+
+        if self.retry_budget < 1:
+            return False
+        self.retry_budget -= 1
+        return True
+
+    def _decrease(self, reason: str) -> None:
+        now = time.monotonic()
+        # NOTE: Do not decrease more than once per round trip, as the queries in flight were sent with the same limit
+        if now - self._last_decrease < (self._short_latency or 0):
+            return
+
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * self.DECREASE_FACTOR)
+        logger.debug(f"Decreased the concurrency limit of {self.name} to {int(self.limit)} ({reason})")
@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Optional
+from urllib.parse import urlencode
+
+import aiohttp
+from botocore.auth import S3SigV4Auth
+from botocore.awsrequest import AWSRequest
+from botocore.credentials import Credentials
+from prometheus_api_client import PrometheusApiClientException
+from prometrix import AWSPrometheusConfig, PrometheusConfig
+
+from robusta_krr.core.models.config import settings
+
+from .governor import ConcurrencyGovernor
+from .response_decoder import ExportStreamDecoder, SeriesStreamDecoder
+
+logger = logging.getLogger("krr")
+
+
+class AsyncPrometheusClient:
+    """
+    A native asyncio HTTP client for the Prometheus query APIs.
+
+    It keeps a bounded pool of keep-alive connections per backend (`settings.prometheus_max_connections`),
+    accepts gzip-encoded responses and sends queries as POST bodies, so long selectors are not limited by the URL length.
+
+    Authorization is taken from the prometrix config, so it supports the same variants:
+    bearer tokens and extra headers (including the Coralogix token) are already a part of `config.headers`,
+    and requests to AWS managed Prometheus are signed with SigV4.
+    The headers are read from the shared config for each request, so a refreshed token is picked up.
+    Each request times out after `settings.prometheus_timeout` seconds.
+
+    Metric queries are streamed with `stream_query` / `stream_query_range`, which decode the series as they are received.
+    The raw samples can be streamed the same way from the Victoria Metrics export API with `stream_export`.
+
+    The concurrency of the queries is adapted to the backend by a `ConcurrencyGovernor`,
+    which also decides whether a failed request (a connection error, 429, 502, 503 or 504) can be retried.
+    """
+
+    STREAM_CHUNK_SIZE = 64 * 1024
+    MAX_ATTEMPTS = 5
+    MAX_RETRY_AFTER = 60.0
+    OVERLOAD_STATUSES = {429, 503}
+    RETRYABLE_STATUSES = {429, 502, 503, 504}
+
+    def __init__(self, config: PrometheusConfig) -> None:
+        self.config = config
+        self.url = config.url
+        self.ssl_verification = not config.disable_ssl
+
+        self._sigv4auth: Optional[S3SigV4Auth] = None
+        if isinstance(config, AWSPrometheusConfig):
+            credentials = Credentials(config.access_key, config.secret_access_key)
+            self._sigv4auth = S3SigV4Auth(credentials, config.service_name, config.aws_region)
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.governor = ConcurrencyGovernor(self.url, max_limit=settings.prometheus_max_connections)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # NOTE: The session is created lazily, as it has to be created inside of the running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=settings.prometheus_max_connections,
+                ssl=None if self.ssl_verification else False,
+            )
+            timeout = aiohttp.ClientTimeout(total=settings.prometheus_timeout)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    def _sign_request(self, method: str, url: str, body: str, headers: dict[str, str]) -> dict[str, str]:
+        if self._sigv4auth is None:
+            return headers
+
+        request = AWSRequest(method=method, url=url, data=body, headers=headers)
+        self._sigv4auth.add_auth(request)
+        return dict(request.headers)
+
+    def _get_retry_after(self, response: aiohttp.ClientResponse) -> Optional[float]:
+        header = response.headers.get("Retry-After")
+        if header is None:
+            return None
+
+        try:
+            retry_after = float(header)
+        except ValueError:
+            try:
+                retry_after = (parsedate_to_datetime(header) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                return None
+        return min(max(retry_after, 0.0), self.MAX_RETRY_AFTER)
+
+    def _get_backoff(self, attempt: int) -> float:
+        return random.uniform(1, min(10, 2 ** (attempt + 1)))
+
+    def _can_retry(self, attempt: int) -> bool:
+        return attempt + 1 < self.MAX_ATTEMPTS and self.governor.try_retry()
+
+    @asynccontextmanager
+    async def _request(
+        self, path: str, data: dict[str, Any], method: str = "POST"
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        url = f"{self.url}{path}"
+        body = urlencode(data, doseq=True)
+        if method == "GET":
+            # NOTE: Some of the endpoints (e.g. the TSDB status) only accept GET, with the parameters in the URL
+            url, body = f"{url}?{body}" if body else url, ""
+        session = self._get_session()
+
+        attempt = 0
+        while True:
+            # NOTE: The headers are read from the shared config for each attempt, so a refreshed token is picked up
+            headers = {**self.config.headers, "Accept-Encoding": "gzip"}
+            if method != "GET":
+                headers["Content-Type"] = "application/x-www-form-urlencoded"
+            request_headers = self._sign_request(method, url, body, headers)
+
+            await self.governor.acquire()
+            started = time.monotonic()
+            try:
+                response = await session.request(method, url, data=body or None, headers=request_headers)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                self.governor.on_error()
+                self.governor.release()
+                if not self._can_retry(attempt):
+                    raise
+                logger.debug(f"Retrying the query to {url} after {e.__class__.__name__}: {e}")
+                await asyncio.sleep(self._get_backoff(attempt))
+                attempt += 1
+                continue
+            except BaseException:
+                self.governor.release()
+                raise
+
+            if response.status != 200:
+                try:
+                    content = await response.read()
+                finally:
+                    response.release()
+
+                retry_after = None
+                if response.status in self.OVERLOAD_STATUSES:
+                    retry_after = self._get_retry_after(response)
+                    self.governor.on_overload(retry_after)
+                elif response.status in self.RETRYABLE_STATUSES:
+                    self.governor.on_error()
+                self.governor.release()
+
+                if response.status not in self.RETRYABLE_STATUSES or not self._can_retry(attempt):
+                    raise PrometheusApiClientException(f"HTTP Status Code {response.status} ({content!r})")
+                logger.debug(f"Retrying the query to {url} after HTTP Status Code {response.status}")
+                await asyncio.sleep(retry_after if retry_after is not None else self._get_backoff(attempt))
+                attempt += 1
+                continue
+
+            # NOTE: The slot is held while the body is being read, as streaming it is a part of the query
+            try:
+                yield response
+            except Exception:
+                self.governor.on_error()
+                raise
+            else:
+                self.governor.on_success(time.monotonic() - started)
+            finally:
+                response.release()
+                self.governor.release()
+            return
+
+    async def post(self, path: str, data: dict[str, Any]) -> Any:
+        """
+        Sends a form-encoded POST request to the Prometheus API and returns the `data` field of the response.
+
+        Raises:
+            PrometheusApiClientException: If Prometheus responded with a non 200 status code.
+        """
+
+        async with self._request(path, data) as response:
+            return (await response.json(content_type=None))["data"]
+
+    async def get(self, path: str, params: Optional[dict[str, Any]] = None) -> Any:
+        """
+        Sends a GET request to the Prometheus API and returns the `data` field of the response.
+
+        Raises:
+            PrometheusApiClientException: If Prometheus responded with a non 200 status code.
+        """
+
+        async with self._request(path, params or {}, method="GET") as response:
+            return (await response.json(content_type=None))["data"]
+
+    async def stream(self, path: str, data: dict[str, Any]) -> AsyncIterator[dict[str, Any]]:
+        """
+        Sends a form-encoded POST request to the Prometheus API and yields the result series one by one,
+        decoding them while the response is still being received. The samples of each series are a (N, 2) numpy array.
+
+        Raises:
+            PrometheusApiClientException: If Prometheus responded with a non 200 status code.
+            ValueError: If the response could not be decoded.
+        """
+
+        decoder = SeriesStreamDecoder()
+        async with self._request(path, data) as response:
+            async for chunk in response.content.iter_chunked(self.STREAM_CHUNK_SIZE):
+                for series in decoder.feed(chunk):
+                    yield series
+        decoder.close()
+
+    def _query_params(self, query: str, params: Optional[dict[str, Any]]) -> dict[str, Any]:
+        return {"query": query, **(params or {})}
+
+    def _query_range_params(
+        self,
+        query: str,
+        start_time: datetime,
+        end_time: datetime,
+        step: str,
+        params: Optional[dict[str, Any]],
+    ) -> dict[str, Any]:
+        return {
+            "query": query,
+            "start": round(start_time.timestamp()),
+            "end": round(end_time.timestamp()),
+            "step": step,
+            **(params or {}),
+        }
+
+    async def query(self, query: str, params: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+        return await self.post("/api/v1/query", self._query_params(query, params))
+
+    async def query_range(
+        self,
+        query: str,
+        start_time: datetime,
+        end_time: datetime,
+        step: str,
+        params: Optional[dict[str, Any]] = None,
+    ) -> dict[str, Any]:
+        return await self.post(
+            "/api/v1/query_range", self._query_range_params(query, start_time, end_time, step, params)
+        )
+
+    def stream_query(self, query: str, params: Optional[dict[str, Any]] = None) -> AsyncIterator[dict[str, Any]]:
+        return self.stream("/api/v1/query", self._query_params(query, params))
+
+    def stream_query_range(
+        self,
+        query: str,
+        start_time: datetime,
+        end_time: datetime,
+        step: str,
+        params: Optional[dict[str, Any]] = None,
+    ) -> AsyncIterator[dict[str, Any]]:
+        return self.stream(
+            "/api/v1/query_range", self._query_range_params(query, start_time, end_time, step, params)
+        )
+
+    async def stream_export(
+        self, match: str, start_time: datetime, end_time: datetime
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Streams the raw samples of all the series matching the selector from the Victoria Metrics export API,
+        decoding them while the response is still being received.
+
+        NOTE: A long series might be split between multiple lines of the response, so it can be yielded in multiple parts.
+        """
+
+        data = {"match[]": match, "start": round(start_time.timestamp()), "end": round(end_time.timestamp())}
+        decoder = ExportStreamDecoder()
+        async with self._request("/api/v1/export", data) as response:
+            async for chunk in response.content.iter_chunked(self.STREAM_CHUNK_SIZE):
+                for series in decoder.feed(chunk):
+                    yield series
+            for series in decoder.close():
+                yield series
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
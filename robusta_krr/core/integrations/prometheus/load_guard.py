@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import datetime
+import math
+from dataclasses import dataclass
+from typing import Any, Literal, Optional
+
+from robusta_krr.core.models.config import settings
+from robusta_krr.core.models.objects import K8sObjectData
+
+LoadAction = Literal["proceed", "split", "downgrade", "skip"]
+
+# The names of the verdicts in `Result.errors`
+LOAD_ERRORS = {"split": "LoadGuardSplit", "downgrade": "LoadGuardStepDowngraded", "skip": "LoadGuardSkipped"}
+
+
+@dataclass(frozen=True)
+class LoadVerdict:
+    """
+    How the metrics of a workload are loaded within the budgets of `LoadGuard`:
+    its pods are split between queries of at most `max_pods` pods (if set), queried with the (maybe downgraded) `step`,
+    or the workload is skipped.
+    """
+
+    action: LoadAction
+    series: int
+    samples: int
+    step: datetime.timedelta
+    max_pods: Optional[int] = None
+
+    def to_error(self, objects: list[K8sObjectData]) -> dict[str, Any]:
+        """The verdict as an item of `Result.errors`, for the verdicts other than "proceed"."""
+
+        return {
+            "name": LOAD_ERRORS[self.action],
+            "object": str(objects[0]),
+            "containers": [object.container for object in objects],
+            "series": self.series,
+            "samples": self.samples,
+            "step": self.step.total_seconds(),
+            "max_pods": self.max_pods,
+        }
+
+
+class LoadGuard:
+    """
+    Keeps the metric queries of a workload within a series and a samples budget per query, so a workload
+    with a lot of (e.g. historic) pods does not overload the backend.
+
+    The series of a workload are counted before its metrics are loaded (with the series API, which only reads
+    the index), and the samples are estimated from them and the step. If a query would exceed the budgets:
+    - the pods are split between multiple queries (up to `MAX_SPLITS`), which are run one after another,
+    - if that is not enough, the step is also downgraded (up to `MAX_STEP_FACTOR` times), which lowers the samples,
+    - otherwise the workload is skipped.
+    """
+
+    MAX_SPLITS = 16
+    MAX_STEP_FACTOR = 4
+
+    def __init__(self, *, max_series: Optional[int] = None, max_samples: Optional[int] = None) -> None:
+        if max_series is not None and max_series <= 0:
+            raise ValueError("max_series must be positive")
+        if max_samples is not None and max_samples <= 0:
+            raise ValueError("max_samples must be positive")
+
+        self.max_series = max_series
+        self.max_samples = max_samples
+
+    @classmethod
+    def from_settings(cls) -> Optional[LoadGuard]:
+        if settings.series_budget is None and settings.samples_budget is None:
+            return None
+
+        return cls(max_series=settings.series_budget, max_samples=settings.samples_budget)
+
+    def judge(self, series: int, pods: int, period: datetime.timedelta, step: datetime.timedelta) -> LoadVerdict:
+        """
+        Decides how to load a workload with the given number of series and pods.
+        """
+
+        points = max(math.ceil(period / step), 1)
+        samples = series * points
+
+        queries = 1
+        if self.max_series is not None:
+            queries = max(queries, math.ceil(series / self.max_series))
+        if self.max_samples is not None:
+            queries = max(queries, math.ceil(samples / self.max_samples))
+
+        if queries == 1:
+            return LoadVerdict("proceed", series, samples, step)
+
+        splits = min(queries, max(pods, 1), self.MAX_SPLITS)
+        max_pods = math.ceil(pods / splits) if splits > 1 else None
+        if splits == queries:
+            return LoadVerdict("split", series, samples, step, max_pods)
+
+        # NOTE: The step does not change the number of the series, only of the samples
+        query_series = math.ceil(series / splits)
+        if self.max_series is not None and query_series > self.max_series:
+            return LoadVerdict("skip", series, samples, step)
+
+        assert self.max_samples is not None
+        factor = math.ceil(query_series * points / self.max_samples)
+        if factor > self.MAX_STEP_FACTOR:
+            return LoadVerdict("skip", series, samples, step)
+
+        return LoadVerdict("downgrade", series, samples, step * factor, max_pods)
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+import asyncio
 import datetime
 import logging
+from collections import defaultdict
 from concurrent.futures import ThreadPoolExecutor
-from typing import TYPE_CHECKING, Optional, Dict, Any
+from typing import TYPE_CHECKING, Optional, Dict, Any, TypeVar
 
 from kubernetes import config as k8s_config
 from kubernetes.client.api_client import ApiClient
@@ -17,13 +19,22 @@ from .metrics_service.prometheus_metrics_service import PrometheusMetricsService
 from .metrics_service.thanos_metrics_service import ThanosMetricsService
 from .metrics_service.victoria_metrics_service import VictoriaMetricsService
 from .metrics_service.mimir_metrics_service import MimirMetricsService
+from .load_guard import LoadGuard, LoadVerdict
+from .reductions import ReductionPlan
 
 if TYPE_CHECKING:
-    from robusta_krr.core.abstract.strategies import BaseStrategy, MetricsPodData
+    from robusta_krr.core.abstract.strategies import BaseStrategy, MetricsPodData, PodsTimeData
+
+    from .metrics import PrometheusMetric
 
 logger = logging.getLogger("krr")
 
+_T = TypeVar("_T")
+
+
 class PrometheusMetricsLoader:
+    load_guard: Optional[LoadGuard] = None
+
     def __init__(self, *, cluster: Optional[str] = None) -> None:
         """
         Initializes the Prometheus Loader.
@@ -43,6 +54,8 @@ class PrometheusMetricsLoader:
             )
 
         self.loader = loader
+        self.load_guard = LoadGuard.from_settings()
+        self._prefetched_data: dict[K8sObjectData, MetricsPodData] = {}
 
         logger.info(f"{self.loader.name()} connected successfully for {cluster or 'default'} cluster")
 
@@ -77,6 +90,9 @@ class PrometheusMetricsLoader:
 
         return None
 
+    async def close(self) -> None:
+        await self.loader.close()
+
     async def get_history_range(
         self, history_duration: datetime.timedelta
     ) -> Optional[tuple[datetime.datetime, datetime.datetime]]:
@@ -89,6 +105,26 @@ class PrometheusMetricsLoader:
             logger.exception(f"Failed to load pods for {object}: {e}")
             return []
 
+    async def check_load(
+        self, objects: list[K8sObjectData], period: datetime.timedelta, step: datetime.timedelta
+    ) -> Optional[LoadVerdict]:
+        """
+        Judges how to load the metrics of a workload (the objects of its containers, with their pods already loaded)
+        within the budgets of the load guard, from the count of its series.
+        Returns None if the load guard is disabled, or the series could not be counted.
+        """
+
+        if self.load_guard is None or objects[0].pods == []:
+            return None
+
+        try:
+            series = await self.loader.count_series(objects, period)
+        except Exception as e:
+            logger.warning(f"Failed to count the series of {objects[0]}, will load its metrics unguarded: {e}")
+            return None
+
+        return self.load_guard.judge(series, len(objects[0].pods), period, step)
+
     async def get_cluster_summary(self) -> Dict[str, Any]:
         try:
             return await self.loader.get_cluster_summary()
@@ -103,6 +139,7 @@ class PrometheusMetricsLoader:
         period: datetime.timedelta,
         *,
         step: datetime.timedelta = datetime.timedelta(minutes=30),
+        max_pods: Optional[int] = None,
     ) -> MetricsPodData:
         """
         Gathers data from Prometheus for a specified object and resource.
@@ -112,12 +149,222 @@ class PrometheusMetricsLoader:
             resource (ResourceType): The resource type.
             period (datetime.timedelta): The time period for which to gather data.
             step (datetime.timedelta, optional): The time step between data points. Defaults to 30 minutes.
+            max_pods (Optional[int], optional): If set, the pods are split into batches of at most this many pods,
+                which are gathered one after another (see `check_load`).
 
         Returns:
             ResourceHistoryData: The gathered resource history data.
         """
 
-        return {
-            MetricLoader.__name__: await self.loader.gather_data(object, MetricLoader, period, step)
-            for MetricLoader in strategy.metrics
-        }
+        if object in self._prefetched_data:
+            return self._prefetched_data.pop(object)
+
+        plan = await self._plan_reductions(strategy, [object], period, step)
+        if max_pods is None:
+            return plan.apply(await self._gather_metrics(object, plan, period, step))
+
+        # NOTE: The batches are gathered one after another, so that only a single one loads the backend at a time
+        data: MetricsPodData = {}
+        for batch in object.split_into_batches(max_pods):
+            for name, pods_data in (await self._gather_metrics(batch, plan, period, step)).items():
+                data.setdefault(name, {}).update(pods_data)
+        return plan.apply(data)
+
+    async def _gather_metrics(
+        self, object: K8sObjectData, plan: ReductionPlan, period: datetime.timedelta, step: datetime.timedelta
+    ) -> MetricsPodData:
+        """Gathers the metrics of the plan for the object, before the plan is applied."""
+
+        # NOTE: Metric loaders are independent, so they are fetched concurrently (up to settings.metrics_fanout at once).
+        # Loaders are expected to handle query errors themselves, so if any of them still fails,
+        # the whole object is failed and the remaining loaders are cancelled.
+        semaphore = asyncio.Semaphore(settings.metrics_fanout)
+
+        async def _gather_metric(MetricLoader: type[PrometheusMetric]) -> MetricsPodData:
+            async with semaphore:
+                return {MetricLoader.__name__: await self.loader.gather_data(object, MetricLoader, period, step)}
+
+        async def _gather_fused_metrics(MetricLoaders: list[type[PrometheusMetric]]) -> MetricsPodData:
+            async with semaphore:
+                return await self.loader.gather_fused_data(object, MetricLoaders, period, step)
+
+        fused_metrics = self._get_fused_metrics(plan.metrics)
+        tasks = [
+            asyncio.create_task(_gather_metric(MetricLoader))
+            for MetricLoader in plan.metrics
+            if MetricLoader not in fused_metrics
+        ]
+        if fused_metrics != []:
+            tasks.append(asyncio.create_task(_gather_fused_metrics(fused_metrics)))
+
+        results = await self._gather_tasks(tasks)
+
+        data: MetricsPodData = {}
+        for result in results:
+            data.update(result)
+        return data
+
+    async def prefetch_workload_data(
+        self,
+        objects: list[K8sObjectData],
+        strategy: BaseStrategy,
+        period: datetime.timedelta,
+        *,
+        step: datetime.timedelta = datetime.timedelta(minutes=30),
+    ) -> None:
+        """
+        Gathers data for all the containers of a workload at once, issuing one query per metric instead of one per
+        container, as the containers share the same pods.
+        The pods of the objects should already be loaded, and be the same for all of them.
+        The prefetched data is then returned by `gather_data` for each of the objects.
+
+        Args:
+            objects (list[K8sObjectData]): The objects of each of the workload's containers.
+            strategy (BaseStrategy): The strategy, which metrics should be gathered.
+            period (datetime.timedelta): The time period for which to gather data.
+            step (datetime.timedelta, optional): The time step between data points. Defaults to 30 minutes.
+        """
+
+        semaphore = asyncio.Semaphore(settings.metrics_fanout)
+
+        async def _gather_metric(MetricLoader: type[PrometheusMetric]) -> dict[K8sObjectData, MetricsPodData]:
+            async with semaphore:
+                workload_data = await self.loader.gather_workload_data(objects, MetricLoader, period, step)
+            return {object: {MetricLoader.__name__: data} for object, data in workload_data.items()}
+
+        async def _gather_fused_metrics(
+            MetricLoaders: list[type[PrometheusMetric]],
+        ) -> dict[K8sObjectData, MetricsPodData]:
+            async with semaphore:
+                return await self.loader.gather_fused_workload_data(objects, MetricLoaders, period, step)
+
+        plan = await self._plan_reductions(strategy, objects, period, step)
+        fused_metrics = self._get_fused_metrics(plan.metrics)
+        tasks = [
+            asyncio.create_task(_gather_metric(MetricLoader))
+            for MetricLoader in plan.metrics
+            if MetricLoader not in fused_metrics
+        ]
+        if fused_metrics != []:
+            tasks.append(asyncio.create_task(_gather_fused_metrics(fused_metrics)))
+
+        try:
+            results = await self._gather_tasks(tasks)
+        except Exception as e:
+            # NOTE: The containers are not prefetched, so `gather_data` gathers them one by one instead
+            logger.warning(
+                f"Failed to prefetch the metrics of {objects[0]}, will gather its containers one by one: {e}"
+            )
+            return
+
+        data_by_object: dict[K8sObjectData, MetricsPodData] = {}
+        for result in results:
+            for object, data in result.items():
+                data_by_object.setdefault(object, {}).update(data)
+        self._prefetched_data.update({object: plan.apply(data) for object, data in data_by_object.items()})
+
+    async def _plan_reductions(
+        self,
+        strategy: BaseStrategy,
+        objects: list[K8sObjectData],
+        period: datetime.timedelta,
+        step: datetime.timedelta,
+    ) -> ReductionPlan:
+        """
+        Plans the metrics to gather for the strategy and the objects, pushing its reductions down into the queries
+        if it is enabled and the backend supports it, and the cost planner (if enabled) estimates it to be cheaper.
+        """
+
+        pushdown = settings.reduction_pushdown and self.loader.supports_subqueries
+        reductions = dict(strategy.reductions)
+        if not pushdown or reductions == {} or self.loader.cost_planner is None:
+            return ReductionPlan(strategy, pushdown=pushdown)
+
+        planner = await self.loader.get_cost_planner()
+        return ReductionPlan(
+            strategy, pushdown=pushdown, choose=lambda reduction: planner.choose(reduction, objects, period, step)
+        )
+
+    @staticmethod
+    async def _gather_tasks(tasks: list[asyncio.Task[_T]]) -> list[_T]:
+        """Gathers the results of the tasks, cancelling the remaining ones if any of them fails."""
+
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    @staticmethod
+    def _get_fused_metrics(metrics: list[type[PrometheusMetric]]) -> list[type[PrometheusMetric]]:
+        """
+        The metrics that are loaded with a single (fused) query, if there are at least two of them.
+        """
+
+        if not settings.fuse_queries:
+            return []
+
+        fused_metrics = [MetricLoader for MetricLoader in metrics if MetricLoader.supports_fusion()]
+        return fused_metrics if len(fused_metrics) >= 2 else []
+
+    async def prefetch_bulk_data(
+        self,
+        objects: list[K8sObjectData],
+        strategy: BaseStrategy,
+        period: datetime.timedelta,
+        *,
+        step: datetime.timedelta = datetime.timedelta(minutes=30),
+    ) -> None:
+        """
+        Gathers data for many objects at once, issuing one query per (namespace, metric) instead of one per object.
+        The pods of the objects should already be loaded, as they are used to route the results back to the objects.
+        The prefetched data is then returned by `gather_data` for each of the objects.
+
+        Args:
+            objects (list[K8sObjectData]): The Kubernetes objects.
+            strategy (BaseStrategy): The strategy, which metrics should be gathered.
+            period (datetime.timedelta): The time period for which to gather data.
+            step (datetime.timedelta, optional): The time step between data points. Defaults to 30 minutes.
+        """
+
+        namespaces: defaultdict[str, list[K8sObjectData]] = defaultdict(list)
+        for object in objects:
+            if object.pods != []:
+                namespaces[object.namespace].append(object)
+
+        # NOTE: The queries of all the namespaces share the fan-out, as in `gather_data`
+        semaphore = asyncio.Semaphore(settings.metrics_fanout)
+
+        async def _gather_metric(
+            namespace: str, namespace_objects: list[K8sObjectData], MetricLoader: type[PrometheusMetric]
+        ) -> dict[K8sObjectData, PodsTimeData]:
+            async with semaphore:
+                return await self.loader.gather_namespace_data(
+                    namespace, namespace_objects, MetricLoader, period, step
+                )
+
+        async def _prefetch_namespace(namespace: str, namespace_objects: list[K8sObjectData]) -> None:
+            plan = await self._plan_reductions(strategy, namespace_objects, period, step)
+            tasks = [
+                asyncio.create_task(_gather_metric(namespace, namespace_objects, MetricLoader))
+                for MetricLoader in plan.metrics
+            ]
+            try:
+                results = await self._gather_tasks(tasks)
+            except Exception as e:
+                # NOTE: The objects of the namespace are not prefetched, so `gather_data` gathers them one by one
+                logger.warning(
+                    f"Failed to prefetch the metrics of {namespace} namespace, will gather its objects one by one: {e}"
+                )
+                return
+
+            data_by_object: dict[K8sObjectData, MetricsPodData] = {}
+            for MetricLoader, namespace_data in zip(plan.metrics, results):
+                for object, data in namespace_data.items():
+                    data_by_object.setdefault(object, {})[MetricLoader.__name__] = data
+            self._prefetched_data.update({object: plan.apply(data) for object, data in data_by_object.items()})
+
+        await asyncio.gather(
+            *[_prefetch_namespace(namespace, namespace_objects) for namespace, namespace_objects in namespaces.items()]
+        )
@@ -1,3 +1,6 @@
-from .base import PrometheusMetric
+from .base import PrometheusMetric, QueryOptions
+from .fused import FusedMetric
+from .reduced import ReducedMetric
+from .sketched import SketchedMetric
 from .cpu import CPUAmountLoader, CPULoader, PercentileCPULoader
 from .memory import MaxMemoryLoader, MemoryAmountLoader, MemoryLoader, MaxOOMKilledMemoryLoader
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
-import abc
 import asyncio
 import datetime
 import enum
+import math
+from collections import defaultdict
 from concurrent.futures import ThreadPoolExecutor
-from functools import reduce
-from typing import Any, Optional, TypedDict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Hashable, Optional, TypedDict, Union
+from urllib.parse import quote_plus, urlencode
 
 import numpy as np
 import pydantic as pd
@@ -15,13 +17,79 @@ from tenacity import retry, stop_after_attempt, wait_random
 
 from robusta_krr.core.abstract.metrics import BaseMetric
 from robusta_krr.core.abstract.strategies import PodsTimeData
+from robusta_krr.core.abstract.timeseries import SteppedSeries
 from robusta_krr.core.models.config import settings
-from robusta_krr.core.models.objects import K8sObjectData
+from robusta_krr.core.models.objects import K8sObjectData, PodData
+
+from ..http_client import AsyncPrometheusClient
+from ..metrics_cache import CacheEntry, MetricsCache, merge_pods_data
+from ..recording_rules import CPU_USAGE_RECORD, MEMORY_USAGE_RECORD
+from ..single_flight import SingleFlight
+from .resample import LOOKBACK_DELTA
+
+
+# The intermediate owner of the pods of each kind: (owner kind, kube-state-metrics owner metric, owner name label),
+# the pods of the other kinds are owned by the object directly
+OWNER_CHAINS = {
+    "Deployment": ("ReplicaSet", "kube_replicaset_owner", "replicaset"),
+    "Rollout": ("ReplicaSet", "kube_replicaset_owner", "replicaset"),
+    "DeploymentConfig": ("ReplicationController", "kube_replicationcontroller_owner", "replicationcontroller"),
+    "CronJob": ("Job", "kube_job_owner", "job_name"),
+}
+
+# A synthetic label, which tells the loader of each series in the result of a fused query
+FUSED_METRIC_LABEL = "__krr_metric"
 
 
 class PrometheusSeries(TypedDict):
     metric: dict[str, Any]
-    values: list[list[float]]
+    # NOTE: The series decoded by the async client already have the samples as a (N, 2) numpy array
+    values: Union[list[list[float]], np.ndarray]
+
+
+class JobsFilter:
+    """
+    Picks a single series for each target out of the series that were scraped by multiple jobs, in a single pass.
+
+    Takes the kubelet series if there is exactly one, otherwise the series of the first job alphabetically.
+    Series without a target (`key` returns None) are dropped, unless there is only one series at all.
+    """
+
+    def __init__(self, key: Callable[[PrometheusSeries], Optional[Hashable]]) -> None:
+        self.key = key
+        self._count = 0
+        self._single: Optional[PrometheusSeries] = None
+        # target -> (kubelet series, number of kubelet series, series of the first job alphabetically)
+        self._targets: dict[Hashable, tuple[Optional[PrometheusSeries], int, PrometheusSeries]] = {}
+
+    def add(self, series: PrometheusSeries) -> None:
+        self._count += 1
+        self._single = series if self._count == 1 else None
+
+        target = self.key(series)
+        if target is None:
+            return
+
+        job = series["metric"].get("job", "")
+        if target not in self._targets:
+            self._targets[target] = (series, 1, series) if job == "kubelet" else (None, 0, series)
+            return
+
+        kubelet, kubelet_count, first = self._targets[target]
+        if job == "kubelet":
+            kubelet, kubelet_count = series, kubelet_count + 1
+        if job < first["metric"].get("job", ""):
+            first = series
+        self._targets[target] = (kubelet, kubelet_count, first)
+
+    def result(self) -> list[PrometheusSeries]:
+        if self._single is not None:
+            return [self._single]
+
+        return [
+            kubelet if kubelet is not None and kubelet_count == 1 else first
+            for kubelet, kubelet_count, first in self._targets.values()
+        ]
 
 
 class QueryType(str, enum.Enum):
@@ -37,6 +105,56 @@ class PrometheusMetricData(pd.BaseModel):
     type: QueryType
 
 
+@dataclass(frozen=True)
+class QueryOptions:
+    """
+    The options of the metric queries, which a metrics service builds for all of its loaders
+    (see `PrometheusMetricsService.get_query_options`).
+
+    `max_query_size`: if the pods selector makes the query too large for the backend,
+    the query is split into multiple sub-queries.
+    The pods are packed into each sub-query until its encoded size would exceed the limit (in bytes).
+    Set to None to disable batching.
+
+    `max_range_points`: if a range query would return more points per series than the backend allows,
+    its time range is split into step aligned shards, which are fetched concurrently and stitched back together.
+    `range_shard_duration` optionally also limits the duration of each shard, to parallelize long range queries.
+
+    If `recording_rules` is set, the per-container usage (see `PrometheusMetric.cpu_usage_query`
+    and `PrometheusMetric.memory_usage_query`) is read from the series recorded by the rules of `krr rules generate`,
+    instead of being computed from the raw cAdvisor metrics.
+
+    `query_params` are additional parameters sent with every query (e.g. the resolution and deduplication of Thanos).
+
+    If `export` is set, the samples of the loaders with an `exported_metric` are exported instead of being queried
+    (see `VictoriaMetricsService`).
+
+    If `owner_queries` is set, the series of an object are selected by a join with the pods of its owner
+    (see `PrometheusMetric.get_owner_pods_query`) instead of by a regex of all its pods,
+    so the size of the query does not grow with pod churn.
+    The export API only takes series selectors, so the owner queries can not be exported.
+
+    The samples of each pod are returned as a `SteppedSeries` of `values_dtype` values (without a timestamps column).
+    """
+
+    max_query_size: Optional[int] = None
+    max_range_points: Optional[int] = None
+    range_shard_duration: Optional[datetime.timedelta] = None
+    recording_rules: bool = False
+    query_params: dict[str, Any] = field(default_factory=dict)
+    export: bool = False
+    owner_queries: bool = False
+    values_dtype: str = "float64"
+
+    def __post_init__(self) -> None:
+        if self.max_query_size is not None and self.max_query_size <= 0:
+            raise ValueError("max_query_size must be positive")
+        if self.max_range_points is not None and self.max_range_points <= 0:
+            raise ValueError("max_range_points must be positive")
+        if self.export and self.owner_queries:
+            raise ValueError("The owner queries can not be exported")
+
+
 class PrometheusMetric(BaseMetric):
     """
     Base class for all metric loaders.
@@ -50,28 +168,62 @@ class PrometheusMetric(BaseMetric):
     `filtering`: if multiple metrics with the same name were found, searches for the kubelet metric.
     If not found - returns first one in alphabetical order. Set to False if you want to disable this behavior.
 
-    `pods_batch_size`: if the number of pods is too large for a single query, the query is split into multiple sub-queries.
-    Each sub-query result is then combined into a single result using the `combine_batches` method.
+    The queries are built and split according to the `options` (see `QueryOptions`).
+    If the query is split into multiple sub-queries of batches of pods,
+    each sub-query result is then combined into a single result using the `combine_batches` method.
     You can override this method to change the way the results are combined.
-    This parameter specifies the maximum number of pods per query.
-    Set to None to disable batching
+
+    `pods_batch_size`: optionally also limits the number of pods per sub-query. By default only the size is limited.
+
+    `fusable`: whether the loader's query can be fused with the queries of other fusable loaders into a single query
+    (see `FusedMetric`). Only instant queries built by `build_query` can be fused.
+
+    If a metrics cache is provided, the results of range queries are stored on disk and extended incrementally,
+    so a rerun only fetches the samples outside of the cached window.
+
+    If a single-flight is provided, identical queries running at the same time (e.g. from multiple loaders) are sent only once.
+
+    `exported_metric`: the raw metric of a range loader, whose samples can be exported (see `VictoriaMetricsService`)
+    instead of being queried, if the `export` option is set.
+    The exported samples are then aggregated client-side by `aggregate_exported`, to the same result as `build_query`.
     """
 
     query_type: QueryType = QueryType.Query
     filtering: bool = True
-    pods_batch_size: Optional[int] = 50
+    pods_batch_size: Optional[int] = None
     warning_on_no_data: bool = True
+    fusable: bool = False
+    exported_metric: Optional[str] = None
 
     def __init__(
         self,
         prometheus: CustomPrometheusConnect,
         service_name: str,
         executor: Optional[ThreadPoolExecutor] = None,
+        client: Optional[AsyncPrometheusClient] = None,
+        cache: Optional[MetricsCache] = None,
+        single_flight: Optional[SingleFlight[list[PrometheusSeries]]] = None,
+        options: Optional[QueryOptions] = None,
     ) -> None:
+        options = options or QueryOptions()
+
         self.prometheus = prometheus
         self.service_name = service_name
 
         self.executor = executor
+        self.client = client
+        self.cache = cache
+        self.single_flight = single_flight
+        self.options = options
+        self.max_query_size = options.max_query_size
+        self.max_range_points = options.max_range_points
+        self.range_shard_duration = options.range_shard_duration
+        self.recording_rules = options.recording_rules
+        self.query_params = options.query_params
+        # NOTE: Only the range loaders with an exported metric can be exported, the others are always queried
+        self.export = options.export and self.supports_export()
+        self.owner_queries = options.owner_queries
+        self.values_dtype = np.dtype(options.values_dtype)
 
         if self.pods_batch_size is not None and self.pods_batch_size <= 0:
             raise ValueError("pods_batch_size must be positive")
@@ -87,10 +239,97 @@ class PrometheusMetric(BaseMetric):
             return ""
         return f', {settings.prometheus_label}="{settings.prometheus_cluster_label}"'
 
-    @abc.abstractmethod
+    def get_object_selector(self, object: K8sObjectData) -> str:
+        """
+        Generates the label selector matching the series of a single object's container.
+
+        Args:
+        object (K8sObjectData): The object for which metrics need to be fetched.
+
+        Returns:
+        str: a promql safe label selector (without the curly braces).
+        """
+
+        pods_selector = "|".join(pod.name for pod in object.pods)
+        cluster_label = self.get_prometheus_cluster_label()
+        container_selector = self.get_container_selector(object.container)
+        return f'namespace="{object.namespace}", pod=~"{pods_selector}", {container_selector}{cluster_label}'
+
+    @staticmethod
+    def get_container_selector(container: str) -> str:
+        """
+        Generates the label matcher of a container, or of multiple containers separated by "|" (see `get_workload`).
+        Container names can not contain "|", so it is never a part of a single name.
+        """
+
+        if "|" in container:
+            return f'container=~"{container}"'
+        return f'container="{container}"'
+
+    def get_namespace_selector(self, namespace: str) -> str:
+        """
+        Generates the label selector matching the series of all containers in a namespace.
+
+        Args:
+        namespace (str): The namespace for which metrics need to be fetched.
+
+        Returns:
+        str: a promql safe label selector (without the curly braces).
+        """
+
+        cluster_label = self.get_prometheus_cluster_label()
+        return f'namespace="{namespace}", container!="", container!="POD"{cluster_label}'
+
+    def get_owner_pods_query(self, object: K8sObjectData, duration: str) -> str:
+        """
+        Generates a query of the pods owned by the object (with only the `pod` label),
+        through the owner chain reported by kube-state-metrics, e.g. Deployment -> ReplicaSet -> Pod.
+
+        Range queries are joined with the pods owned at each point of the range,
+        while instant queries with the pods owned at any point of the duration.
+
+        Args:
+        object (K8sObjectData): The object for which metrics need to be fetched.
+        duration (str): a string for duration of the query.
+
+        Returns:
+        str: The query string.
+        """
+
+        cluster_label = self.get_prometheus_cluster_label()
+
+        def owned(metric: str, selector: str) -> str:
+            if self.query_type == QueryType.QueryRange:
+                return f"{metric}{{{selector}{cluster_label}}}"
+            return f"max_over_time({metric}{{{selector}{cluster_label}}}[{duration}])"
+
+        object_selector = f'namespace="{object.namespace}", owner_kind="{object.kind}", owner_name="{object.name}"'
+        if object.kind not in OWNER_CHAINS:
+            return f"""
+                max by (pod) (
+                    {owned("kube_pod_owner", object_selector)}
+                )
+            """
+
+        pod_owner_kind, owner_metric, owner_label = OWNER_CHAINS[object.kind]
+        return f"""
+            max by (pod) (
+                label_replace(
+                    {owned("kube_pod_owner", f'namespace="{object.namespace}", owner_kind="{pod_owner_kind}"')},
+                    "{owner_label}", "$1", "owner_name", "(.*)"
+                )
+                and on ({owner_label})
+                {owned(owner_metric, object_selector)}
+            )
+        """
+
     def get_query(self, object: K8sObjectData, duration: str, step: str) -> str:
         """
-        This method should be implemented by all subclasses to provide a query string to fetch metrics.
+        Provides a query string to fetch metrics for a single object.
+
+        By default the query is built by `build_query` from the object's label selector.
+        Override this method instead of `build_query` if the query can not be expressed through a selector,
+        but keep in mind that such loaders will not support bulk (namespace-wide) queries.
 
         Args:
         object (K8sObjectData): The object for which metrics need to be fetched.
@@ -101,7 +340,113 @@ class PrometheusMetric(BaseMetric):
         str: The query string.
         """
 
-        pass
+        if self.owner_queries:
+            cluster_label = self.get_prometheus_cluster_label()
+            selector = f'namespace="{object.namespace}", {self.get_container_selector(object.container)}{cluster_label}'
+            return f"""
+                (
+                    {self.build_query(selector, duration, step)}
+                )
+                and on (pod)
+                {self.get_owner_pods_query(object, duration)}
+            """
+
+        return self.build_query(self.get_object_selector(object), duration, step)
+
+    def build_query(self, selector: str, duration: str, step: str) -> str:
+        """
+        This method should be implemented by subclasses to provide a query string for a label selector.
+
+        The query should keep the `pod` and `container` labels in its result series,
+        as they are used to route the results of bulk queries back to the objects.
+
+        Args:
+        selector (str): a label selector (without the curly braces) to put into the series selectors.
+        duration (str): a string for duration of the query.
+        step (str): a string for the step size of the query.
+
+        Returns:
+        str: The query string.
+        """
+
+        raise NotImplementedError(f"{self.__class__.__name__} should implement either get_query or build_query")
+
+    def cpu_usage_query(self, selector: str, step: str) -> str:
+        """
+        Provides the per-container CPU usage rate (in cores) for a label selector.
+
+        With recording rules, the rate is read from the recorded series,
+        which uses the rate window of the rules instead of the step.
+        """
+
+        if self.recording_rules:
+            return f"""
+                max(
+                    {CPU_USAGE_RECORD}{{
+                        {selector}
+                    }}
+                ) by (container, pod, job)
+            """
+
+        return f"""
+            max(
+                rate(
+                    container_cpu_usage_seconds_total{{
+                        {selector}
+                    }}[{step}]
+                )
+            ) by (container, pod, job)
+        """
+
+    def memory_usage_query(self, selector: str) -> str:
+        """
+        Provides the per-container memory usage (working set, in bytes) for a label selector.
+        """
+
+        metric = MEMORY_USAGE_RECORD if self.recording_rules else "container_memory_working_set_bytes"
+        return f"""
+            max(
+                {metric}{{
+                    {selector}
+                }}
+            ) by (container, pod, job)
+        """
+
+    @classmethod
+    def supports_bulk(cls) -> bool:
+        """
+        Whether the loader can be queried for a whole namespace at once.
+        """
+
+        return cls.get_query is PrometheusMetric.get_query and cls.build_query is not PrometheusMetric.build_query
+
+    @classmethod
+    def supports_fusion(cls) -> bool:
+        """
+        Whether the loader can be queried together with other loaders in a single fused query.
+        """
+
+        return cls.fusable and cls.query_type == QueryType.Query and cls.supports_bulk()
+
+    @classmethod
+    def supports_export(cls) -> bool:
+        """
+        Whether the loader's data can be aggregated client-side from the exported raw samples.
+        """
+
+        return cls.exported_metric is not None and cls.query_type == QueryType.QueryRange
+
+    def aggregate_exported(
+        self, timestamps: np.ndarray, values: np.ndarray, grid: np.ndarray, step: datetime.timedelta
+    ) -> np.ndarray:
+        """
+        This method should be implemented by the loaders with `exported_metric`,
+        to evaluate the inner expression of the query for a single raw series at each timestamp of the grid.
+
+        The results of the series are then combined by `max(...) by (container, pod, job)`.
+        """
+
+        raise NotImplementedError(f"{self.__class__.__name__} should implement aggregate_exported")
 
     def _step_to_string(self, step: datetime.timedelta) -> str:
         """
@@ -125,24 +470,71 @@ class PrometheusMetric(BaseMetric):
                 start_time=data.start_time,
                 end_time=data.end_time,
                 step=data.step,
+                params=self.query_params,
             )
             return response["result"]
         else:
             # regular query, lighter on preformance
             try:
-                response = self.prometheus.safe_custom_query(query=data.query)
+                response = self.prometheus.safe_custom_query(query=data.query, params=self.query_params)
             except Exception as e:
                 raise ValueError(f"Failed to run query: {data.query}") from e
-            results = response["result"]
-            # format the results to return the same format as custom_query_range
-            for result in results:
-                result["values"] = [result.pop("value")]
-            return results
+            return self._format_query_result(response["result"])
+
+    async def _query_prometheus_async(self, data: PrometheusMetricData) -> list[PrometheusSeries]:
+        # NOTE: The retries are handled by the client, within the retry budget of the whole scan
+        assert self.client is not None
+
+        if data.type == QueryType.QueryRange:
+            stream = self.client.stream_query_range(
+                query=data.query,
+                start_time=data.start_time,
+                end_time=data.end_time,
+                step=data.step,
+                params=self.query_params,
+            )
+            return await self._collect_series(stream)
+        else:
+            # regular query, lighter on preformance
+            try:
+                return await self._collect_series(self.client.stream_query(query=data.query, params=self.query_params))
+            except Exception as e:
+                raise ValueError(f"Failed to run query: {data.query}") from e
+
+    async def _collect_series(self, stream: AsyncIterator[PrometheusSeries]) -> list[PrometheusSeries]:
+        """
+        Collects the decoded series, filtering out the duplicated jobs while the response is being decoded.
+        """
+
+        if not self.filtering:
+            return [series async for series in stream]
+
+        # NOTE: The container is a part of the key, as bulk queries return multiple containers of the same pod
+        jobs_filter = JobsFilter(self._get_series_key)
+        async for series in stream:
+            jobs_filter.add(series)
+        return jobs_filter.result()
+
+    @staticmethod
+    def _get_series_key(series: PrometheusSeries) -> Optional[tuple[str, Optional[str], Optional[str]]]:
+        target_name = PrometheusMetric.get_target_name(series)
+        if target_name is None:
+            return None
+        return target_name, series["metric"].get("container"), series["metric"].get(FUSED_METRIC_LABEL)
+
+    @staticmethod
+    def _format_query_result(results: list[dict[str, Any]]) -> list[PrometheusSeries]:
+        # format the results to return the same format as custom_query_range
+        for result in results:
+            result["values"] = [result.pop("value")]
+        return results
 
     async def query_prometheus(self, data: PrometheusMetricData) -> list[PrometheusSeries]:
         """
         Asynchronous method that queries Prometheus to fetch metrics.
 
+        Uses the native async client if it was provided, otherwise runs the prometrix client in the executor.
+
         Args:
         metric (Metric): An instance of the Metric class specifying what metrics to fetch.
 
@@ -150,9 +542,58 @@ class PrometheusMetric(BaseMetric):
         list[dict]: A list of dictionary where each dictionary represents metrics for a pod.
         """
 
+        if self.single_flight is not None:
+            return await self.single_flight.run(self._get_single_flight_key(data), lambda: self._query_prometheus(data))
+
+        return await self._query_prometheus(data)
+
+    def _get_single_flight_key(self, data: PrometheusMetricData) -> Hashable:
+        """The key of the identical queries, which share a single result (see `SingleFlight`)."""
+
+        return (
+            data.type,
+            data.query,
+            round(data.start_time.timestamp()),
+            round(data.end_time.timestamp()),
+            data.step,
+            self.filtering,
+            tuple(sorted(self.query_params.items())),
+        )
+
+    async def _query_prometheus(self, data: PrometheusMetricData) -> list[PrometheusSeries]:
+        if self.client is not None:
+            return await self._query_prometheus_async(data)
+
         loop = asyncio.get_running_loop()
         return await loop.run_in_executor(self.executor, lambda: self._query_prometheus_sync(data))
 
+    def _get_time_range(
+        self, period: datetime.timedelta, step: datetime.timedelta
+    ) -> tuple[datetime.datetime, datetime.datetime]:
+        """
+        Calculates the scan window for the given period, aligned to the step boundaries.
+
+        Aligned windows of consecutive runs share the same sample timestamps,
+        which is what allows the cached samples to be extended with only the missing tail.
+
+        Args:
+        period (datetime.timedelta): The time period for which metrics need to be loaded.
+        step (datetime.timedelta): The time interval between successive metric values.
+
+        Returns:
+        tuple[datetime.datetime, datetime.datetime]: The start and end time of the window.
+        """
+
+        step_seconds = max(round(step.total_seconds()), 1)
+        now = datetime.datetime.now(datetime.timezone.utc).timestamp()
+        end = now // step_seconds * step_seconds
+        start = math.ceil((end - period.total_seconds()) / step_seconds) * step_seconds
+
+        return (
+            datetime.datetime.fromtimestamp(start, tz=datetime.timezone.utc),
+            datetime.datetime.fromtimestamp(end, tz=datetime.timezone.utc),
+        )
+
     async def load_data(
         self, object: K8sObjectData, period: datetime.timedelta, step: datetime.timedelta
     ) -> PodsTimeData:
@@ -168,40 +609,280 @@ class PrometheusMetric(BaseMetric):
         ResourceHistoryData: An instance of the ResourceHistoryData class representing the loaded metrics.
         """
 
+        start_time, end_time = self._get_time_range(period, step)
+
+        # NOTE: Only range queries can be extended incrementally,
+        # the results of instant queries (e.g. quantile_over_time) can not be merged with a new window
+        if self.cache is not None and self.query_type == QueryType.QueryRange:
+            return await self._load_data_cached(object, period, step, start_time, end_time)
+
+        return await self._load_data_range(object, period, step, start_time, end_time)
+
+    async def _load_data_range(
+        self,
+        object: K8sObjectData,
+        period: datetime.timedelta,
+        step: datetime.timedelta,
+        start_time: datetime.datetime,
+        end_time: datetime.datetime,
+    ) -> PodsTimeData:
+        results = await self._query_range(object, period, step, start_time, end_time)
+        return self.combine_batches(
+            [self.stitch_shards([self._series_to_pods_data(result, step) for result in shards]) for shards in results]
+        )
+
+    async def _query_range(
+        self,
+        object: K8sObjectData,
+        period: datetime.timedelta,
+        step: datetime.timedelta,
+        start_time: datetime.datetime,
+        end_time: datetime.datetime,
+    ) -> list[list[list[PrometheusSeries]]]:
+        """
+        Queries the series of the object within the time range.
+
+        Returns:
+        list[list[list[PrometheusSeries]]]: The series of each time shard of each batch of pods.
+        """
+
         step_str = f"{round(step.total_seconds())}s"
         duration_str = self._step_to_string(period)
 
-        query = self.get_query(object, duration_str, step_str)
-        end_time = datetime.datetime.utcnow().replace(second=0, microsecond=0)
-        start_time = end_time - period
+        # Here if the query is too large, we split the object into multiple sub-objects and query each of them.
+        batches = self.split_into_batches(object, duration_str, step_str)
 
-        # Here if we split the object into multiple sub-objects, we query each sub-object recursively.
-        if self.pods_batch_size is not None and object.pods_count > self.pods_batch_size:
-            results = await asyncio.gather(
+        if self.export:
+            # NOTE: The export is streamed, so its time range does not have to be split,
+            # but its match is still sent in the URL, so it is split into the same (conservative) batches of pods
+            exports = await asyncio.gather(
+                *[
+                    self.query_export(self.get_object_selector(batch), start_time, end_time, step)
+                    for batch in batches
+                ]
+            )
+            return [[series] for series in exports]
+        # And if the range is too long, we split it into time shards
+        shards = self.split_time_range(start_time, end_time, step)
+
+        results = await asyncio.gather(
+            *[
+                self.query_prometheus(
+                    PrometheusMetricData(
+                        query=self.get_query(batch, duration_str, step_str),
+                        start_time=shard_start,
+                        end_time=shard_end,
+                        step=step_str,
+                        type=self.query_type,
+                    )
+                )
+                for batch in batches
+                for shard_start, shard_end in shards
+            ]
+        )
+
+        return [results[i * len(shards) : (i + 1) * len(shards)] for i in range(len(batches))]
+
+    async def load_workload_data(
+        self, objects: list[K8sObjectData], period: datetime.timedelta, step: datetime.timedelta
+    ) -> dict[K8sObjectData, PodsTimeData]:
+        """
+        Asynchronous method that loads metric data for multiple containers of the same workload (sharing the same pods).
+
+        All the containers are selected by a single query (`container=~"a|b"`),
+        and the series are split by container in memory.
+
+        Args:
+        objects (list[K8sObjectData]): The objects of each of the workload's containers.
+        period (datetime.timedelta): The time period for which metrics need to be loaded.
+        step (datetime.timedelta): The time interval between successive metric values.
+
+        Returns:
+        dict[K8sObjectData, PodsTimeData]: The loaded metrics for each of the objects.
+        """
+
+        if len(objects) == 1 or (self.cache is not None and self.query_type == QueryType.QueryRange):
+            # NOTE: The cache is kept per container, so the containers are loaded (and extended) one by one
+            results = await asyncio.gather(*[self.load_data(object, period, step) for object in objects])
+            return dict(zip(objects, results))
+
+        start_time, end_time = self._get_time_range(period, step)
+        results = await self._query_range(self.get_workload(objects), period, step, start_time, end_time)
+
+        return {
+            object: self.combine_batches(
+                [
+                    self.stitch_shards(
+                        [
+                            self._series_to_pods_data(
+                                [series for series in result if series["metric"].get("container") == object.container],
+                                step,
+                            )
+                            for result in shards
+                        ]
+                    )
+                    for shards in results
+                ]
+            )
+            for object in objects
+        }
+
+    @staticmethod
+    def get_workload(objects: list[K8sObjectData]) -> K8sObjectData:
+        """
+        Combines the objects of the containers of a workload into a single object, selecting all of the containers.
+        """
+
+        return objects[0].copy(update={"container": "|".join(object.container for object in objects)})
+
+    def _get_cache_key(self, object: K8sObjectData, period: datetime.timedelta, step: datetime.timedelta) -> str:
+        assert self.cache is not None
+
+        # NOTE: The pods are excluded from the fingerprint, so the entry stays valid when pods come and go
+        step_str = f"{round(step.total_seconds())}s"
+        query = self.get_query(object.copy(update={"pods": []}), self._step_to_string(period), step_str)
+        fingerprint = f"{self.service_name}\n{self.__class__.__name__}\n{object}\n{query}"
+        return self.cache.make_key(object.cluster, fingerprint, step.total_seconds())
+
+    async def _load_data_cached(
+        self,
+        object: K8sObjectData,
+        period: datetime.timedelta,
+        step: datetime.timedelta,
+        start_time: datetime.datetime,
+        end_time: datetime.datetime,
+    ) -> PodsTimeData:
+        assert self.cache is not None
+
+        key = self._get_cache_key(object, period, step)
+        cached = await self.cache.get(key)
+
+        if cached is None or cached.end < start_time.timestamp() or cached.start > end_time.timestamp():
+            data = await self._load_data_range(object, period, step, start_time, end_time)
+        else:
+            # Pods that were already queried only need the parts of the window outside of the cached one:
+            # the tail after it, and the head before it if the period has grown since,
+            # while pods that are new to the cache need the whole window
+            known_pods = [pod for pod in object.pods if pod.name in cached.pods]
+            new_pods = [pod for pod in object.pods if pod.name not in cached.pods]
+            head_end = datetime.datetime.fromtimestamp(cached.start, tz=datetime.timezone.utc) - step
+            tail_start = datetime.datetime.fromtimestamp(cached.end, tz=datetime.timezone.utc) + step
+
+            windows = []
+            if known_pods != []:
+                windows += [(known_pods, start_time, head_end), (known_pods, tail_start, end_time)]
+            if new_pods != []:
+                windows.append((new_pods, start_time, end_time))
+
+            fetched = await asyncio.gather(
                 *[
-                    self.load_data(splitted_object, period, step)
-                    for splitted_object in object.split_into_batches(self.pods_batch_size)
+                    self._load_data_range(object.copy(update={"pods": pods}), period, step, window_start, window_end)
+                    for pods, window_start, window_end in windows
+                    if window_start <= window_end
                 ]
             )
-            return self.combine_batches(results)
-
-        result = await self.query_prometheus(
-            PrometheusMetricData(
-                query=query,
-                start_time=start_time,
-                end_time=end_time,
-                step=step_str,
-                type=self.query_type,
+            current_pods = {pod.name for pod in object.pods}
+            merged = merge_pods_data(
+                {pod: values for pod, values in cached.data.items() if pod in current_pods},
+                list(fetched),
+                start_time.timestamp(),
             )
+            # NOTE: The cache stores the [timestamp, value] samples, so they are compacted again once merged
+            data = {
+                pod: SteppedSeries.from_samples(values, step.total_seconds(), self.values_dtype)
+                for pod, values in merged.items()
+            }
+
+        await self.cache.put(
+            key,
+            object.cluster,
+            step.total_seconds(),
+            CacheEntry(start=start_time.timestamp(), end=end_time.timestamp(), pods={pod.name for pod in object.pods}, data=data),
         )
+        return data
+
+    async def load_namespace_data(
+        self,
+        namespace: str,
+        objects: list[K8sObjectData],
+        period: datetime.timedelta,
+        step: datetime.timedelta,
+    ) -> dict[K8sObjectData, PodsTimeData]:
+        """
+        Asynchronous method that loads metric data for all the given objects of a namespace with a single query.
+
+        The result series are routed back to the objects through a (pod, container) -> object index,
+        built from the pods already discovered for each object. Series that do not belong to any of the objects are dropped.
+
+        Args:
+        namespace (str): The namespace of the objects.
+        objects (list[K8sObjectData]): The objects for which metrics need to be loaded.
+        period (datetime.timedelta): The time period for which metrics need to be loaded.
+        step (datetime.timedelta): The time interval between successive metric values.
+
+        Returns:
+        dict[K8sObjectData, PodsTimeData]: The loaded metrics for each of the objects.
+        """
+
+        step_str = f"{round(step.total_seconds())}s"
+        duration_str = self._step_to_string(period)
+
+        selector = self.get_namespace_selector(namespace)
+        start_time, end_time = self._get_time_range(period, step)
 
+        if self.export:
+            results = [await self.query_export(selector, start_time, end_time, step)]
+        else:
+            # NOTE: Like in _query_range, a long range is split into time shards, each within the points limit
+            results = await asyncio.gather(
+                *[
+                    self.query_prometheus(
+                        PrometheusMetricData(
+                            query=self.build_query(selector, duration_str, step_str),
+                            start_time=shard_start,
+                            end_time=shard_end,
+                            step=step_str,
+                            type=self.query_type,
+                        )
+                    )
+                    for shard_start, shard_end in self.split_time_range(start_time, end_time, step)
+                ]
+            )
+
+        pods_index: dict[tuple[str, str], K8sObjectData] = {}
+        for object in objects:
+            for pod in object.pods:
+                pods_index.setdefault((pod.name, object.container), object)
+
+        shards_series: list[defaultdict[K8sObjectData, list[PrometheusSeries]]] = []
+        for result in results:
+            object_series: defaultdict[K8sObjectData, list[PrometheusSeries]] = defaultdict(list)
+            for series in result:
+                object = pods_index.get((series["metric"].get("pod"), series["metric"].get("container")))
+                if object is not None:
+                    object_series[object].append(series)
+            shards_series.append(object_series)
+
+        return {
+            object: self.stitch_shards(
+                [self._series_to_pods_data(object_series[object], step) for object_series in shards_series]
+            )
+            for object in objects
+        }
+
+    def _series_to_pods_data(self, result: list[PrometheusSeries], step: datetime.timedelta) -> PodsTimeData:
         if result == []:
             return {}
 
         if self.filtering:
             result = self.filter_prom_jobs_results(result)
 
-        return {pod_result["metric"]["pod"]: np.array(pod_result["values"], dtype=np.float64) for pod_result in result}
+        return {
+            pod_result["metric"]["pod"]: SteppedSeries.from_samples(
+                pod_result["values"], step.total_seconds(), self.values_dtype
+            )
+            for pod_result in result
+        }
 
     # --------------------- Filtering Jobs --------------------- #
 
@@ -222,30 +903,62 @@ class PrometheusMetric(BaseMetric):
         :param series_list_result: list of PrometheusSeries
         """
 
-        if len(series_list_result) == 1:
-            return series_list_result
+        jobs_filter = JobsFilter(PrometheusMetric.get_target_name)
+        for series in series_list_result:
+            jobs_filter.add(series)
+        return jobs_filter.result()
 
-        target_names = {
-            PrometheusMetric.get_target_name(series)
-            for series in series_list_result
-            if PrometheusMetric.get_target_name(series)
-        }
-        return_list: list[PrometheusSeries] = []
+    # --------------------- Batching Queries --------------------- #
 
-        # takes kubelet job if exists, return first job alphabetically if it doesn't
-        for target_name in target_names:
-            relevant_series = [
-                series for series in series_list_result if PrometheusMetric.get_target_name(series) == target_name
-            ]
-            relevant_kubelet_metric = [series for series in relevant_series if series["metric"].get("job") == "kubelet"]
-            if len(relevant_kubelet_metric) == 1:
-                return_list.append(relevant_kubelet_metric[0])
-                continue
-            sorted_relevant_series = sorted(relevant_series, key=lambda s: s["metric"].get("job", ""), reverse=False)
-            return_list.append(sorted_relevant_series[0])
-        return return_list
+    @staticmethod
+    def _get_encoded_size(query: str) -> int:
+        return len(urlencode({"query": query}))
 
-    # --------------------- Batching Queries --------------------- #
+    def split_into_batches(self, object: K8sObjectData, duration: str, step: str) -> list[K8sObjectData]:
+        """
+        Splits the object into sub-objects, so the query of each of them fits into the limits.
+
+        The size of each query is calculated from its encoded length (as it is sent in the POST body),
+        so the number of pods per query adapts to the length of their names.
+
+        Args:
+        object (K8sObjectData): The object for which metrics need to be fetched.
+        duration (str): a string for duration of the query.
+        step (str): a string for the step size of the query.
+
+        Returns:
+        list[K8sObjectData]: The sub-objects, each with a batch of the object's pods.
+        """
+
+        if self.max_query_size is None and self.pods_batch_size is None:
+            return [object]
+
+        base_size = self._get_encoded_size(self.get_query(object.copy(update={"pods": []}), duration, step))
+        # The pods selector might be used multiple times in a query, so measure it with a single character pod name
+        single_pod = object.copy(update={"pods": [PodData(name="a", deleted=False)]})
+        selector_count = self._get_encoded_size(self.get_query(single_pod, duration, step)) - base_size
+        separator_size = len(quote_plus("|"))
+        if selector_count == 0 and self.pods_batch_size is None:
+            # The query does not select the pods by name (e.g. owner queries), so its size does not depend on them
+            return [object]
+
+        batches: list[list[PodData]] = [[]]
+        size = base_size
+        for pod in object.pods:
+            pod_size = selector_count * (len(quote_plus(pod.name)) + separator_size)
+            batch = batches[-1]
+            if batch != [] and (
+                (self.max_query_size is not None and size + pod_size > self.max_query_size)
+                or (self.pods_batch_size is not None and len(batch) >= self.pods_batch_size)
+            ):
+                batches.append([])
+                size = base_size
+            batches[-1].append(pod)
+            size += pod_size
+
+        if len(batches) == 1:
+            return [object]
+        return [object.copy(update={"pods": batch}) for batch in batches]
 
     def combine_batches(self, results: list[PodsTimeData]) -> PodsTimeData:
         """
@@ -258,4 +971,132 @@ class PrometheusMetric(BaseMetric):
         MetricPodData: A combined result.
         """
 
-        return reduce(lambda x, y: x | y, results, {})
+        combined: PodsTimeData = {}
+        for result in results:
+            combined.update(result)
+        return combined
+
+    # --------------------- Sharding Queries --------------------- #
+
+    def split_time_range(
+        self, start_time: datetime.datetime, end_time: datetime.datetime, step: datetime.timedelta
+    ) -> list[tuple[datetime.datetime, datetime.datetime]]:
+        """
+        Splits the time range of a range query into consecutive step aligned shards,
+        so each of them fits into `max_range_points` and `range_shard_duration`.
+
+        Args:
+        start_time (datetime.datetime): The start of the range.
+        end_time (datetime.datetime): The end of the range.
+        step (datetime.timedelta): The time interval between successive metric values.
+
+        Returns:
+        list[tuple[datetime.datetime, datetime.datetime]]: The start and end of each shard.
+        """
+
+        if self.query_type != QueryType.QueryRange:
+            return [(start_time, end_time)]
+
+        shard_points = self.max_range_points
+        if self.range_shard_duration is not None:
+            duration_points = max(int(self.range_shard_duration / step), 1)
+            shard_points = duration_points if shard_points is None else min(shard_points, duration_points)
+
+        if shard_points is None or (end_time - start_time) / step + 1 <= shard_points:
+            return [(start_time, end_time)]
+
+        shards = []
+        shard_start = start_time
+        while shard_start <= end_time:
+            shard_end = min(shard_start + step * (shard_points - 1), end_time)
+            shards.append((shard_start, shard_end))
+            shard_start = shard_end + step
+        return shards
+
+    def stitch_shards(self, results: list[PodsTimeData]) -> PodsTimeData:
+        """
+        Stitches the results of consecutive time shards into a single result, concatenating the samples of each pod.
+
+        Args:
+        results (list[PodsTimeData]): The results of the shards, in the time order.
+
+        Returns:
+        PodsTimeData: A stitched result.
+        """
+
+        if len(results) == 1:
+            return results[0]
+
+        pods_shards: defaultdict[str, list[np.ndarray]] = defaultdict(list)
+        for result in results:
+            for pod, values in result.items():
+                pods_shards[pod].append(values)
+
+        return {pod: self._concatenate_shards(shards) for pod, shards in pods_shards.items()}
+
+    @staticmethod
+    def _concatenate_shards(shards: list[Any]) -> Any:
+        if len(shards) == 1:
+            return shards[0]
+        if all(isinstance(shard, SteppedSeries) and shard.step == shards[0].step for shard in shards):
+            return SteppedSeries.concatenate(shards)
+        return np.concatenate(shards)
+
+    # --------------------- Exporting Samples --------------------- #
+
+    async def query_export(
+        self, selector: str, start_time: datetime.datetime, end_time: datetime.datetime, step: datetime.timedelta
+    ) -> list[PrometheusSeries]:
+        """
+        Exports the raw samples of `exported_metric` for the selector and aggregates them client-side,
+        to the same series the range query of the loader would have returned.
+
+        Each exported series is aggregated as soon as it is received, so only the aggregated series are kept in memory.
+
+        Args:
+        selector (str): a label selector (without the curly braces).
+        start_time (datetime.datetime): The start of the range.
+        end_time (datetime.datetime): The end of the range.
+        step (datetime.timedelta): The time interval between successive metric values.
+
+        Returns:
+        list[PrometheusSeries]: The aggregated series.
+        """
+
+        async def export() -> list[PrometheusSeries]:
+            assert self.client is not None
+
+            grid = np.arange(start_time.timestamp(), end_time.timestamp() + 1, step.total_seconds())
+            # The samples before the range are needed for the windows (and the lookback) of its first points
+            export_start = start_time - max(step, datetime.timedelta(seconds=LOOKBACK_DELTA))
+
+            labels = ["container", "pod", "job"]
+            aggregated: dict[tuple[Optional[str], ...], np.ndarray] = {}
+            match = f"{self.exported_metric}{{{selector}}}"
+            async for series in self.client.stream_export(match, export_start, end_time):
+                key = tuple(series["metric"].get(label) for label in labels)
+                values = self.aggregate_exported(series["values"][:, 0], series["values"][:, 1], grid, step)
+                # NOTE: A series might be exported in multiple parts, which are combined the same way as the series
+                aggregated[key] = np.fmax(aggregated[key], values) if key in aggregated else values
+
+            result: list[PrometheusSeries] = []
+            for key, values in aggregated.items():
+                present = ~np.isnan(values)
+                if not present.any():
+                    continue
+                metric = {label: value for label, value in zip(labels, key) if value is not None}
+                result.append({"metric": metric, "values": np.stack([grid[present], values[present]], axis=1)})
+            return result
+
+        if self.single_flight is not None:
+            key = (
+                "export",
+                self.__class__.__name__,
+                selector,
+                round(start_time.timestamp()),
+                round(end_time.timestamp()),
+                step.total_seconds(),
+            )
+            return await self.single_flight.run(key, export)
+
+        return await export()
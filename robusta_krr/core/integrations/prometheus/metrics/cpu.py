@@ -1,6 +1,9 @@
-from robusta_krr.core.models.objects import K8sObjectData
+import datetime
+
+import numpy as np
 
 from .base import PrometheusMetric, QueryType
+from .resample import rate_over_grid
 
 
 class CPULoader(PrometheusMetric):
@@ -9,22 +12,15 @@ class CPULoader(PrometheusMetric):
     """
 
     query_type: QueryType = QueryType.QueryRange
+    exported_metric = "container_cpu_usage_seconds_total"
 
-    def get_query(self, object: K8sObjectData, duration: str, step: str) -> str:
-        pods_selector = "|".join(pod.name for pod in object.pods)
-        cluster_label = self.get_prometheus_cluster_label()
-        return f"""
-            max(
-                rate(
-                    container_cpu_usage_seconds_total{{
-                        namespace="{object.namespace}",
-                        pod=~"{pods_selector}",
-                        container="{object.container}"
-                        {cluster_label}
-                    }}[{step}]
-                )
-            ) by (container, pod, job)
-        """
+    def build_query(self, selector: str, duration: str, step: str) -> str:
+        return self.cpu_usage_query(selector, step)
+
+    def aggregate_exported(
+        self, timestamps: np.ndarray, values: np.ndarray, grid: np.ndarray, step: datetime.timedelta
+    ) -> np.ndarray:
+        return rate_over_grid(timestamps, values, grid, step.total_seconds())
 
 
 def PercentileCPULoader(percentile: float) -> type[PrometheusMetric]:
@@ -36,22 +32,13 @@ def PercentileCPULoader(percentile: float) -> type[PrometheusMetric]:
         raise ValueError("percentile must be between 0 and 100")
 
     class PercentileCPULoader(PrometheusMetric):
-        def get_query(self, object: K8sObjectData, duration: str, step: str) -> str:
-            pods_selector = "|".join(pod.name for pod in object.pods)
-            cluster_label = self.get_prometheus_cluster_label()
+        fusable = True
+
+        def build_query(self, selector: str, duration: str, step: str) -> str:
             return f"""
                 quantile_over_time(
                     {round(percentile / 100, 2)},
-                    max(
-                        rate(
-                            container_cpu_usage_seconds_total{{
-                                namespace="{object.namespace}",
-                                pod=~"{pods_selector}",
-                                container="{object.container}"
-                                {cluster_label}
-                            }}[{step}]
-                        )
-                    ) by (container, pod, job)
+                    {self.cpu_usage_query(selector, step)}
                     [{duration}:{step}]
                 )
             """
@@ -64,19 +51,24 @@ class CPUAmountLoader(PrometheusMetric):
     A metric loader for loading CPU points count.
     """
 
-    def get_query(self, object: K8sObjectData, duration: str, step: str) -> str:
-        pods_selector = "|".join(pod.name for pod in object.pods)
-        cluster_label = self.get_prometheus_cluster_label()
-        return f"""
-            count_over_time(
+    fusable = True
+
+    def build_query(self, selector: str, duration: str, step: str) -> str:
+        if self.recording_rules:
+            usage_query = self.cpu_usage_query(selector, step)
+        else:
+            # NOTE: Counts the raw counter rather than its rate, which has no point for the first sample of a container
+            usage_query = f"""
                 max(
                     container_cpu_usage_seconds_total{{
-                        namespace="{object.namespace}",
-                        pod=~"{pods_selector}",
-                        container="{object.container}"
-                        {cluster_label}
+                        {selector}
                     }}
                 ) by (container, pod, job)
+            """
+
+        return f"""
+            count_over_time(
+                {usage_query}
                 [{duration}:{step}]
             )
         """
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+from collections import defaultdict
+from typing import Any, Sequence
+
+from robusta_krr.core.abstract.strategies import PodsTimeData
+from robusta_krr.core.models.objects import K8sObjectData
+
+from .base import FUSED_METRIC_LABEL, PrometheusMetric, PrometheusMetricData, PrometheusSeries
+
+
+class FusedMetric(PrometheusMetric):
+    """
+    A metric loader that loads the metrics of multiple fusable loaders with a single query.
+
+    The queries of the loaders are combined with `or`, each of them marked with a synthetic `__krr_metric` label
+    (set to the loader name by `label_replace`), which is then used to split the result back between the loaders.
+
+    Use `FusedMetric.fuse` to create a fused loader class and `load_fused_data` to load the data.
+    """
+
+    loaders: list[type[PrometheusMetric]] = []
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.members = [LoaderClass(*args, **kwargs) for LoaderClass in self.loaders]
+
+    @classmethod
+    def fuse(cls, loaders: Sequence[type[PrometheusMetric]]) -> type[FusedMetric]:
+        """
+        Creates a loader class, fusing the queries of the given loaders.
+
+        Raises:
+            ValueError: If any of the loaders does not support fusion.
+        """
+
+        for LoaderClass in loaders:
+            if not LoaderClass.supports_fusion():
+                raise ValueError(f"{LoaderClass.__name__} can not be fused with other metrics")
+
+        return type(
+            cls.__name__,
+            (cls,),
+            {"loaders": list(loaders), "filtering": all(LoaderClass.filtering for LoaderClass in loaders)},
+        )
+
+    def build_query(self, selector: str, duration: str, step: str) -> str:
+        return " or ".join(
+            f"""
+                label_replace(
+                    {member.build_query(selector, duration, step)},
+                    "{FUSED_METRIC_LABEL}", "{member.__class__.__name__}", "", ""
+                )
+            """
+            for member in self.members
+        )
+
+    async def load_fused_data(
+        self, object: K8sObjectData, period: datetime.timedelta, step: datetime.timedelta
+    ) -> dict[str, PodsTimeData]:
+        """
+        Asynchronous method that loads the data of all the fused metrics for a specific object.
+
+        Args:
+        object (K8sObjectData): The object for which metrics need to be loaded.
+        period (datetime.timedelta): The time period for which metrics need to be loaded.
+        step (datetime.timedelta): The time interval between successive metric values.
+
+        Returns:
+        dict[str, PodsTimeData]: The loaded data of each of the fused metrics, by the loader name.
+        """
+
+        return (await self.load_fused_workload_data([object], period, step))[object]
+
+    async def load_fused_workload_data(
+        self, objects: list[K8sObjectData], period: datetime.timedelta, step: datetime.timedelta
+    ) -> dict[K8sObjectData, dict[str, PodsTimeData]]:
+        """
+        Asynchronous method that loads the data of all the fused metrics for multiple containers of the same workload,
+        with a single query selecting all the containers (see `load_workload_data`).
+
+        Returns:
+        dict[K8sObjectData, dict[str, PodsTimeData]]: The loaded data of each of the fused metrics, for each object.
+        """
+
+        step_str = f"{round(step.total_seconds())}s"
+        duration_str = self._step_to_string(period)
+        start_time, end_time = self._get_time_range(period, step)
+        workload = self.get_workload(objects)
+
+        results = await asyncio.gather(
+            *[
+                self.query_prometheus(
+                    PrometheusMetricData(
+                        query=self.get_query(batch, duration_str, step_str),
+                        start_time=start_time,
+                        end_time=end_time,
+                        step=step_str,
+                        type=self.query_type,
+                    )
+                )
+                for batch in self.split_into_batches(workload, duration_str, step_str)
+            ]
+        )
+
+        # NOTE: A single container is selected exactly, so its series are kept even without the container label
+        default_container = objects[0].container if len(objects) == 1 else None
+        loaders_series: defaultdict[tuple[str, str], list[PrometheusSeries]] = defaultdict(list)
+        for result in results:
+            for series in result:
+                container = series["metric"].get("container", default_container)
+                loaders_series[(container, series["metric"].get(FUSED_METRIC_LABEL))].append(series)
+
+        return {
+            object: {
+                member.__class__.__name__: member._series_to_pods_data(
+                    loaders_series[(object.container, member.__class__.__name__)], step
+                )
+                for member in self.members
+            }
+            for object in objects
+        }
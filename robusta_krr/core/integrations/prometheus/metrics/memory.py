@@ -1,6 +1,9 @@
-from robusta_krr.core.models.objects import K8sObjectData
+import datetime
+
+import numpy as np
 
 from .base import PrometheusMetric, QueryType
+from .resample import last_over_grid
 
 
 class MemoryLoader(PrometheusMetric):
@@ -9,20 +12,15 @@ class MemoryLoader(PrometheusMetric):
     """
 
     query_type: QueryType = QueryType.QueryRange
+    exported_metric = "container_memory_working_set_bytes"
 
-    def get_query(self, object: K8sObjectData, duration: str, step: str) -> str:
-        pods_selector = "|".join(pod.name for pod in object.pods)
-        cluster_label = self.get_prometheus_cluster_label()
-        return f"""
-            max(
-                container_memory_working_set_bytes{{
-                    namespace="{object.namespace}",
-                    pod=~"{pods_selector}",
-                    container="{object.container}"
-                    {cluster_label}
-                }}
-            ) by (container, pod, job)
-        """
+    def build_query(self, selector: str, duration: str, step: str) -> str:
+        return self.memory_usage_query(selector)
+
+    def aggregate_exported(
+        self, timestamps: np.ndarray, values: np.ndarray, grid: np.ndarray, step: datetime.timedelta
+    ) -> np.ndarray:
+        return last_over_grid(timestamps, values, grid)
 
 
 class MaxMemoryLoader(PrometheusMetric):
@@ -30,19 +28,12 @@ class MaxMemoryLoader(PrometheusMetric):
     A metric loader for loading max memory usage metrics.
     """
 
-    def get_query(self, object: K8sObjectData, duration: str, step: str) -> str:
-        pods_selector = "|".join(pod.name for pod in object.pods)
-        cluster_label = self.get_prometheus_cluster_label()
+    fusable = True
+
+    def build_query(self, selector: str, duration: str, step: str) -> str:
         return f"""
             max_over_time(
-                max(
-                    container_memory_working_set_bytes{{
-                        namespace="{object.namespace}",
-                        pod=~"{pods_selector}",
-                        container="{object.container}"
-                        {cluster_label}
-                    }}
-                ) by (container, pod, job)
+                {self.memory_usage_query(selector)}
                 [{duration}:{step}]
             )
         """
@@ -53,19 +44,12 @@ class MemoryAmountLoader(PrometheusMetric):
     A metric loader for loading memory points count.
     """
 
-    def get_query(self, object: K8sObjectData, duration: str, step: str) -> str:
-        pods_selector = "|".join(pod.name for pod in object.pods)
-        cluster_label = self.get_prometheus_cluster_label()
+    fusable = True
+
+    def build_query(self, selector: str, duration: str, step: str) -> str:
         return f"""
             count_over_time(
-                max(
-                    container_memory_working_set_bytes{{
-                        namespace="{object.namespace}",
-                        pod=~"{pods_selector}",
-                        container="{object.container}"
-                        {cluster_label}
-                    }}
-                ) by (container, pod, job)
+                {self.memory_usage_query(selector)}
                 [{duration}:{step}]
             )
         """
@@ -77,30 +61,23 @@ class MaxOOMKilledMemoryLoader(PrometheusMetric):
     """
 
     warning_on_no_data = False
+    fusable = True
 
-    def get_query(self, object: K8sObjectData, duration: str, step: str) -> str:
-        pods_selector = "|".join(pod.name for pod in object.pods)
-        cluster_label = self.get_prometheus_cluster_label()
+    def build_query(self, selector: str, duration: str, step: str) -> str:
         return f"""
             max_over_time(
                 max(
                     max(
                         kube_pod_container_resource_limits{{
                             resource="memory",
-                            namespace="{object.namespace}",
-                            pod=~"{pods_selector}",
-                            container="{object.container}"
-                            {cluster_label}
+                            {selector}
                         }} 
                     ) by (pod, container, job)
                     * on(pod, container, job) group_left(reason)
                     max(
                         kube_pod_container_status_last_terminated_reason{{
                             reason="OOMKilled",
-                            namespace="{object.namespace}",
-                            pod=~"{pods_selector}",
-                            container="{object.container}"
-                            {cluster_label}
+                            {selector}
                         }}
                     ) by (pod, container, job, reason)
                 ) by (container, pod, job)
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import functools
+from typing import Any
+
+from robusta_krr.core.abstract.strategies import Reduction
+
+from .base import PrometheusMetric, QueryType
+
+
+class ReducedMetric(PrometheusMetric):
+    """
+    A metric loader that pushes a reduction (see `Reduction`) of a range loader down into the query:
+    the range loader's query is evaluated as a subquery, reduced to a single value per pod by `<function>_over_time`,
+    so only the values are transferred instead of all the samples.
+
+    The workload scoped reductions are loaded per pod too, and then combined by `Reduction.combine`,
+    so only the composable ones (not the percentiles) can be pushed down.
+
+    Use `ReducedMetric.reduce` to create a loader class for a reduction.
+    """
+
+    loader: type[PrometheusMetric]
+    reduction: Reduction
+    fusable = True
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.member = self.loader(*args, **kwargs)
+
+    @classmethod
+    def supports_pushdown(cls, reduction: Reduction) -> bool:
+        """
+        Whether the reduction can be pushed down into a query.
+        """
+
+        metric = reduction.metric
+        if not (isinstance(metric, type) and issubclass(metric, PrometheusMetric)):
+            return False
+
+        return (
+            metric.query_type == QueryType.QueryRange
+            and metric.supports_bulk()
+            and (reduction.scope == "pod" or reduction.composable)
+        )
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def reduce(cls, reduction: Reduction) -> type[ReducedMetric]:
+        """
+        Creates a loader class (once for each reduction), pushing the reduction down into the query of its metric.
+
+        Raises:
+            ValueError: If the reduction can not be pushed down.
+        """
+
+        if not cls.supports_pushdown(reduction):
+            raise ValueError(f"The {reduction.function} of {reduction.metric.__name__} can not be pushed down")
+
+        name = f"{reduction.metric.__name__}_{reduction.function}"
+        if reduction.percentile is not None:
+            name += f"{reduction.percentile:g}"
+
+        return type(
+            name,
+            (cls,),
+            {"loader": reduction.metric, "reduction": reduction, "filtering": reduction.metric.filtering},
+        )
+
+    def build_query(self, selector: str, duration: str, step: str) -> str:
+        subquery = f"""
+            (
+                {self.member.build_query(selector, duration, step)}
+            )[{duration}:{step}]
+        """
+
+        if self.reduction.function == "percentile":
+            assert self.reduction.percentile is not None
+            return f"quantile_over_time({self.reduction.percentile / 100}, {subquery})"
+
+        return f"{self.reduction.function}_over_time({subquery})"
@@ -0,0 +1,49 @@
+"""
+Client-side evaluation of the PromQL functions used by the range loaders, over raw (exported) samples.
+
+Each function takes the samples of a single series as sorted `timestamps` and `values` arrays
+and evaluates them at each timestamp of `grid`, returning NaN where a range query would have no point.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+# The lookback of an instant vector selector, the same as the default of Prometheus and Victoria Metrics
+LOOKBACK_DELTA = 5 * 60
+
+
+def last_over_grid(timestamps: np.ndarray, values: np.ndarray, grid: np.ndarray) -> np.ndarray:
+    """
+    The value of an instant vector selector: the last sample at or before each grid point, within the lookback.
+    """
+
+    result = np.full(len(grid), np.nan)
+    indices = np.searchsorted(timestamps, grid, side="right") - 1
+    valid = indices >= 0
+    valid[valid] = grid[valid] - timestamps[indices[valid]] <= LOOKBACK_DELTA
+    result[valid] = values[indices[valid]]
+    return result
+
+
+def rate_over_grid(timestamps: np.ndarray, values: np.ndarray, grid: np.ndarray, window: float) -> np.ndarray:
+    """
+    `rate(counter[window])`: the per-second increase between the first and the last samples of each window,
+    adjusted for counter resets. Unlike Prometheus, the increase is not extrapolated to the window boundaries.
+    """
+
+    result = np.full(len(grid), np.nan)
+    if len(timestamps) < 2:
+        return result
+
+    # A counter reset restarts the counter from zero, so the value before the reset is added to all the next samples
+    resets = np.diff(values) < 0
+    continuous = values + np.concatenate([[0.0], np.cumsum(np.where(resets, values[:-1], 0.0))])
+
+    last = np.searchsorted(timestamps, grid, side="right") - 1
+    first = np.searchsorted(timestamps, grid - window, side="right")
+    valid = last > first
+    result[valid] = (continuous[last[valid]] - continuous[first[valid]]) / (
+        timestamps[last[valid]] - timestamps[first[valid]]
+    )
+    return result
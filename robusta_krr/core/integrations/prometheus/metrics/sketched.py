@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import datetime
+import functools
+from typing import Any, AsyncIterator, Hashable
+
+import numpy as np
+
+from robusta_krr.core.abstract.strategies import PodsTimeData
+from robusta_krr.utils.sketch import DDSketch
+
+from .base import PrometheusMetric, PrometheusMetricData, PrometheusSeries, QueryType
+
+
+class SketchedMetric(PrometheusMetric):
+    """
+    A metric loader that loads a range loader's series as mergeable quantile sketches (see `DDSketch`)
+    of their values, instead of arrays of all their samples.
+
+    The samples of each series are added to its sketch as soon as the series is decoded from the response,
+    so only the sketches are kept. The sketches of the time shards of a pod are merged into the sketch of the pod,
+    and the strategies merge the sketches of the pods of a workload (see `SketchArray`).
+
+    Sketches can not be extended incrementally, so the metrics cache is not used.
+
+    Use `SketchedMetric.sketch` to create a loader class for a range loader.
+    """
+
+    relative_accuracy: float
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.cache = None
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def sketch(cls, loader: type[PrometheusMetric], relative_accuracy: float) -> type[SketchedMetric]:
+        """
+        Creates a loader class (once for each loader and accuracy), loading the series of the loader as sketches.
+
+        Raises:
+            ValueError: If the loader is not a range loader.
+        """
+
+        if loader.query_type != QueryType.QueryRange:
+            raise ValueError(f"Only the series of range loaders can be sketched, not of {loader.__name__}")
+
+        return type(f"{loader.__name__}Sketch", (cls, loader), {"relative_accuracy": relative_accuracy})
+
+    def _sketch_values(self, values: Any) -> DDSketch:
+        if isinstance(values, DDSketch):
+            return values
+
+        samples = np.asarray(values, dtype=np.float64).reshape(-1, 2)
+        return DDSketch.from_values(samples[:, 1], self.relative_accuracy)
+
+    def _get_single_flight_key(self, data: PrometheusMetricData) -> Hashable:
+        # NOTE: The same query of the loader returns the samples, not the sketches
+        return (super()._get_single_flight_key(data), "sketch", self.relative_accuracy)
+
+    async def _collect_series(self, stream: AsyncIterator[PrometheusSeries]) -> list[PrometheusSeries]:
+        async def sketch_series() -> AsyncIterator[PrometheusSeries]:
+            async for series in stream:
+                yield {"metric": series["metric"], "values": self._sketch_values(series["values"])}  # type: ignore
+
+        return await super()._collect_series(sketch_series())
+
+    def _series_to_pods_data(self, result: list[PrometheusSeries], step: datetime.timedelta) -> PodsTimeData:
+        if result == []:
+            return {}
+
+        if self.filtering:
+            result = self.filter_prom_jobs_results(result)
+
+        # NOTE: The series of the sync client and of the export are only sketched here
+        return {series["metric"]["pod"]: self._sketch_values(series["values"]) for series in result}
+
+    @staticmethod
+    def _concatenate_shards(shards: list[Any]) -> Any:
+        return DDSketch.merged(shards)
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from robusta_krr.core.abstract.strategies import PodsTimeData
+from robusta_krr.core.models.config import settings
+
+logger = logging.getLogger("krr")
+
+
+@dataclass
+class CacheEntry:
+    start: float
+    end: float
+    pods: set[str]
+    data: PodsTimeData
+
+
+class MetricsCache:
+    """
+    A persistent on-disk (SQLite) cache of range query results, shared between runs.
+
+    Entries are keyed by cluster, query fingerprint and step, and store the samples of each pod
+    together with the (step aligned) start and end of the window they cover.
+    On a rerun only the missing parts of the window (the tail, and the head if the window grew)
+    have to be fetched, and are then merged with the stored samples.
+
+    Entries that were not used for `ttl` seconds are evicted, as well as the least recently used ones
+    when the total size of the cache exceeds `max_size` bytes.
+    """
+
+    FILENAME = "metrics.sqlite"
+
+    def __init__(self, directory: Path, *, ttl: float, max_size: int) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        self.path = directory / self.FILENAME
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        with self._lock, self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    cluster TEXT,
+                    step REAL NOT NULL,
+                    start REAL NOT NULL,
+                    end REAL NOT NULL,
+                    pods TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS series (
+                    key TEXT NOT NULL,
+                    pod TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    PRIMARY KEY (key, pod)
+                )
+                """
+            )
+
+        self.evict()
+
+    @classmethod
+    def from_settings(cls) -> Optional[MetricsCache]:
+        if settings.metrics_cache_dir is None:
+            return None
+
+        try:
+            return cls(
+                Path(settings.metrics_cache_dir),
+                ttl=settings.metrics_cache_ttl * 60 * 60,
+                max_size=settings.metrics_cache_max_size * 1024**2,
+            )
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Unable to open the metrics cache at {settings.metrics_cache_dir}, will not use it: {e}")
+            return None
+
+    @staticmethod
+    def make_key(cluster: Optional[str], fingerprint: str, step: float) -> str:
+        return hashlib.sha256(f"{cluster}\n{step}\n{fingerprint}".encode()).hexdigest()
+
+    def _get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock, self._connection:
+            entry = self._connection.execute("SELECT start, end, pods FROM entries WHERE key = ?", (key,)).fetchone()
+            if entry is None:
+                return None
+
+            self._connection.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            rows = self._connection.execute("SELECT pod, data FROM series WHERE key = ?", (key,)).fetchall()
+
+        start, end, pods = entry
+        return CacheEntry(
+            start=start,
+            end=end,
+            pods=set(pods.split("\n")) if pods else set(),
+            data={pod: np.frombuffer(data, dtype=np.float64).reshape(-1, 2) for pod, data in rows},
+        )
+
+    def _put(self, key: str, cluster: Optional[str], step: float, entry: CacheEntry) -> None:
+        blobs = [
+            (key, pod, np.ascontiguousarray(values, dtype=np.float64).tobytes()) for pod, values in entry.data.items()
+        ]
+        size = sum(len(blob) for _, _, blob in blobs)
+
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM series WHERE key = ?", (key,))
+            self._connection.executemany("INSERT INTO series (key, pod, data) VALUES (?, ?, ?)", blobs)
+            self._connection.execute(
+                """
+                INSERT OR REPLACE INTO entries (key, cluster, step, start, end, pods, size, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, cluster, step, entry.start, entry.end, "\n".join(sorted(entry.pods)), size, time.time()),
+            )
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        """
+        Returns the cached entry (the start and end of the cached window, the queried pods and their samples),
+        or None if there is no such entry.
+        """
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._get, key)
+
+    async def put(self, key: str, cluster: Optional[str], step: float, entry: CacheEntry) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._put, key, cluster, step, entry)
+
+    def evict(self) -> None:
+        with self._lock, self._connection:
+            expired = self._connection.execute(
+                "SELECT key FROM entries WHERE accessed_at < ?", (time.time() - self.ttl,)
+            ).fetchall()
+
+            total_size = 0
+            for key, size in self._connection.execute(
+                "SELECT key, size FROM entries WHERE accessed_at >= ? ORDER BY accessed_at DESC",
+                (time.time() - self.ttl,),
+            ).fetchall():
+                total_size += size
+                if total_size > self.max_size:
+                    expired.append((key,))
+
+            self._connection.executemany("DELETE FROM series WHERE key = ?", expired)
+            self._connection.executemany("DELETE FROM entries WHERE key = ?", expired)
+
+        if expired:
+            logger.debug(f"Evicted {len(expired)} entries from the metrics cache")
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def merge_pods_data(cached: PodsTimeData, fetched: list[PodsTimeData], start: float) -> PodsTimeData:
+    """
+    Merges the cached samples with the freshly fetched parts of the window (the head and the tail),
+    ordering them by time and dropping the samples that are older than `start`.
+    """
+
+    result: PodsTimeData = {}
+    for pod in set(cached).union(*fetched):
+        parts = [
+            np.asarray(values)
+            for values in (cached.get(pod), *(part.get(pod) for part in fetched))
+            if values is not None and len(values) > 0
+        ]
+        if parts == []:
+            continue
+
+        values = np.concatenate(parts) if len(parts) > 1 else parts[0]
+        values = values[np.argsort(values[:, 0], kind="stable")]
+        values = values[values[:, 0] >= start]
+        if len(values) > 0:
+            result[pod] = values
+
+    return result
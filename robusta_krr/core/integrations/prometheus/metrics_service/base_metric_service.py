@@ -27,6 +27,9 @@ class MetricsService(abc.ABC):
     def check_connection(self):
         ...
 
+    async def close(self) -> None:
+        """Releases the resources (like open connections) held by the service."""
+
     @classmethod
     def name(cls) -> str:
         classname = cls.__name__
@@ -50,6 +53,51 @@ class MetricsService(abc.ABC):
     ) -> PodsTimeData:
         ...
 
+    @abc.abstractmethod
+    async def gather_namespace_data(
+        self,
+        namespace: str,
+        objects: list[K8sObjectData],
+        LoaderClass: type[PrometheusMetric],
+        period: datetime.timedelta,
+        step: datetime.timedelta = datetime.timedelta(minutes=30),
+    ) -> dict[K8sObjectData, PodsTimeData]:
+        ...
+
+    @abc.abstractmethod
+    async def gather_workload_data(
+        self,
+        objects: list[K8sObjectData],
+        LoaderClass: type[PrometheusMetric],
+        period: datetime.timedelta,
+        step: datetime.timedelta = datetime.timedelta(minutes=30),
+    ) -> dict[K8sObjectData, PodsTimeData]:
+        ...
+
+    @abc.abstractmethod
+    async def gather_fused_data(
+        self,
+        object: K8sObjectData,
+        LoaderClasses: list[type[PrometheusMetric]],
+        period: datetime.timedelta,
+        step: datetime.timedelta = datetime.timedelta(minutes=30),
+    ) -> dict[str, PodsTimeData]:
+        ...
+
+    @abc.abstractmethod
+    async def gather_fused_workload_data(
+        self,
+        objects: list[K8sObjectData],
+        LoaderClasses: list[type[PrometheusMetric]],
+        period: datetime.timedelta,
+        step: datetime.timedelta = datetime.timedelta(minutes=30),
+    ) -> dict[K8sObjectData, dict[str, PodsTimeData]]:
+        ...
+
+    @abc.abstractmethod
+    async def count_series(self, objects: list[K8sObjectData], period: datetime.timedelta) -> int:
+        ...
+
     def get_prometheus_cluster_label(self) -> str:
         """
         Generates the cluster label for querying a centralized Prometheus
@@ -1,3 +1,4 @@
+from datetime import timedelta
 from typing import Optional
 
 from kubernetes.client import ApiClient
@@ -31,6 +32,10 @@ class MimirMetricsService(PrometheusMetricsService):
     service_discovery = MimirMetricsDiscovery
     url_postfix = "/prometheus"
     additional_headers = {"X-Scope-OrgID": "anonymous"}
+    # The query frontend splits long ranges by day anyway, so the shards are fetched concurrently instead
+    range_shard_duration = timedelta(days=1)
+    # The query frontend also caches the results of the range queries, but not of the subqueries
+    subquery_cost = 2.0
 
     def check_connection(self):
         """
@@ -1,14 +1,14 @@
 import asyncio
 import logging
+import math
 import os
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Iterable, List, Optional, Dict, Any
+from typing import Iterable, List, Optional, Dict, Any, TypeVar
 
 from kubernetes.client import ApiClient
 from prometheus_api_client import PrometheusApiClientException
 from prometrix import PrometheusNotFound, get_custom_prometheus_connect
-from tenacity import retry, stop_after_attempt, wait_random
 
 from robusta_krr.core.abstract.strategies import PodsTimeData
 from robusta_krr.core.integrations import openshift
@@ -17,12 +17,21 @@ from robusta_krr.core.models.objects import K8sObjectData, PodData
 from robusta_krr.utils.batched import batched
 from robusta_krr.utils.service_discovery import MetricsServiceDiscovery
 
-from ..metrics import PrometheusMetric
+from ..cost_planner import QueryCostPlanner
+from ..http_client import AsyncPrometheusClient
+from ..metrics import FusedMetric, MemoryLoader, PrometheusMetric
+from ..metrics.base import QueryOptions, QueryType
+from ..metrics_cache import MetricsCache
+from ..ownership_index import OwnershipIndex
+from ..single_flight import SingleFlight
 from ..prometheus_utils import ClusterNotSpecifiedException, generate_prometheus_config
+from ..recording_rules import CPU_USAGE_RECORD, MEMORY_USAGE_RECORD
 from .base_metric_service import MetricsService
 
 logger = logging.getLogger("krr")
 
+LoaderT = TypeVar("LoaderT", bound=PrometheusMetric)
+
 
 class PrometheusDiscovery(MetricsServiceDiscovery):
     def find_metrics_url(self, *, api_client: Optional[ApiClient] = None) -> Optional[str]:
@@ -56,6 +65,25 @@ class PrometheusMetricsService(MetricsService):
     service_discovery: type[MetricsServiceDiscovery] = PrometheusDiscovery
     url_postfix: str = ""
     additional_headers: dict[str, str] = {}
+    # The max size of the encoded query (in bytes), bigger queries are split into batches of pods
+    max_query_size: int = 32 * 1024
+    # The max number of points per series of a range query (Prometheus and EKS managed Prometheus reject more than 11000),
+    # longer ranges are split into time shards
+    max_range_points: int = 11000
+    # Optionally also splits long ranges into shards of this duration, to fetch them concurrently
+    range_shard_duration: Optional[timedelta] = None
+    # The max number of points of the subqueries of the instant loaders (e.g. `[period:step]`), which are not sharded,
+    # so their step is raised instead (EKS managed Prometheus rejects more than 11000)
+    max_subquery_points: Optional[int] = None
+    # Whether the backend has the Victoria Metrics export API, to stream the raw samples of the range loaders from
+    export_api: bool = False
+    # Whether the backend evaluates subqueries, which the reductions of the strategies are pushed down with
+    supports_subqueries: bool = True
+    # The cost of reading a raw sample by a subquery, relative to transferring a point of a range query
+    # (see QueryCostPlanner)
+    subquery_cost: float = 1.0
+    # The max number of samples a query can load (50M by default in Prometheus, see --query.max-samples)
+    max_query_samples: Optional[int] = 50_000_000
 
     def __init__(
         self,
@@ -106,6 +134,38 @@ class PrometheusMetricsService(MetricsService):
             self.api_client.update_params_for_auth(headers, {}, ["BearerToken"])
         self.prom_config = generate_prometheus_config(url=self.url, headers=headers, metrics_service=self)
         self.prometheus = get_custom_prometheus_connect(self.prom_config)
+        # NOTE: prometrix client is still used for connection checks and labels discovery,
+        # while all the queries are sent through the native async client
+        self.client = AsyncPrometheusClient(self.prom_config)
+        self.cache = MetricsCache.from_settings()
+        self.max_query_size = settings.prometheus_max_query_size or self.max_query_size
+        self.max_range_points = settings.prometheus_max_range_points or self.max_range_points
+        if settings.range_shard_hours is not None:
+            self.range_shard_duration = timedelta(hours=settings.range_shard_hours)
+        if settings.eks_managed_prom:
+            self.max_subquery_points = 10000
+        self.export = self.export_api and settings.victoria_metrics_export
+        if self.export and settings.owner_queries:
+            # NOTE: The export API only takes series selectors, so it can not join the series with the owner pods
+            logger.warning(f"The owner queries can not be exported from {self.name()}, querying the metrics instead")
+            self.export = False
+        # NOTE: The results of the discovery and summary queries are small and kept for the whole scan,
+        # while the metric queries are only collapsed while they are in flight
+        self.discovery_queries: SingleFlight[Any] = SingleFlight(keep_results=True)
+        self.metric_queries: SingleFlight[Any] = SingleFlight()
+        # The ownership index is built once per history period, or None if it failed to be built
+        self.ownership_indexes: SingleFlight[Optional[OwnershipIndex]] = SingleFlight(keep_results=True)
+        # Whether the recorded series cover the history window, by the window duration
+        self._recorded_series: dict[timedelta, bool] = {}
+        self.cost_planner: Optional[QueryCostPlanner] = None
+        if settings.cost_planner:
+            self.cost_planner = QueryCostPlanner(
+                subquery_cost=settings.subquery_cost or self.subquery_cost,
+                max_samples=self.max_query_samples,
+                max_range_points=self.max_range_points,
+                range_shard_duration=self.range_shard_duration,
+                export=self.export,
+            )
 
     def check_connection(self):
         """
@@ -115,23 +175,43 @@ class PrometheusMetricsService(MetricsService):
         """
         self.prometheus.check_prometheus_connection()
 
-    @retry(wait=wait_random(min=2, max=10), stop=stop_after_attempt(5))
-    async def query(self, query: str) -> dict:
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(
-            self.executor,
-            lambda: self.prometheus.safe_custom_query(query=query)["result"],
+    async def close(self) -> None:
+        logger.debug(
+            f"{self.discovery_queries.hits + self.metric_queries.hits} queries to {self.name()} were deduplicated"
         )
+        self.discovery_queries.clear()
+        self.ownership_indexes.clear()
+        if self.cost_planner is not None:
+            choices = self.cost_planner.choices
+            logger.debug(f"{sum(choice.pushdown for choice in choices)} of {len(choices)} reductions were pushed down")
+            if settings.query_plans_file is not None:
+                self.cost_planner.save(settings.query_plans_file)
+        await self.client.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    async def query(self, query: str) -> dict:
+        """
+        Runs an instant query. Identical queries within the scan share a single request and its (read-only) result.
+        """
+
+        async def run() -> dict:
+            return (await self.client.query(query=query))["result"]
+
+        return await self.discovery_queries.run(("query", query), run)
 
-    @retry(wait=wait_random(min=2, max=10), stop=stop_after_attempt(5))
     async def query_range(self, query: str, start: datetime, end: datetime, step: timedelta) -> dict:
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(
-            self.executor,
-            lambda: self.prometheus.safe_custom_query_range(
-                query=query, start_time=start, end_time=end, step=f"{step.seconds}s"
-            )["result"],
-        )
+        """
+        Runs a range query. Identical queries within the scan share a single request and its (read-only) result.
+        """
+
+        async def run() -> dict:
+            return (
+                await self.client.query_range(query=query, start_time=start, end_time=end, step=f"{step.seconds}s")
+            )["result"]
+
+        key = ("query_range", query, round(start.timestamp()), round(end.timestamp()), step.seconds)
+        return await self.discovery_queries.run(key, run)
 
     def validate_cluster_name(self):
         if not settings.prometheus_cluster_label and not settings.prometheus_label:
@@ -167,7 +247,8 @@ class PrometheusMetricsService(MetricsService):
             float: The first history point.
         """
 
-        now = datetime.now()
+        # NOTE: Truncated, so the checks of the same Prometheus within a minute share the query
+        now = datetime.now().replace(second=0, microsecond=0)
         result = await self.query_range(
             "max(prometheus_tsdb_head_series)",
             start=now - history_duration,
@@ -182,6 +263,97 @@ class PrometheusMetricsService(MetricsService):
             logger.debug(f"Returned from get_history_range: {result}")
             raise ValueError("Error while getting history range") from e
 
+    async def has_recorded_series(self, period: timedelta) -> bool:
+        """
+        Checks whether the series recorded by the rules of `krr rules generate` cover the whole history window,
+        so the loaders can query them instead of the raw cAdvisor metrics.
+        Only checked if recording rules are enabled in the settings.
+        """
+
+        if not settings.recording_rules:
+            return False
+        if period in self._recorded_series:
+            return self._recorded_series[period]
+
+        # NOTE: The series have to exist at the start of the window,
+        # as the rules only record from the moment they were deployed
+        cluster_label = self.get_prometheus_cluster_label().replace(",", "")
+        offset = f"{int(period.total_seconds())}s"
+        try:
+            result = await self.query(
+                f"""
+                    count(last_over_time({CPU_USAGE_RECORD}{{ {cluster_label} }}[1h] offset {offset}))
+                    and
+                    count(last_over_time({MEMORY_USAGE_RECORD}{{ {cluster_label} }}[1h] offset {offset}))
+                """
+            )
+        except Exception as e:
+            logger.debug(f"Failed to check the recorded series: {e}")
+            result = []
+
+        if period not in self._recorded_series:
+            self._recorded_series[period] = len(result) > 0
+            if self._recorded_series[period]:
+                logger.info(f"Using the series recorded by the KRR recording rules in {self.name()}")
+            else:
+                logger.warning(
+                    f"The series recorded by the KRR recording rules do not cover the last {period} in {self.name()}, "
+                    "falling back to the raw metrics. Run `krr rules generate` to get the rules."
+                )
+        return self._recorded_series[period]
+
+    def get_query_params(self, period: timedelta, step: timedelta) -> dict[str, Any]:
+        """
+        Provides the additional parameters of the metric queries for the given history and step.
+        Override to pass backend specific parameters.
+        """
+
+        return {}
+
+    def get_loader_step(self, LoaderClass: type[PrometheusMetric], period: timedelta, step: timedelta) -> timedelta:
+        """
+        Provides the step of the loader's queries for the given history and step.
+        The range loaders keep the step, as their long ranges are split into time shards,
+        while the step of the instant loaders is raised if their subqueries would have more than `max_subquery_points`.
+        """
+
+        if LoaderClass.query_type == QueryType.QueryRange or self.max_subquery_points is None:
+            return step
+
+        min_step = timedelta(seconds=math.ceil(period.total_seconds() / self.max_subquery_points))
+        if step >= min_step:
+            return step
+
+        logger.debug(f"Raising the step of {LoaderClass.__name__} from {step} to {min_step}, to fit the subquery limit")
+        return min_step
+
+    async def get_query_options(self, period: timedelta, step: timedelta) -> QueryOptions:
+        """
+        Provides the options of the metric queries of all the loaders for the given history and step.
+        """
+
+        return QueryOptions(
+            max_query_size=self.max_query_size,
+            max_range_points=self.max_range_points,
+            range_shard_duration=self.range_shard_duration,
+            recording_rules=await self.has_recorded_series(period),
+            query_params=self.get_query_params(period, step),
+            export=self.export,
+            owner_queries=settings.owner_queries,
+            values_dtype=settings.metrics_dtype,
+        )
+
+    async def _create_loader(self, LoaderClass: type[LoaderT], period: timedelta, step: timedelta) -> LoaderT:
+        return LoaderClass(
+            self.prometheus,
+            self.name(),
+            self.executor,
+            client=self.client,
+            cache=self.cache,
+            single_flight=self.metric_queries,
+            options=await self.get_query_options(period, step),
+        )
+
     async def gather_data(
         self,
         object: K8sObjectData,
@@ -193,26 +365,142 @@ class PrometheusMetricsService(MetricsService):
         ResourceHistoryData: The gathered resource history data.
         """
         logger.debug(f"Gathering {LoaderClass.__name__} metric for {object}")
+        step = self.get_loader_step(LoaderClass, period, step)
         try:
-            metric_loader = LoaderClass(self.prometheus, self.name(), self.executor)
+            metric_loader = await self._create_loader(LoaderClass, period, step)
             data = await metric_loader.load_data(object, period, step)
         except Exception:
             logger.exception("Failed to gather resource history data for %s", object)
             data = {}
 
         if len(data) == 0:
-            if "CPU" in LoaderClass.__name__:
-                object.add_warning("NoPrometheusCPUMetrics")
-            elif "Memory" in LoaderClass.__name__:
-                object.add_warning("NoPrometheusMemoryMetrics")
-
-            if LoaderClass.warning_on_no_data:
-                logger.warning(
-                    f"{metric_loader.service_name} returned no {metric_loader.__class__.__name__} metrics for {object}"
-                )
+            self._handle_no_data(object, LoaderClass)
 
         return data
 
+    async def gather_namespace_data(
+        self,
+        namespace: str,
+        objects: list[K8sObjectData],
+        LoaderClass: type[PrometheusMetric],
+        period: timedelta,
+        step: timedelta = timedelta(minutes=30),
+    ) -> dict[K8sObjectData, PodsTimeData]:
+        """
+        Gathers the metric for all the given objects of a namespace with a single namespace-wide query.
+        Loaders that do not support bulk queries are gathered object by object.
+        Unlike `gather_data`, a failed query is raised, so that the objects can be gathered one by one instead.
+        """
+
+        if not LoaderClass.supports_bulk():
+            results = await asyncio.gather(
+                *[self.gather_data(object, LoaderClass, period, step) for object in objects]
+            )
+            return dict(zip(objects, results))
+
+        logger.debug(f"Gathering {LoaderClass.__name__} metric for {len(objects)} objects in {namespace} namespace")
+        step = self.get_loader_step(LoaderClass, period, step)
+        metric_loader = await self._create_loader(LoaderClass, period, step)
+        namespace_data = await metric_loader.load_namespace_data(namespace, objects, period, step)
+
+        for object in objects:
+            if len(namespace_data.get(object, {})) == 0:
+                self._handle_no_data(object, LoaderClass)
+
+        return {object: namespace_data.get(object, {}) for object in objects}
+
+    async def gather_workload_data(
+        self,
+        objects: list[K8sObjectData],
+        LoaderClass: type[PrometheusMetric],
+        period: timedelta,
+        step: timedelta = timedelta(minutes=30),
+    ) -> dict[K8sObjectData, PodsTimeData]:
+        """
+        Gathers the metric for all the containers of a workload with a single query, splitting the result by container.
+        Loaders that do not support bulk queries are gathered object by object.
+        Unlike `gather_data`, a failed query is raised, so that the containers can be gathered one by one instead.
+        """
+
+        if not LoaderClass.supports_bulk():
+            results = await asyncio.gather(
+                *[self.gather_data(object, LoaderClass, period, step) for object in objects]
+            )
+            return dict(zip(objects, results))
+
+        logger.debug(f"Gathering {LoaderClass.__name__} metric for {len(objects)} containers of {objects[0]}")
+        step = self.get_loader_step(LoaderClass, period, step)
+        metric_loader = await self._create_loader(LoaderClass, period, step)
+        workload_data = await metric_loader.load_workload_data(objects, period, step)
+
+        for object in objects:
+            if len(workload_data.get(object, {})) == 0:
+                self._handle_no_data(object, LoaderClass)
+
+        return {object: workload_data.get(object, {}) for object in objects}
+
+    async def gather_fused_data(
+        self,
+        object: K8sObjectData,
+        LoaderClasses: list[type[PrometheusMetric]],
+        period: timedelta,
+        step: timedelta = timedelta(minutes=30),
+    ) -> dict[str, PodsTimeData]:
+        """
+        Gathers the metrics of multiple fusable loaders for an object with a single fused query.
+        """
+
+        try:
+            return (await self.gather_fused_workload_data([object], LoaderClasses, period, step))[object]
+        except Exception:
+            logger.exception("Failed to gather resource history data for %s", object)
+
+        for LoaderClass in LoaderClasses:
+            self._handle_no_data(object, LoaderClass)
+        return {LoaderClass.__name__: {} for LoaderClass in LoaderClasses}
+
+    async def gather_fused_workload_data(
+        self,
+        objects: list[K8sObjectData],
+        LoaderClasses: list[type[PrometheusMetric]],
+        period: timedelta,
+        step: timedelta = timedelta(minutes=30),
+    ) -> dict[K8sObjectData, dict[str, PodsTimeData]]:
+        """
+        Gathers the metrics of multiple fusable loaders for all the containers of a workload with a single fused query.
+        Unlike `gather_fused_data`, a failed query is raised, so that the containers can be gathered one by one instead.
+        """
+
+        logger.debug(
+            f"Gathering {', '.join(LoaderClass.__name__ for LoaderClass in LoaderClasses)} metrics for {objects[0]}"
+            + (f" and {len(objects) - 1} other containers" if len(objects) > 1 else "")
+        )
+        FusedLoader = FusedMetric.fuse(LoaderClasses)
+        step = self.get_loader_step(FusedLoader, period, step)
+        metric_loader = await self._create_loader(FusedLoader, period, step)
+        workload_data = await metric_loader.load_fused_workload_data(objects, period, step)
+
+        result = {}
+        for object in objects:
+            fused_data = workload_data.get(object, {})
+            for LoaderClass in LoaderClasses:
+                if len(fused_data.get(LoaderClass.__name__, {})) == 0:
+                    self._handle_no_data(object, LoaderClass)
+            result[object] = {
+                LoaderClass.__name__: fused_data.get(LoaderClass.__name__, {}) for LoaderClass in LoaderClasses
+            }
+
+        return result
+
+    def _handle_no_data(self, object: K8sObjectData, LoaderClass: type[PrometheusMetric]) -> None:
+        if "CPU" in LoaderClass.__name__:
+            object.add_warning("NoPrometheusCPUMetrics")
+        elif "Memory" in LoaderClass.__name__:
+            object.add_warning("NoPrometheusMemoryMetrics")
+
+        if LoaderClass.warning_on_no_data:
+            logger.warning(f"{self.name()} returned no {LoaderClass.__name__} metrics for {object}")
+
     async def query_and_validate(self, prom_query) -> Any:
             result = await self.query(prom_query)
             if len(result) != 1:
@@ -265,9 +553,84 @@ class PrometheusMetricsService(MetricsService):
             logger.error(f"Exception occurred while getting cluster summary: {e}")
             return {}
 
+    async def count_series(self, objects: list[K8sObjectData], period: timedelta) -> int:
+        """
+        Counts the series of the containers of a workload over the period, with the series API,
+        which only reads the index of the backend, so it is cheap even for the workloads with a lot of series.
+        The series of the raw memory usage metric are counted, as each of the loaders selects about as many.
+        """
+
+        metric_loader = await self._create_loader(MemoryLoader, period, period)
+        workload = PrometheusMetric.get_workload(objects)
+        duration = f"{int(period.total_seconds())}s"
+        end = datetime.now()
+        start = end - period
+
+        results = await asyncio.gather(
+            *[
+                self.client.post(
+                    "/api/v1/series",
+                    {
+                        "match[]": f"{MemoryLoader.exported_metric}{{{metric_loader.get_object_selector(batch)}}}",
+                        "start": round(start.timestamp()),
+                        "end": round(end.timestamp()),
+                    },
+                )
+                for batch in metric_loader.split_into_batches(workload, duration, duration)
+            ]
+        )
+        return sum(len(result) for result in results)
+
+    async def get_cost_planner(self) -> QueryCostPlanner:
+        """
+        Gets the cost planner, calibrating it from the TSDB status of the backend on the first call.
+        The default estimates are kept if the backend does not provide the status.
+        """
+
+        assert self.cost_planner is not None
+        planner = self.cost_planner
+
+        async def calibrate() -> None:
+            try:
+                planner.calibrate(await self.client.get("/api/v1/status/tsdb"))
+            except Exception as e:
+                logger.debug(f"Failed to get the TSDB status of {self.name()}, keeping the default cost estimates: {e}")
+
+        await self.discovery_queries.run("cost_planner_calibration", calibrate)
+        return planner
+
+    async def get_ownership_index(self, period: timedelta) -> Optional[OwnershipIndex]:
+        """
+        Gets the ownership index of the scanned namespaces for the period, building it on the first call.
+        Returns None if it could not be built.
+        """
+
+        days_literal = min(int(period.total_seconds()) // 3600 // 24, 32)
+        period_literal = f"{days_literal}d"
+
+        cluster_label = self.get_prometheus_cluster_label().replace(",", "").strip()
+        namespaces_selector = "" if settings.namespaces == "*" else f'namespace=~"{"|".join(settings.namespaces)}"'
+        selector = ", ".join(filter(None, [namespaces_selector, cluster_label]))
+
+        async def query(query: str) -> Any:
+            # NOTE: Not through self.query, as the results are big and only needed until the index is built
+            return (await self.client.query(query=query))["result"]
+
+        async def build() -> Optional[OwnershipIndex]:
+            try:
+                return await OwnershipIndex.build(query, period=period_literal, selector=selector)
+            except Exception as e:
+                logger.warning(
+                    f"Failed to build the ownership index, will query the pods of each workload instead: {e}"
+                )
+                return None
+
+        return await self.ownership_indexes.run(period_literal, build)
+
     async def load_pods(self, object: K8sObjectData, period: timedelta) -> list[PodData]:
         """
         List pods related to the object and add them to the object's pods list.
+        The pods are looked up in the ownership index, or queried for the object if the index could not be built.
         Args:
             object (K8sObjectData): The Kubernetes object.
             period (timedelta): The time period for which to gather data.
@@ -275,6 +638,13 @@ class PrometheusMetricsService(MetricsService):
 
         logger.debug(f"Adding historic pods for {object}")
 
+        ownership_index = await self.get_ownership_index(period)
+        if ownership_index is not None:
+            return ownership_index.get_pods(object)
+
+        return await self._query_object_pods(object, period)
+
+    async def _query_object_pods(self, object: K8sObjectData, period: timedelta) -> list[PodData]:
         days_literal = min(int(period.total_seconds()) // 3600 // 24, 32)
         period_literal = f"{days_literal}d"
         pod_owners: Iterable[str]
@@ -1,4 +1,6 @@
-from typing import Optional
+import logging
+from datetime import timedelta
+from typing import Any, Optional
 
 from kubernetes.client import ApiClient
 from prometrix import MetricsNotFound, ThanosMetricsNotFound
@@ -7,6 +9,8 @@ from robusta_krr.utils.service_discovery import MetricsServiceDiscovery
 
 from .prometheus_metrics_service import PrometheusMetricsService
 
+logger = logging.getLogger("krr")
+
 
 class ThanosMetricsDiscovery(MetricsServiceDiscovery):
     def find_metrics_url(self, *, api_client: Optional[ApiClient] = None) -> Optional[str]:
@@ -34,6 +38,54 @@ class ThanosMetricsService(PrometheusMetricsService):
     """
 
     service_discovery = ThanosMetricsDiscovery
+    # The query frontend splits long ranges by day anyway, so the shards are fetched concurrently instead
+    range_shard_duration = timedelta(days=1)
+    # The query frontend also caches the results of the range queries, but not of the subqueries
+    subquery_cost = 2.0
+    # The downsampled resolutions, from the coarsest: (resolution, the min age of the blocks downsampled to it)
+    downsampled_resolutions = [(timedelta(hours=1), timedelta(days=10)), (timedelta(minutes=5), timedelta(hours=40))]
+    # The range windows (which are the step) have to span at least this many samples of a downsampled resolution
+    resolution_samples = 5
+    # NOTE: Recommendations based on the data of only some of the stores would be silently wrong, so fail instead
+    partial_response = False
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        # The resolution used for each history and step of the run, for the report on close
+        self.used_resolutions: dict[tuple[timedelta, timedelta], Optional[timedelta]] = {}
+
+    def get_resolution(self, period: timedelta, step: timedelta) -> Optional[timedelta]:
+        """
+        Picks the coarsest downsampled resolution that still has enough samples within the step,
+        if the history is long enough to reach the blocks downsampled to it.
+
+        Returns:
+            Optional[timedelta]: The max source resolution, or None for the raw data.
+        """
+
+        for resolution, min_age in self.downsampled_resolutions:
+            if period >= min_age and step >= resolution * self.resolution_samples:
+                return resolution
+        return None
+
+    def get_query_params(self, period: timedelta, step: timedelta) -> dict[str, Any]:
+        resolution = self.get_resolution(period, step)
+        self.used_resolutions[(period, step)] = resolution
+
+        # NOTE: Thanos falls back to the finer resolutions for the time ranges that were not downsampled yet
+        return {
+            "max_source_resolution": f"{int(resolution.total_seconds())}s" if resolution is not None else "0s",
+            "partial_response": str(self.partial_response).lower(),
+            "dedup": "true",
+        }
+
+    async def close(self) -> None:
+        for (period, step), resolution in self.used_resolutions.items():
+            logger.info(
+                f"{self.name()} was queried for {period} of history with {step} step "
+                f"at {'the raw resolution' if resolution is None else f'up to {resolution} resolution'}"
+            )
+        await super().close()
 
     def check_connection(self):
         """
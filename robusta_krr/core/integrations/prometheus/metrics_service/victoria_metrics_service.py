@@ -41,6 +41,14 @@ class VictoriaMetricsService(PrometheusMetricsService):
     """
 
     service_discovery = VictoriaMetricsDiscovery
+    # Victoria Metrics rejects queries longer than -search.maxQueryLen, which is 16KB by default
+    max_query_size = 16 * 1024
+    # and range queries returning more than -search.maxPointsPerTimeseries points, which is 30000 by default
+    max_range_points = 30000
+    # The raw samples are exported and aggregated client-side, which is much cheaper for Victoria Metrics than range queries
+    export_api = True
+    # Victoria Metrics rejects queries loading more than -search.maxSamplesPerQuery samples, which is 1B by default
+    max_query_samples = 1_000_000_000
 
     @classmethod
     def name(cls) -> str:
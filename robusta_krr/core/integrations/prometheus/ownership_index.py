@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Awaitable, Callable
+
+from robusta_krr.core.models.objects import K8sObjectData, PodData
+
+from .metrics.base import OWNER_CHAINS
+
+logger = logging.getLogger("krr")
+
+QueryFunction = Callable[[str], Awaitable[Any]]
+
+
+class OwnershipIndex:
+    """
+    An in-memory index of the pods owned by each workload within the history period, built from kube-state-metrics.
+
+    The whole owner graph (ReplicaSet / ReplicationController / Job -> owner, pod -> owner, and the running pods)
+    is loaded with a handful of cluster-wide queries, instead of a few queries per workload.
+    """
+
+    def __init__(self) -> None:
+        # (namespace, owner kind, owner name) -> names of the intermediate owners, e.g. the ReplicaSets of a Deployment
+        self.owners: defaultdict[tuple[str, str, str], set[str]] = defaultdict(set)
+        # (namespace, owner kind, owner name) -> names of the pods
+        self.pods: defaultdict[tuple[str, str, str], set[str]] = defaultdict(set)
+        # (namespace, pod)
+        self.running: set[tuple[str, str]] = set()
+
+    @classmethod
+    async def build(cls, query: QueryFunction, *, period: str, selector: str) -> OwnershipIndex:
+        """
+        Loads the owner graph.
+
+        Args:
+            query (QueryFunction): Runs an instant query and returns its result.
+            period (str): The history period, as a Prometheus duration.
+            selector (str): A label selector (without the curly braces) limiting the series, e.g. by the cluster label.
+        """
+
+        index = cls()
+        intermediate_owners = {(owner_metric, owner_label) for _, owner_metric, owner_label in OWNER_CHAINS.values()}
+
+        async def load_owners(owner_metric: str, owner_label: str) -> None:
+            result = await query(
+                f"""
+                    count by (namespace, {owner_label}, owner_kind, owner_name) (
+                        last_over_time({owner_metric}{{ {selector} }}[{period}])
+                    )
+                """
+            )
+            for series in result:
+                labels = series["metric"]
+                index.owners[(labels["namespace"], labels["owner_kind"], labels["owner_name"])].add(labels[owner_label])
+
+        async def load_pods() -> None:
+            result = await query(
+                f"""
+                    count by (namespace, pod, owner_kind, owner_name) (
+                        last_over_time(kube_pod_owner{{ {selector} }}[{period}])
+                    )
+                """
+            )
+            for series in result:
+                labels = series["metric"]
+                index.pods[(labels["namespace"], labels["owner_kind"], labels["owner_name"])].add(labels["pod"])
+
+        async def load_running() -> None:
+            running_selector = ", ".join(filter(None, ['phase="Running"', selector]))
+            result = await query(
+                f"""
+                    count by (namespace, pod) (
+                        kube_pod_status_phase{{ {running_selector} }} == 1
+                    )
+                """
+            )
+            index.running = {(series["metric"]["namespace"], series["metric"]["pod"]) for series in result}
+
+        await asyncio.gather(
+            *[load_owners(owner_metric, owner_label) for owner_metric, owner_label in intermediate_owners],
+            load_pods(),
+            load_running(),
+        )
+
+        logger.debug(f"Built the ownership index of {sum(len(pods) for pods in index.pods.values())} pods")
+        return index
+
+    def get_pods(self, object: K8sObjectData) -> list[PodData]:
+        """
+        Lists the pods of the object, following the same owner chain as the per-object queries.
+        """
+
+        if object.kind in OWNER_CHAINS:
+            pod_owner_kind = OWNER_CHAINS[object.kind][0]
+            pod_owners = self.owners.get((object.namespace, object.kind, object.name), set())
+        else:
+            pod_owner_kind = object.kind
+            pod_owners = {object.name}
+
+        return [
+            PodData(name=pod, deleted=(object.namespace, pod) not in self.running)
+            for owner in pod_owners
+            for pod in self.pods.get((object.namespace, pod_owner_kind, owner), set())
+        ]
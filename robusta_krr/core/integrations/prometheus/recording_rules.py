@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from typing import Any, Optional
+
+import yaml
+
+# The series recorded by the rules of `krr rules generate`, pre-aggregated per container.
+# NOTE: The names do not depend on the rules' parameters, so the loaders can find the series however they were generated
+CPU_USAGE_RECORD = "namespace_pod_container:krr_container_cpu_usage_seconds:rate"
+MEMORY_USAGE_RECORD = "namespace_pod_container:krr_container_memory_working_set_bytes:max"
+
+RULES_GROUP_NAME = "krr.rules"
+
+
+def generate_recording_rules(
+    *,
+    rate_interval: str = "5m",
+    evaluation_interval: str = "1m",
+    cluster_label: Optional[str] = None,
+) -> dict[str, Any]:
+    """
+    Generates the Prometheus rule groups, recording the per-container aggregations that KRR queries on every run.
+
+    Args:
+        rate_interval (str): The window of the recorded CPU usage rate.
+        evaluation_interval (str): How often the rules are evaluated, which is also the resolution of the recorded series.
+        cluster_label (Optional[str]): A label to keep in the recorded series, for a Prometheus storing multiple clusters.
+
+    Returns:
+        dict[str, Any]: The rule groups, in the format of a Prometheus rule file.
+    """
+
+    labels = ", ".join(["namespace", "pod", "container", "job"] + ([cluster_label] if cluster_label else []))
+    selector = 'container!="", container!="POD"'
+
+    return {
+        "groups": [
+            {
+                "name": RULES_GROUP_NAME,
+                "interval": evaluation_interval,
+                "rules": [
+                    {
+                        "record": CPU_USAGE_RECORD,
+                        "expr": f"max by ({labels}) (rate(container_cpu_usage_seconds_total{{{selector}}}[{rate_interval}]))",
+                    },
+                    {
+                        "record": MEMORY_USAGE_RECORD,
+                        "expr": f"max by ({labels}) (container_memory_working_set_bytes{{{selector}}})",
+                    },
+                ],
+            }
+        ]
+    }
+
+
+def render_recording_rules(
+    rules: dict[str, Any], *, prometheus_rule_name: Optional[str] = None, namespace: Optional[str] = None
+) -> str:
+    """
+    Renders the rule groups as a Prometheus rule file,
+    or as a PrometheusRule resource of the Prometheus Operator if `prometheus_rule_name` is given.
+    """
+
+    if prometheus_rule_name is not None:
+        metadata: dict[str, Any] = {"name": prometheus_rule_name}
+        if namespace is not None:
+            metadata["namespace"] = namespace
+        rules = {
+            "apiVersion": "monitoring.coreos.com/v1",
+            "kind": "PrometheusRule",
+            "metadata": metadata,
+            "spec": rules,
+        }
+
+    return yaml.safe_dump(rules, sort_keys=False, width=float("inf"))
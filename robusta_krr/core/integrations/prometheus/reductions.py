@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Callable, Optional
+
+from .metrics import PrometheusMetric, ReducedMetric
+
+if TYPE_CHECKING:
+    from robusta_krr.core.abstract.strategies import BaseStrategy, MetricsPodData, Reduction
+
+
+class ReductionPlan:
+    """
+    Plans how the metrics and the reductions (see `Reduction`) of a strategy are loaded.
+
+    If `pushdown` is set, each reduction that can be pushed down is loaded by a `ReducedMetric` (so only the values
+    are transferred), the others are reduced client-side from the samples of their metric, which is loaded instead.
+    `choose` optionally decides which of the reductions that can be pushed down are (e.g. `QueryCostPlanner.choose`),
+    otherwise all of them are.
+    Multiple reductions of the same metric share a single load of its samples, and so do the strategy's metrics.
+
+    `metrics` are the loaders to gather, and `apply` turns their data into the history data of the strategy.
+    """
+
+    def __init__(
+        self, strategy: BaseStrategy, *, pushdown: bool, choose: Optional[Callable[[Reduction], bool]] = None
+    ) -> None:
+        self.strategy_metrics: list[type[PrometheusMetric]] = list(strategy.metrics)
+        self.reductions = dict(strategy.reductions)
+        self.sources: dict[str, type[PrometheusMetric]] = {
+            name: (
+                ReducedMetric.reduce(reduction)
+                if pushdown
+                and ReducedMetric.supports_pushdown(reduction)
+                and (choose is None or choose(reduction))
+                else reduction.metric  # type: ignore
+            )
+            for name, reduction in self.reductions.items()
+        }
+
+    @property
+    def metrics(self) -> list[type[PrometheusMetric]]:
+        metrics = {MetricLoader.__name__: MetricLoader for MetricLoader in self.strategy_metrics}
+        for MetricLoader in self.sources.values():
+            metrics.setdefault(MetricLoader.__name__, MetricLoader)
+        return list(metrics.values())
+
+    def is_pushed_down(self, name: str) -> bool:
+        return issubclass(self.sources[name], ReducedMetric)
+
+    def apply(self, data: MetricsPodData) -> MetricsPodData:
+        history_data = {MetricLoader.__name__: data[MetricLoader.__name__] for MetricLoader in self.strategy_metrics}
+        for name, reduction in self.reductions.items():
+            source_data = data[self.sources[name].__name__]
+            history_data[name] = (
+                reduction.combine(source_data) if self.is_pushed_down(name) else reduction.reduce(source_data)
+            )
+        return history_data
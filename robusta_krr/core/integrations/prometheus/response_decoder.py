@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Optional
+
+import numpy as np
+
+
+class SeriesStreamDecoder:
+    """
+    An incremental decoder of Prometheus query responses (both matrix and vector result types).
+
+    The response body is fed chunk by chunk as it is received, and every series is emitted as soon as it is complete,
+    with its samples parsed straight into a (N, 2) float64 array of timestamps and values.
+    Only the labels of a series are decoded as JSON, the samples never become Python lists of strings,
+    and the decoder keeps no more than a single series of the response in memory.
+
+    Both `values` (range queries) and `value` (instant queries) are emitted as `values`.
+    """
+
+    METRIC_KEY = b'"metric"'
+    VALUE_KEY = b'"value'
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._metric: Optional[dict[str, Any]] = None
+        self._json = json.JSONDecoder()
+
+    def feed(self, chunk: bytes) -> list[dict[str, Any]]:
+        """
+        Adds a chunk of the response body and returns the series that were completed by it.
+        """
+
+        self._buffer += chunk
+        result: list[dict[str, Any]] = []
+        position = 0
+
+        while True:
+            if self._metric is None:
+                parsed = self._parse_metric(position)
+                if parsed is None:
+                    # Keep the incomplete labels, or the tail if the key itself might have been split between the chunks
+                    key = self._buffer.find(self.METRIC_KEY, position)
+                    position = key if key != -1 else max(position, len(self._buffer) - len(self.METRIC_KEY))
+                    break
+                self._metric, position = parsed
+            else:
+                parsed_values = self._parse_values(position)
+                if parsed_values is None:
+                    break
+                values, position = parsed_values
+                result.append({"metric": self._metric, "values": values})
+                self._metric = None
+
+        del self._buffer[:position]
+        return result
+
+    def close(self) -> None:
+        """
+        Checks that the whole response was decoded.
+
+        Raises:
+            ValueError: If the response was truncated in the middle of a series.
+        """
+
+        if self._metric is not None:
+            raise ValueError(f"Prometheus response was truncated in the middle of the series {self._metric}")
+
+    def _parse_metric(self, position: int) -> Optional[tuple[dict[str, Any], int]]:
+        key = self._buffer.find(self.METRIC_KEY, position)
+        if key == -1:
+            return None
+
+        start = self._buffer.find(b"{", key + len(self.METRIC_KEY))
+        end = start
+        while start != -1:
+            # NOTE: Label values may contain curly braces, so try each of them until the labels are a valid JSON
+            end = self._buffer.find(b"}", end)
+            if end == -1:
+                return None
+            end += 1
+
+            try:
+                metric, _ = self._json.raw_decode(self._buffer[start:end].decode())
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+            return metric, end
+
+        return None
+
+    def _parse_values(self, position: int) -> Optional[tuple[np.ndarray, int]]:
+        key = self._buffer.find(self.VALUE_KEY, position)
+        if key == -1:
+            return None
+
+        start = self._buffer.find(b"[", key)
+        if start == -1 or start + 1 >= len(self._buffer):
+            return None
+
+        is_range = self._buffer[key + len(self.VALUE_KEY)] == ord("s")
+        if is_range and self._buffer[start + 1] == ord("]"):
+            return np.empty((0, 2), dtype=np.float64), start + 2
+
+        end = self._buffer.find(b"]]" if is_range else b"]", start)
+        if end == -1:
+            return None
+        end += 2 if is_range else 1
+
+        # [[1700000000,"0.5"],[1700000060,"NaN"]] -> 1700000000,0.5,1700000060,NaN
+        text = bytes(self._buffer[start:end]).translate(None, b'[]" \n\t\r').decode()
+        values = np.fromstring(text, dtype=np.float64, sep=",")
+        if len(values) != text.count(",") + 1 or len(values) % 2 != 0:
+            raise ValueError(f"Failed to parse the samples of the series {self._metric}")
+
+        return values.reshape(-1, 2), end
+
+
+class ExportStreamDecoder:
+    """
+    An incremental decoder of the Victoria Metrics `/api/v1/export` responses,
+    which are JSON lines of `{"metric": {...}, "values": [...], "timestamps": [...]}` (with the timestamps in milliseconds).
+
+    Every line is emitted as a series as soon as it is complete, with the samples as a (N, 2) float64 array
+    of timestamps (in seconds) and values, in the same format as `SeriesStreamDecoder`.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+
+    def feed(self, chunk: bytes) -> list[dict[str, Any]]:
+        """
+        Adds a chunk of the response body and returns the series that were completed by it.
+        """
+
+        self._buffer += chunk
+        end = self._buffer.rfind(b"\n")
+        if end == -1:
+            return []
+
+        lines = bytes(self._buffer[:end]).split(b"\n")
+        del self._buffer[: end + 1]
+        return [self._decode_line(line) for line in lines if line.strip()]
+
+    def close(self) -> list[dict[str, Any]]:
+        """
+        Returns the last series, if the response did not end with a new line.
+
+        Raises:
+            ValueError: If the response was truncated in the middle of a series.
+        """
+
+        if not self._buffer.strip():
+            return []
+
+        try:
+            return [self._decode_line(bytes(self._buffer))]
+        finally:
+            self._buffer.clear()
+
+    @staticmethod
+    def _decode_line(line: bytes) -> dict[str, Any]:
+        try:
+            series = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError("Victoria Metrics export response was truncated in the middle of a series") from e
+
+        timestamps = np.asarray(series["timestamps"], dtype=np.float64) / 1000
+        values = np.asarray(series["values"], dtype=np.float64)
+        return {"metric": series["metric"], "values": np.stack([timestamps, values], axis=1)}
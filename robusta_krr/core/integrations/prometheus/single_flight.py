@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+V = TypeVar("V")
+
+
+class SingleFlight(Generic[V]):
+    """
+    Collapses concurrent identical requests into a single one, whose result is shared by all the callers.
+
+    If `keep_results` is set, the successful results are also kept for the rest of the scan,
+    so later identical requests do not hit the backend at all. Failures are never kept.
+
+    NOTE: The results are shared, so the callers must treat them as read-only.
+    """
+
+    def __init__(self, *, keep_results: bool = False) -> None:
+        self.keep_results = keep_results
+        self.hits = 0
+
+        self._in_flight: dict[Hashable, asyncio.Future[V]] = {}
+        self._results: dict[Hashable, V] = {}
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[V]]) -> V:
+        if key in self._results:
+            self.hits += 1
+            return self._results[key]
+
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda future: self._on_done(key, future))
+        else:
+            self.hits += 1
+
+        # NOTE: Shielded, so a cancelled caller does not cancel the request for the others
+        return await asyncio.shield(future)
+
+    def _on_done(self, key: Hashable, future: asyncio.Future[V]) -> None:
+        del self._in_flight[key]
+
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            # The exception is raised to the callers, here it is only marked as retrieved
+            return
+        if self.keep_results:
+            self._results[key] = future.result()
+
+    def clear(self) -> None:
+        self._results.clear()
@@ -48,9 +48,32 @@ class Config(pd.BaseSettings):
     eks_managed_prom_region: Optional[str] = pd.Field(None)
     coralogix_token: Optional[pd.SecretStr] = pd.Field(None)
     openshift: bool = pd.Field(False)
+    bulk_queries: bool = pd.Field(False)
+    fuse_queries: bool = pd.Field(True)
+    owner_queries: bool = pd.Field(False)
+    reduction_pushdown: bool = pd.Field(True)
+    cost_planner: bool = pd.Field(True)
+    subquery_cost: Optional[float] = pd.Field(None, gt=0)
+    query_plans_file: Optional[str] = pd.Field(None)
+    series_budget: Optional[int] = pd.Field(None, ge=1)
+    samples_budget: Optional[int] = pd.Field(None, ge=1)
+    recording_rules: bool = pd.Field(False)
+    victoria_metrics_export: bool = pd.Field(True)
+    prometheus_max_connections: int = pd.Field(20, ge=1)
+    prometheus_timeout: float = pd.Field(300, gt=0)  # seconds
+    prometheus_max_query_size: Optional[int] = pd.Field(None, ge=1)
+    prometheus_max_range_points: Optional[int] = pd.Field(None, ge=1)
+    range_shard_hours: Optional[float] = pd.Field(None, gt=0)
+    metrics_cache_dir: Optional[str] = pd.Field(None)
+    metrics_cache_ttl: float = pd.Field(72, gt=0)  # hours
+    metrics_cache_max_size: int = pd.Field(1024, ge=1)  # MB
+    metrics_dtype: Literal["float32", "float64"] = pd.Field("float32")
 
     # Threading settings
     max_workers: int = pd.Field(6, ge=1)
+    metrics_fanout: int = pd.Field(5, ge=1)
+    cluster_concurrency: int = pd.Field(50, ge=1)
+    compute_backend: Literal["thread", "process"] = pd.Field("thread")
 
     # Logging Settings
     format: str
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
-from typing import Literal, Optional
+from typing import TYPE_CHECKING, Literal, Optional
 
 import pydantic as pd
 
 from robusta_krr.core.models.allocations import ResourceAllocations
 from robusta_krr.utils.batched import batched
-from kubernetes.client.models import V1LabelSelector
+
+if TYPE_CHECKING:
+    from robusta_krr.core.integrations.kubernetes.projection import LabelSelector
 
 KindLiteral = Literal["Deployment", "DaemonSet", "StatefulSet", "Job", "CronJob", "Rollout", "DeploymentConfig", "StrimziPodSet"]
 
@@ -73,14 +75,12 @@ class K8sObjectData(pd.BaseModel):
         return len(self.pods)
 
     @property
-    def selector(self) -> V1LabelSelector:
+    def selector(self) -> Optional[LabelSelector]:
         if self._api_resource is None:
             raise ValueError("api_resource is not set")
 
-        if self.kind == 'CronJob':
-            return self._api_resource.spec.job_template.spec.selector
-        else:
-            return self._api_resource.spec.selector
+        # NOTE: The selector of a CronJob is projected from its job template
+        return self._api_resource.selector
 
     def split_into_batches(self, n: int) -> list[K8sObjectData]:
         """
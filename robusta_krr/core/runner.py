@@ -4,26 +4,36 @@ import math
 import os
 import sys
 import warnings
-from concurrent.futures import ThreadPoolExecutor
-from typing import Optional, Union
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional, TypeVar, Union
 from datetime import timedelta, datetime
 from prometrix import PrometheusNotFound
 from rich.console import Console
 from slack_sdk import WebClient
 
-from robusta_krr.core.abstract.strategies import ResourceRecommendation, RunResult
+from robusta_krr.core.abstract.strategies import (
+    MetricsPodData,
+    ResourceRecommendation,
+    RunResult,
+    concatenate_metrics,
+)
 from robusta_krr.core.integrations.kubernetes import KubernetesLoader
 from robusta_krr.core.integrations.prometheus import ClusterNotSpecifiedException, PrometheusMetricsLoader
+from robusta_krr.core.integrations.prometheus.load_guard import LoadVerdict
 from robusta_krr.core.models.config import settings
 from robusta_krr.core.models.objects import K8sObjectData
 from robusta_krr.core.models.result import ResourceAllocations, ResourceScan, ResourceType, Result, StrategyData
 from robusta_krr.utils.intro import load_intro_message
 from robusta_krr.utils.progress_bar import ProgressBar
+from robusta_krr.utils.shared_arrays import SharedArrays, run_shared
 from robusta_krr.utils.version import get_version, load_latest_version
 from robusta_krr.utils.patch import create_monkey_patches
 
 logger = logging.getLogger("krr")
 
+_T = TypeVar("_T")
+
 
 def custom_print(*objects, rich: bool = True, force: bool = False) -> None:
     """
@@ -37,6 +47,62 @@ def custom_print(*objects, rich: bool = True, force: bool = False) -> None:
 class CriticalRunnerException(Exception): ...
 
 
+class StrategyBatcher:
+    """
+    Runs a strategy that supports `run_batch` on batches of objects, instead of calling `run` for each of them.
+
+    Each of the objects is expected to either `run` or `skip` exactly once,
+    so the last (incomplete) batch is calculated as soon as all the objects are collected.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[list[MetricsPodData], list[K8sObjectData]], Awaitable[list[RunResult]]],
+        total: int,
+        batch_size: int = 1000,
+    ) -> None:
+        self._run_batch_function = run_batch
+        self._remaining = total
+        self._batch_size = batch_size
+        self._pending: list[tuple[MetricsPodData, K8sObjectData, asyncio.Future[RunResult]]] = []
+        self._tasks: set[asyncio.Task] = set()
+
+    async def run(self, history_data: MetricsPodData, object_data: K8sObjectData) -> RunResult:
+        future: asyncio.Future[RunResult] = asyncio.get_running_loop().create_future()
+        self._pending.append((history_data, object_data, future))
+        self._remaining -= 1
+        self._flush()
+        return await future
+
+    def skip(self) -> None:
+        self._remaining -= 1
+        self._flush()
+
+    def _flush(self) -> None:
+        if self._pending == [] or (len(self._pending) < self._batch_size and self._remaining > 0):
+            return
+
+        batch, self._pending = self._pending, []
+        task = asyncio.create_task(self._run_batch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: list[tuple[MetricsPodData, K8sObjectData, asyncio.Future[RunResult]]]) -> None:
+        try:
+            results = await self._run_batch_function(
+                [history_data for history_data, _, _ in batch], [object_data for _, object_data, _ in batch]
+            )
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
 class Runner:
     EXPECTED_EXCEPTIONS = (KeyboardInterrupt, PrometheusNotFound)
 
@@ -47,9 +113,20 @@ class Runner:
         self._strategy = settings.create_strategy()
 
         self.errors: list[dict] = []
+        # The verdicts of the load guard for the objects which metrics are not loaded as usual, see _check_workload_load
+        self._load_verdicts: dict[K8sObjectData, LoadVerdict] = {}
 
         # This executor will be running calculations for recommendations
         self._executor = ThreadPoolExecutor(settings.max_workers)
+        # With the process compute backend, the strategy runs in this pool instead, reading the metrics from shared
+        # memory, as the strategies spend most of the time in Python code, holding the GIL
+        self._process_executor = (
+            ProcessPoolExecutor(settings.max_workers) if settings.compute_backend == "process" else None
+        )
+        # Set per cluster for the strategies that support calculating many objects at once, see _scan_cluster
+        self._batchers: dict[Optional[str], StrategyBatcher] = {}
+        # Limit the workloads loading their metrics at once per cluster, see _loading_slot
+        self._loading_slots: dict[Optional[str], asyncio.Semaphore] = {}
 
     def _get_prometheus_loader(self, cluster: Optional[str]) -> Optional[PrometheusMetricsLoader]:
         if cluster not in self._metrics_service_loaders:
@@ -69,6 +146,34 @@ class Runner:
 
         return result
 
+    async def _connect_prometheus(self, cluster: Optional[str]) -> None:
+        """
+        Connects to the Prometheus of the cluster, so that `_get_prometheus_loader` returns it (or its error).
+        The discovery of the Prometheus and the connection check are blocking, so they are run in a thread.
+        """
+
+        if cluster in self._metrics_service_loaders:
+            return
+
+        loop = asyncio.get_running_loop()
+        try:
+            prometheus_loader = await loop.run_in_executor(None, lambda: PrometheusMetricsLoader(cluster=cluster))
+        except Exception as e:
+            self._metrics_service_loaders.setdefault(cluster, e)
+        else:
+            self._metrics_service_loaders.setdefault(cluster, prometheus_loader)
+
+    def _loading_slot(self, cluster: Optional[str]) -> asyncio.Semaphore:
+        """
+        The slots of the cluster for loading the pods and the metrics, up to `settings.cluster_concurrency` at once.
+        NOTE: A slot must not be held while waiting for the strategy, as the batcher only calculates a batch
+        once all of its objects are submitted (or the batch is full), which needs the other objects to be loaded.
+        """
+
+        if cluster not in self._loading_slots:
+            self._loading_slots[cluster] = asyncio.Semaphore(settings.cluster_concurrency)
+        return self._loading_slots[cluster]
+
     @staticmethod
     def __parse_version_string(version: str) -> tuple[int, ...]:
         version_trimmed = version.replace("-dev", "").replace("v", "")
@@ -175,44 +280,193 @@ class Runner:
             for resource, recommendation in result.items()
         }
 
-    async def _calculate_object_recommendations(self, object: K8sObjectData) -> Optional[RunResult]:
-        try:
-            prometheus_loader = self._get_prometheus_loader(object.cluster)
+    async def _load_object_pods(self, object: K8sObjectData, prometheus_loader: PrometheusMetricsLoader) -> None:
+        object.pods = await prometheus_loader.load_pods(object, self._strategy.settings.history_timedelta)
+        if object.pods == []:
+            # Fallback to Kubernetes API
+            object.pods = await self._k8s_loader.load_pods(object)
 
-            if prometheus_loader is None:
-                return None
+            # NOTE: Kubernetes API returned pods, but Prometheus did not
+            # This might happen with fast executing jobs
+            if object.pods != []:
+                object.add_warning("NoPrometheusPods")
+                logger.warning(
+                    f"Was not able to load any pods for {object} from Prometheus. "
+                    "Loaded pods from Kubernetes API instead."
+                )
+
+    async def _load_workload_pods(
+        self, objects: list[K8sObjectData], prometheus_loader: PrometheusMetricsLoader
+    ) -> None:
+        """Load the pods once for all the containers of a workload, as they share the same pods."""
+
+        await self._load_object_pods(objects[0], prometheus_loader)
+        for object in objects[1:]:
+            object.pods = objects[0].pods
+            if "NoPrometheusPods" in objects[0].warnings:
+                object.add_warning("NoPrometheusPods")
+
+    async def _check_workload_load(
+        self, objects: list[K8sObjectData], prometheus_loader: PrometheusMetricsLoader
+    ) -> Optional[LoadVerdict]:
+        """
+        Checks whether the metrics of a workload (the objects of its containers) can be loaded within the load budget.
+        If not, the verdict is reported in the errors of the result, and kept for its objects until they are gathered.
+
+        Returns:
+            Optional[LoadVerdict]: The verdict, or None if the metrics can be loaded as usual.
+        """
+
+        verdict = await prometheus_loader.check_load(
+            objects, self._strategy.settings.history_timedelta, self._strategy.settings.timeframe_timedelta
+        )
+        if verdict is None or verdict.action == "proceed":
+            return None
+
+        if verdict.action == "split":
+            consequence = f"splitting its queries into batches of {verdict.max_pods} pods"
+        elif verdict.action == "downgrade":
+            consequence = f"querying it with a {verdict.step} step"
+        else:
+            consequence = "skipping it"
+        logger.warning(
+            f"The metrics of {objects[0]} exceed the load budget ({verdict.series} series, "
+            f"{verdict.samples} samples), {consequence}"
+        )
+
+        self.errors.append(verdict.to_error(objects))
+        for object in objects:
+            self._load_verdicts[object] = verdict
+        return verdict
+
+    @staticmethod
+    def _group_workloads(workloads: list[K8sObjectData]) -> list[list[K8sObjectData]]:
+        """Group the objects (one per container) by the workload they belong to."""
+
+        groups: dict[tuple[Optional[str], str, str, str], list[K8sObjectData]] = {}
+        for k8s_object in workloads:
+            key = (k8s_object.cluster, k8s_object.namespace, k8s_object.kind, k8s_object.name)
+            groups.setdefault(key, []).append(k8s_object)
+        return list(groups.values())
+
+    async def _prefetch_bulk_metrics(self, workloads: list[K8sObjectData]) -> None:
+        """Load pods for all the workloads, then gather their metrics with one query per namespace and metric."""
+
+        cluster_workloads: defaultdict[Optional[str], list[K8sObjectData]] = defaultdict(list)
+        for k8s_object in workloads:
+            cluster_workloads[k8s_object.cluster].append(k8s_object)
 
-            object.pods = await prometheus_loader.load_pods(object, self._strategy.settings.history_timedelta)
-            if object.pods == []:
-                # Fallback to Kubernetes API
-                object.pods = await self._k8s_loader.load_pods(object)
-
-                # NOTE: Kubernetes API returned pods, but Prometheus did not
-                # This might happen with fast executing jobs
-                if object.pods != []:
-                    object.add_warning("NoPrometheusPods")
-                    logger.warning(
-                        f"Was not able to load any pods for {object} from Prometheus. "
-                        "Loaded pods from Kubernetes API instead."
-                    )
-
-            metrics = await prometheus_loader.gather_data(
-                object,
+        async def _load_pods(objects: list[K8sObjectData], prometheus_loader: PrometheusMetricsLoader) -> None:
+            try:
+                await self._load_workload_pods(objects, prometheus_loader)
+            except Exception as e:
+                logger.error(f"An error occurred while loading pods for {objects[0]}: {e}")
+
+        async def _prefetch_cluster(cluster: Optional[str], objects: list[K8sObjectData]) -> None:
+            try:
+                prometheus_loader = self._get_prometheus_loader(cluster)
+            except Exception as e:
+                logger.error(f"An error occurred while connecting to Prometheus for cluster {cluster}: {e}")
+                return
+
+            if prometheus_loader is None:
+                return
+
+            groups = self._group_workloads(objects)
+            await asyncio.gather(*[_load_pods(group, prometheus_loader) for group in groups])
+            # NOTE: The workloads over the load budget are not prefetched, but gathered one by one instead
+            verdicts = await asyncio.gather(*[self._check_workload_load(group, prometheus_loader) for group in groups])
+            await prometheus_loader.prefetch_bulk_data(
+                [object for group, verdict in zip(groups, verdicts) if verdict is None for object in group],
                 self._strategy,
                 self._strategy.settings.history_timedelta,
                 step=self._strategy.settings.timeframe_timedelta,
             )
 
-            # NOTE: We run this in a threadpool as the strategy calculation might be CPU intensive
-            # But keep in mind that numpy calcluations will not block the GIL
-            loop = asyncio.get_running_loop()
-            result = await loop.run_in_executor(self._executor, self._strategy.run, metrics, object)
+        await asyncio.gather(*[_prefetch_cluster(cluster, objects) for cluster, objects in cluster_workloads.items()])
+
+    async def _calculate_object_recommendations(
+        self, object: K8sObjectData, *, load_pods: bool = True
+    ) -> Optional[RunResult]:
+        submitted = False
+        try:
+            prometheus_loader = self._get_prometheus_loader(object.cluster)
+
+            if prometheus_loader is None:
+                return None
+
+            async with self._loading_slot(object.cluster):
+                if load_pods and not settings.bulk_queries:
+                    # NOTE: In bulk mode pods are loaded beforehand, in _prefetch_bulk_metrics,
+                    # and for workloads with multiple containers, in _gather_workload_allocations
+                    await self._load_object_pods(object, prometheus_loader)
+                    await self._check_workload_load([object], prometheus_loader)
+
+                verdict = self._load_verdicts.pop(object, None)
+                if verdict is not None and verdict.action == "skip":
+                    return {
+                        resource: ResourceRecommendation.undefined(info="Skipped by the load guard")
+                        for resource in ResourceType
+                    }
+
+                metrics = await prometheus_loader.gather_data(
+                    object,
+                    self._strategy,
+                    self._strategy.settings.history_timedelta,
+                    step=verdict.step if verdict is not None else self._strategy.settings.timeframe_timedelta,
+                    max_pods=verdict.max_pods if verdict is not None else None,
+                )
+
+            submitted = True
+            result = await self._run_strategy(metrics, object)
 
             logger.info(f"Calculated recommendations for {object} (using {len(metrics)} metrics)")
             return self._format_result(result)
         except Exception as e:
             logger.error(f"An error occurred while calculating recommendations for {object}: {e}")
             return None
+        finally:
+            batcher = self._batchers.get(object.cluster)
+            if not submitted and batcher is not None:
+                batcher.skip()
+
+    async def _run_strategy(self, metrics: MetricsPodData, object: K8sObjectData) -> RunResult:
+        batcher = self._batchers.get(object.cluster)
+        if batcher is not None:
+            return await batcher.run(metrics, object)
+
+        if self._process_executor is not None:
+            return await self._run_in_process(self._strategy.run, metrics, object)
+
+        # NOTE: We run this in a threadpool as the strategy calculation might be CPU intensive
+        # But keep in mind that numpy calcluations will not block the GIL
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._strategy.run, metrics, object)
+
+    async def _run_strategy_batch(self, metrics: list[MetricsPodData], objects: list[K8sObjectData]) -> list[RunResult]:
+        loop = asyncio.get_running_loop()
+        batch_metrics = await loop.run_in_executor(self._executor, concatenate_metrics, metrics)
+
+        if self._process_executor is not None:
+            return await self._run_in_process(self._strategy.run_batch, batch_metrics, objects)
+
+        return await loop.run_in_executor(self._executor, self._strategy.run_batch, batch_metrics, objects)
+
+    async def _run_in_process(self, function: Callable[..., _T], data: Any, *args: Any) -> _T:
+        """
+        Runs `function(data, *args)` in the process pool.
+        The arrays of the data are copied into a shared memory block, instead of being pickled with the arguments.
+        """
+
+        assert self._process_executor is not None
+        loop = asyncio.get_running_loop()
+        shared = await loop.run_in_executor(self._executor, SharedArrays, data)
+        try:
+            return await loop.run_in_executor(
+                self._process_executor, run_shared, function, shared.name, shared.template, *args
+            )
+        finally:
+            shared.close()
 
     async def _check_data_availability(self, cluster: Optional[str]) -> None:
         prometheus_loader = self._get_prometheus_loader(cluster)
@@ -253,8 +507,42 @@ class Runner:
                 }
             )
 
-    async def _gather_object_allocations(self, k8s_object: K8sObjectData) -> Optional[ResourceScan]:
-        recommendation = await self._calculate_object_recommendations(k8s_object)
+    async def _gather_workload_allocations(self, objects: list[K8sObjectData]) -> list[Optional[ResourceScan]]:
+        """
+        Gather the allocations of all the containers of a workload.
+        The pods are loaded once and the metrics of all the containers are fetched together (split by container).
+        """
+
+        if len(objects) == 1 or settings.bulk_queries:
+            return await asyncio.gather(*[self._gather_object_allocations(k8s_object) for k8s_object in objects])
+
+        pods_loaded = False
+        try:
+            prometheus_loader = self._get_prometheus_loader(objects[0].cluster)
+            if prometheus_loader is not None:
+                async with self._loading_slot(objects[0].cluster):
+                    await self._load_workload_pods(objects, prometheus_loader)
+                    pods_loaded = True
+                    # NOTE: The containers of the workloads over the load budget are gathered one by one instead
+                    if await self._check_workload_load(objects, prometheus_loader) is None:
+                        await prometheus_loader.prefetch_workload_data(
+                            objects,
+                            self._strategy,
+                            self._strategy.settings.history_timedelta,
+                            step=self._strategy.settings.timeframe_timedelta,
+                        )
+        except Exception as e:
+            # NOTE: The containers which metrics were not prefetched are then gathered one by one
+            logger.error(f"An error occurred while gathering metrics for the containers of {objects[0]}: {e}")
+
+        return await asyncio.gather(
+            *[self._gather_object_allocations(k8s_object, load_pods=not pods_loaded) for k8s_object in objects]
+        )
+
+    async def _gather_object_allocations(
+        self, k8s_object: K8sObjectData, *, load_pods: bool = True
+    ) -> Optional[ResourceScan]:
+        recommendation = await self._calculate_object_recommendations(k8s_object, load_pods=load_pods)
 
         self.__progressbar.progress()
 
@@ -270,6 +558,37 @@ class Runner:
             ),
         )
 
+    async def _scan_cluster(self, cluster: Optional[str]) -> list[Optional[ResourceScan]]:
+        """
+        Scans a cluster: connects to its Prometheus while its workloads are discovered,
+        then calculates their recommendations, loading the metrics of up to `settings.cluster_concurrency` workloads
+        at once (see `_loading_slot`).
+        """
+
+        async def _connect() -> None:
+            await self._connect_prometheus(cluster)
+            try:
+                await self._check_data_availability(cluster)
+            except Exception as e:
+                logger.error(f"An error occurred while checking the history available in cluster {cluster}: {e}")
+
+        _, workloads = await asyncio.gather(
+            _connect(), self._k8s_loader.list_scannable_objects([cluster] if cluster is not None else None)
+        )
+        logger.info(f"Discovered {len(workloads)} objects in {cluster or 'inner'} cluster")
+        self.__progressbar.update_total((self.__progressbar.total or 0) + len(workloads))
+
+        if settings.bulk_queries:
+            await self._prefetch_bulk_metrics(workloads)
+
+        if self._strategy.supports_batch():
+            self._batchers[cluster] = StrategyBatcher(self._run_strategy_batch, len(workloads))
+
+        workload_scans = await asyncio.gather(
+            *[self._gather_workload_allocations(objects) for objects in self._group_workloads(workloads)]
+        )
+        return [scan for scans in workload_scans for scan in scans]
+
     async def _collect_result(self) -> Result:
         clusters = await self._k8s_loader.list_clusters()
         if clusters and len(clusters) > 1 and settings.prometheus_url:
@@ -283,22 +602,20 @@ class Runner:
 
         logger.info(f'Using clusters: {clusters if clusters is not None else "inner cluster"}')
 
-        if clusters is None:
-            await self._check_data_availability(None)
-        else:
-            await asyncio.gather(*[self._check_data_availability(cluster) for cluster in clusters])
+        # NOTE: Each of the clusters is scanned by an independent pipeline,
+        # so a slow cluster does not hold up the others
+        with ProgressBar(title="Calculating Recommendations") as self.__progressbar:
+            cluster_scans = await asyncio.gather(
+                *[self._scan_cluster(cluster) for cluster in (clusters if clusters is not None else [None])]
+            )
+            scans = [scan for scans in cluster_scans for scan in scans]
 
-        workloads = await self._k8s_loader.list_scannable_objects(clusters)
-        
         if not clusters or len(clusters) == 1:
             cluster_name = clusters[0] if clusters else None # its none if krr is running inside cluster
             prometheus_loader = self._get_prometheus_loader(cluster_name)
             cluster_summary = await prometheus_loader.get_cluster_summary()
         else:
             cluster_summary = {}
-            
-        with ProgressBar(total=len(workloads), title="Calculating Recommendations") as self.__progressbar:
-            scans = await asyncio.gather(*[self._gather_object_allocations(k8s_object) for k8s_object in workloads])
 
         successful_scans = [scan for scan in scans if scan is not None]
 
@@ -335,16 +652,6 @@ class Runner:
 
         try:
             create_monkey_patches()
-            # eks has a lower step limit than other types of prometheus, it will throw an error
-            step_count = self._strategy.settings.history_duration * 60 / self._strategy.settings.timeframe_duration
-            if settings.eks_managed_prom and step_count > 11000:
-                min_step = self._strategy.settings.history_duration * 60 / 10000
-                logger.warning(
-                    f"The timeframe duration provided is insufficient and will be overridden with {min_step}. "
-                    f"Kindly adjust --timeframe_duration to a value equal to or greater than {min_step}."
-                )
-                self._strategy.settings.timeframe_duration = min_step
-
             result = await self._collect_result()
             logger.info("Result collected, displaying...")
             self._process_result(result)
@@ -356,3 +663,17 @@ class Runner:
             return 1  # Exit with error
         else:
             return 0  # Exit with success
+        finally:
+            await self._close_prometheus_loaders()
+            if self._process_executor is not None:
+                self._process_executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _close_prometheus_loaders(self) -> None:
+        for prometheus_loader in self._metrics_service_loaders.values():
+            if isinstance(prometheus_loader, Exception):
+                continue
+
+            try:
+                await prometheus_loader.close()
+            except Exception:
+                logger.debug("An error occurred while closing the Prometheus connections", exc_info=True)
@@ -17,6 +17,7 @@ from typer.models import OptionInfo
 from robusta_krr import formatters as concrete_formatters  # noqa: F401
 from robusta_krr.core.abstract import formatters
 from robusta_krr.core.abstract.strategies import BaseStrategy
+from robusta_krr.core.integrations.prometheus.recording_rules import generate_recording_rules, render_recording_rules
 from robusta_krr.core.models.config import Config
 from robusta_krr.core.runner import Runner
 from robusta_krr.utils.version import get_version
@@ -35,11 +36,50 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 logger = logging.getLogger("krr")
 
 
+rules_app = typer.Typer(help="Manage the Prometheus recording rules, which pre-aggregate the metrics used by KRR.")
+app.add_typer(rules_app, name="rules", rich_help_panel="Utils")
+
+
 @app.command(rich_help_panel="Utils")
 def version() -> None:
     typer.echo(get_version())
 
 
+@rules_app.command("generate")
+def generate_rules(
+    output: Optional[str] = typer.Option(
+        None, "--output", "-o", help="A file to write the rules to. Defaults to stdout."
+    ),
+    rate_interval: str = typer.Option("5m", "--rate-interval", help="The window of the recorded CPU usage rate."),
+    evaluation_interval: str = typer.Option(
+        "1m", "--evaluation-interval", help="How often the rules are evaluated (the resolution of the recorded series)."
+    ),
+    cluster_label: Optional[str] = typer.Option(
+        None,
+        "--cluster-label",
+        help="A label to keep in the recorded series, when the rules are evaluated over the metrics of multiple clusters.",
+    ),
+    prometheus_rule: Optional[str] = typer.Option(
+        None,
+        "--prometheus-rule",
+        help="Wrap the rules into a Prometheus Operator PrometheusRule resource with this name.",
+    ),
+    namespace: Optional[str] = typer.Option(None, "--namespace", "-n", help="The namespace of the PrometheusRule."),
+) -> None:
+    """Generate the recording rules to run KRR with --recording-rules."""
+
+    rules = generate_recording_rules(
+        rate_interval=rate_interval, evaluation_interval=evaluation_interval, cluster_label=cluster_label
+    )
+    rendered = render_recording_rules(rules, prometheus_rule_name=prometheus_rule, namespace=namespace)
+
+    if output is None:
+        typer.echo(rendered, nl=False)
+    else:
+        Path(output).write_text(rendered)
+        typer.echo(f"Recording rules were written to {output}", err=True)
+
+
 def __process_type(_T: type) -> type:
     """Process type to a python literal"""
     if _T in (int, float, str, bool, datetime, UUID):
@@ -203,6 +243,126 @@ def load_commands() -> None:
                     help="Connect to Prometheus with a token read from /var/run/secrets/kubernetes.io/serviceaccount/token - recommended when running KRR inside an OpenShift cluster",
                     rich_help_panel="Prometheus Openshift Settings",
                 ),
+                prometheus_max_connections: int = typer.Option(
+                    20,
+                    "--prometheus-max-connections",
+                    help="Max number of concurrent connections (and so in-flight queries) to each Prometheus.",
+                    rich_help_panel="Prometheus Settings",
+                ),
+                prometheus_timeout: float = typer.Option(
+                    300,
+                    "--prometheus-timeout",
+                    help="Timeout (in seconds) of each query to Prometheus, including receiving the response.",
+                    rich_help_panel="Prometheus Settings",
+                ),
+                prometheus_max_query_size: Optional[int] = typer.Option(
+                    None,
+                    "--prometheus-max-query-size",
+                    help="Max size of a single query in bytes, bigger queries are split into batches of pods. Defaults to the known limit of the metrics backend.",
+                    rich_help_panel="Query Tuning Settings",
+                ),
+                prometheus_max_range_points: Optional[int] = typer.Option(
+                    None,
+                    "--prometheus-max-range-points",
+                    help="Max number of points per series of a range query, longer ranges are split into time shards. Defaults to the known limit of the metrics backend.",
+                    rich_help_panel="Query Tuning Settings",
+                ),
+                range_shard_hours: Optional[float] = typer.Option(
+                    None,
+                    "--range-shard-hours",
+                    help="Split range queries into time shards of this many hours, fetched concurrently. Defaults to 24 for Thanos and Mimir, and to no sharding (other than by the points limit) otherwise.",
+                    rich_help_panel="Query Tuning Settings",
+                ),
+                bulk_queries: bool = typer.Option(
+                    False,
+                    "--bulk-queries",
+                    help="Query metrics once per namespace instead of once per container, and split the results in memory. Recommended for big clusters.",
+                    rich_help_panel="Query Tuning Settings",
+                ),
+                fuse_queries: bool = typer.Option(
+                    True,
+                    "--fuse-queries/--no-fuse-queries",
+                    help="Load the metrics that share the same selector (e.g. CPU percentile and CPU points count) with a single query.",
+                    rich_help_panel="Query Tuning Settings",
+                ),
+                owner_queries: bool = typer.Option(
+                    False,
+                    "--owner-queries/--no-owner-queries",
+                    help="Select the pods of each workload by joining with its owners from kube-state-metrics, instead of by a regex of all the pod names. Recommended for workloads with a lot of pod churn.",
+                    rich_help_panel="Query Tuning Settings",
+                ),
+                reduction_pushdown: bool = typer.Option(
+                    True,
+                    "--reduction-pushdown/--no-reduction-pushdown",
+                    help="Compute the reductions the strategy needs (e.g. the percentiles of each pod) in the metrics backend, and only fetch the results, instead of fetching all the data points.",
+                    rich_help_panel="Query Tuning Settings",
+                ),
+                cost_planner: bool = typer.Option(
+                    True,
+                    "--cost-planner/--no-cost-planner",
+                    help="Estimate for each workload whether pushing the reductions down or reducing the data points locally is cheaper, instead of always pushing them down.",
+                    rich_help_panel="Query Tuning Settings",
+                ),
+                subquery_cost: Optional[float] = typer.Option(
+                    None,
+                    "--subquery-cost",
+                    help="The cost of reading a raw sample by a subquery relative to transferring a point of a range query, for the cost planner. Defaults to an estimate for the metrics backend.",
+                    rich_help_panel="Query Tuning Settings",
+                ),
+                query_plans_file: Optional[str] = typer.Option(
+                    None,
+                    "--query-plans-file",
+                    help="A file to append the choices of the cost planner (with the estimated costs) to, as JSON lines.",
+                    rich_help_panel="Query Tuning Settings",
+                ),
+                series_budget: Optional[int] = typer.Option(
+                    None,
+                    "--series-budget",
+                    help="The max number of series a metrics query of a workload may select. The series of each workload are counted beforehand, and the workloads above it are split into multiple queries, queried with a longer step, or skipped.",
+                    rich_help_panel="Query Tuning Settings",
+                ),
+                samples_budget: Optional[int] = typer.Option(
+                    None,
+                    "--samples-budget",
+                    help="The max number of samples a metrics query of a workload may return (the series multiplied by the points of the history). The workloads above it are split into multiple queries, queried with a longer step, or skipped.",
+                    rich_help_panel="Query Tuning Settings",
+                ),
+                recording_rules: bool = typer.Option(
+                    False,
+                    "--recording-rules/--no-recording-rules",
+                    help="Query the series recorded by the rules of `krr rules generate` instead of the raw cAdvisor metrics, if they cover the whole history.",
+                    rich_help_panel="Query Tuning Settings",
+                ),
+                victoria_metrics_export: bool = typer.Option(
+                    True,
+                    "--victoria-metrics-export/--no-victoria-metrics-export",
+                    help="Stream the raw samples of range metrics from the Victoria Metrics export API and aggregate them locally, instead of running range queries.",
+                    rich_help_panel="Query Tuning Settings",
+                ),
+                metrics_cache_dir: Optional[str] = typer.Option(
+                    None,
+                    "--metrics-cache-dir",
+                    help="A directory to cache the fetched metrics in between the runs. When set, reruns only fetch the samples since the previous run.",
+                    rich_help_panel="Metrics Cache Settings",
+                ),
+                metrics_cache_ttl: float = typer.Option(
+                    72,
+                    "--metrics-cache-ttl",
+                    help="Evict the cached metrics that were not used for this number of hours.",
+                    rich_help_panel="Metrics Cache Settings",
+                ),
+                metrics_cache_max_size: int = typer.Option(
+                    1024,
+                    "--metrics-cache-max-size",
+                    help="Max size of the metrics cache in MB. The least recently used metrics are evicted above it.",
+                    rich_help_panel="Metrics Cache Settings",
+                ),
+                metrics_dtype: str = typer.Option(
+                    "float32",
+                    "--metrics-dtype",
+                    help="Precision of the loaded metric values (float32 or float64). float32 halves the memory.",
+                    rich_help_panel="Query Tuning Settings",
+                ),
                 cpu_min_value: int = typer.Option(
                     10,
                     "--cpu-min",
@@ -222,6 +382,27 @@ def load_commands() -> None:
                     help="Max workers to use for async requests.",
                     rich_help_panel="Threading Settings",
                 ),
+                metrics_fanout: int = typer.Option(
+                    5,
+                    "--metrics-fanout",
+                    help="Max number of metrics to fetch concurrently for a single object.",
+                    rich_help_panel="Threading Settings",
+                ),
+                cluster_concurrency: int = typer.Option(
+                    50,
+                    "--cluster-concurrency",
+                    help="Max number of workloads to scan concurrently in each cluster. The clusters are scanned in parallel.",
+                    rich_help_panel="Threading Settings",
+                ),
+                compute_backend: str = typer.Option(
+                    "thread",
+                    "--compute-backend",
+                    help=(
+                        "Where to run the strategy calculations: 'thread' (a thread pool) "
+                        "or 'process' (a process pool, with the metrics passed through shared memory)."
+                    ),
+                    rich_help_panel="Threading Settings",
+                ),
                 format: str = typer.Option(
                     "table",
                     "--formatter",
@@ -337,7 +518,30 @@ def load_commands() -> None:
                     "eks_service_name": eks_service_name,
                     "coralogix_token": coralogix_token,
                     "openshift": openshift,
+                    "prometheus_max_connections": prometheus_max_connections,
+                    "prometheus_timeout": prometheus_timeout,
+                    "prometheus_max_query_size": prometheus_max_query_size,
+                    "prometheus_max_range_points": prometheus_max_range_points,
+                    "range_shard_hours": range_shard_hours,
+                    "bulk_queries": bulk_queries,
+                    "fuse_queries": fuse_queries,
+                    "owner_queries": owner_queries,
+                    "reduction_pushdown": reduction_pushdown,
+                    "cost_planner": cost_planner,
+                    "subquery_cost": subquery_cost,
+                    "query_plans_file": query_plans_file,
+                    "series_budget": series_budget,
+                    "samples_budget": samples_budget,
+                    "recording_rules": recording_rules,
+                    "victoria_metrics_export": victoria_metrics_export,
+                    "metrics_cache_dir": metrics_cache_dir,
+                    "metrics_cache_ttl": metrics_cache_ttl,
+                    "metrics_cache_max_size": metrics_cache_max_size,
+                    "metrics_dtype": metrics_dtype,
                     "max_workers": max_workers,
+                    "metrics_fanout": metrics_fanout,
+                    "cluster_concurrency": cluster_concurrency,
+                    "compute_backend": compute_backend,
                     "format": format,
                     "show_cluster_name": show_cluster_name,
                     "verbose": verbose,
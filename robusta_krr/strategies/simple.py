@@ -1,14 +1,17 @@
 import textwrap
 from datetime import timedelta
+from typing import Sequence
 
 import numpy as np
 import pydantic as pd
 
 from robusta_krr.core.abstract.strategies import (
     BaseStrategy,
+    BatchMetricsData,
     K8sObjectData,
     MetricsPodData,
     PodsTimeData,
+    RaggedArray,
     ResourceRecommendation,
     ResourceType,
     RunResult,
@@ -29,13 +32,6 @@ class SimpleStrategySettings(StrategySettings):
     memory_buffer_percentage: float = pd.Field(
         15, gt=0, description="The percentage of added buffer to the peak memory usage for memory recommendation."
     )
-    points_required: int = pd.Field(
-        100, ge=1, description="The number of data points required to make a recommendation for a resource."
-    )
-    allow_hpa: bool = pd.Field(
-        False,
-        description="Whether to calculate recommendations even when there is an HPA scaler defined on that resource.",
-    )
     use_oomkill_data: bool = pd.Field(
         False,
         description="Whether to bump the memory when OOMKills are detected (experimental).",
@@ -54,6 +50,12 @@ class SimpleStrategySettings(StrategySettings):
             max_oomkill * (1 + self.oom_memory_buffer_percentage / 100),
         )
 
+    def calculate_memory_proposals(self, data: RaggedArray, max_oomkill: np.ndarray) -> np.ndarray:
+        return np.maximum(
+            data.max() * (1 + self.memory_buffer_percentage / 100),
+            max_oomkill * (1 + self.oom_memory_buffer_percentage / 100),
+        )
+
     def calculate_cpu_proposal(self, data: PodsTimeData) -> float:
         if len(data) == 0:
             return float("NaN")
@@ -65,6 +67,9 @@ class SimpleStrategySettings(StrategySettings):
 
         return np.max(data_)
 
+    def calculate_cpu_proposals(self, data: RaggedArray) -> np.ndarray:
+        return data.max()
+
     def history_range_enough(self, history_range: tuple[timedelta, timedelta]) -> bool:
         start, end = history_range
         return (end - start) >= timedelta(hours=3)
@@ -115,24 +120,15 @@ class SimpleStrategy(BaseStrategy[SimpleStrategySettings]):
     ) -> ResourceRecommendation:
         data = history_data["PercentileCPULoader"]
 
-        if len(data) == 0:
-            return ResourceRecommendation.undefined(info="No data")
-
         # NOTE: metrics for each pod are returned as list[values] where values is [timestamp, value]
         # As CPUAmountLoader returns only the last value (1 point), [0, 1] is used to get the value
         # So each pod is string with pod name, and values is numpy array of shape (N, 2)
         data_count = {pod: values[0, 1] for pod, values in history_data["CPUAmountLoader"].items()}
         total_points_count = sum(data_count.values())
 
-        if total_points_count < self.settings.points_required:
-            return ResourceRecommendation.undefined(info="Not enough data")
-
-        if (
-            object_data.hpa is not None
-            and object_data.hpa.target_cpu_utilization_percentage is not None
-            and not self.settings.allow_hpa
-        ):
-            return ResourceRecommendation.undefined(info="HPA detected")
+        undefined = self.check_data(ResourceType.CPU, len(data) > 0, total_points_count, object_data)
+        if undefined is not None:
+            return undefined
 
         cpu_usage = self.settings.calculate_cpu_proposal(data)
         return ResourceRecommendation(request=cpu_usage, limit=None)
@@ -157,32 +153,75 @@ class SimpleStrategy(BaseStrategy[SimpleStrategySettings]):
         else:
             max_oomkill_value = 0
 
-        if len(data) == 0:
-            return ResourceRecommendation.undefined(info="No data")
-
         # NOTE: metrics for each pod are returned as list[values] where values is [timestamp, value]
         # As MemoryAmountLoader returns only the last value (1 point), [0, 1] is used to get the value
         # So each pod is string with pod name, and values is numpy array of shape (N, 2)
         data_count = {pod: values[0, 1] for pod, values in history_data["MemoryAmountLoader"].items()}
         total_points_count = sum(data_count.values())
 
-        if total_points_count < self.settings.points_required:
-            return ResourceRecommendation.undefined(info="Not enough data")
-
-        if (
-            object_data.hpa is not None
-            and object_data.hpa.target_memory_utilization_percentage is not None
-            and not self.settings.allow_hpa
-        ):
-            return ResourceRecommendation.undefined(info="HPA detected")
+        undefined = self.check_data(ResourceType.Memory, len(data) > 0, total_points_count, object_data)
+        if undefined is not None:
+            return undefined
 
         memory_usage = self.settings.calculate_memory_proposal(data, max_oomkill_value)
         return ResourceRecommendation(
             request=memory_usage, limit=memory_usage, info="OOMKill detected" if oomkill_detected else None
         )
 
+    def __calculate_cpu_proposals(
+        self, history_data: BatchMetricsData, objects_data: Sequence[K8sObjectData]
+    ) -> list[ResourceRecommendation]:
+        data = history_data["PercentileCPULoader"]
+        # NOTE: CPUAmountLoader returns a single point for each pod, so the sum is the total points count
+        points_counts = history_data["CPUAmountLoader"].sum()
+        cpu_usages = self.settings.calculate_cpu_proposals(data)
+
+        return self.check_batch_data(
+            ResourceType.CPU,
+            data,
+            points_counts,
+            objects_data,
+            (ResourceRecommendation(request=cpu_usage, limit=None) for cpu_usage in cpu_usages),
+        )
+
+    def __calculate_memory_proposals(
+        self, history_data: BatchMetricsData, objects_data: Sequence[K8sObjectData]
+    ) -> list[ResourceRecommendation]:
+        data = history_data["MaxMemoryLoader"]
+        # NOTE: MemoryAmountLoader returns a single point for each pod, so the sum is the total points count
+        points_counts = history_data["MemoryAmountLoader"].sum()
+
+        if self.settings.use_oomkill_data:
+            # NOTE: MaxOOMKilledMemoryLoader returns a single point for each pod too
+            max_oomkill_values = np.nan_to_num(history_data["MaxOOMKilledMemoryLoader"].max())
+        else:
+            max_oomkill_values = np.zeros(len(data))
+
+        memory_usages = self.settings.calculate_memory_proposals(data, max_oomkill_values)
+
+        return self.check_batch_data(
+            ResourceType.Memory,
+            data,
+            points_counts,
+            objects_data,
+            (
+                ResourceRecommendation(
+                    request=memory_usage, limit=memory_usage, info="OOMKill detected" if max_oomkill != 0 else None
+                )
+                for memory_usage, max_oomkill in zip(memory_usages, max_oomkill_values)
+            ),
+        )
+
     def run(self, history_data: MetricsPodData, object_data: K8sObjectData) -> RunResult:
         return {
             ResourceType.CPU: self.__calculate_cpu_proposal(history_data, object_data),
             ResourceType.Memory: self.__calculate_memory_proposal(history_data, object_data),
         }
+
+    def run_batch(self, history_data: BatchMetricsData, objects_data: Sequence[K8sObjectData]) -> list[RunResult]:
+        return self.combine_batch_proposals(
+            {
+                ResourceType.CPU: self.__calculate_cpu_proposals(history_data, objects_data),
+                ResourceType.Memory: self.__calculate_memory_proposals(history_data, objects_data),
+            }
+        )
@@ -1,14 +1,19 @@
 import textwrap
 from datetime import timedelta
+from typing import Optional, Sequence, Union
 
 import numpy as np
 import pydantic as pd
 
 from robusta_krr.core.abstract.strategies import (
     BaseStrategy,
+    BatchMetricsData,
     K8sObjectData,
     MetricsPodData,
     PodsTimeData,
+    RaggedArray,
+    Reduction,
+    SketchArray,
     ResourceRecommendation,
     ResourceType,
     RunResult,
@@ -21,7 +26,9 @@ from robusta_krr.core.integrations.prometheus.metrics import (
     CPULoader,
     PrometheusMetric,
     MaxOOMKilledMemoryLoader,
+    SketchedMetric,
 )
+from robusta_krr.utils.sketch import DDSketch
 
 
 class SimpleLimitStrategySettings(StrategySettings):
@@ -30,13 +37,6 @@ class SimpleLimitStrategySettings(StrategySettings):
     memory_buffer_percentage: float = pd.Field(
         15, gt=0, description="The percentage of added buffer to the peak memory usage for memory recommendation."
     )
-    points_required: int = pd.Field(
-        100, ge=1, description="The number of data points required to make a recommendation for a resource."
-    )
-    allow_hpa: bool = pd.Field(
-        False,
-        description="Whether to calculate recommendations even when there is an HPA scaler defined on that resource.",
-    )
     use_oomkill_data: bool = pd.Field(
         False,
         description="Whether to bump the memory when OOMKills are detected (experimental).",
@@ -44,6 +44,29 @@ class SimpleLimitStrategySettings(StrategySettings):
     oom_memory_buffer_percentage: float = pd.Field(
         25, ge=0, description="What percentage to increase the memory when there are OOMKill events."
     )
+    cpu_pushdown: bool = pd.Field(
+        False,
+        description=(
+            "Whether to compute the CPU percentiles of each pod in the metrics backend and recommend the max of them, "
+            "instead of the percentiles of the data points of all the pods. Only the percentiles are fetched."
+        ),
+    )
+    cpu_sketch_accuracy: Optional[float] = pd.Field(
+        None,
+        gt=0,
+        lt=1,
+        description=(
+            "If set, the CPU percentiles of all the pods are estimated with this relative accuracy (e.g. 0.01) "
+            "from mergeable sketches built while the data points are received, instead of keeping all of them. "
+            "Not used with cpu_pushdown."
+        ),
+    )
+
+    @property
+    def cpu_loader(self) -> type[PrometheusMetric]:
+        if self.cpu_sketch_accuracy is None:
+            return CPULoader
+        return SketchedMetric.sketch(CPULoader, self.cpu_sketch_accuracy)
 
     def calculate_memory_proposal(self, data: PodsTimeData, max_oomkill: float = 0) -> float:
         data_ = [np.max(values[:, 1]) for values in data.values()]
@@ -55,10 +78,20 @@ class SimpleLimitStrategySettings(StrategySettings):
             max_oomkill * (1 + self.oom_memory_buffer_percentage / 100),
         )
 
+    def calculate_memory_proposals(self, data: RaggedArray, max_oomkill: np.ndarray) -> np.ndarray:
+        return np.maximum(
+            data.max() * (1 + self.memory_buffer_percentage / 100),
+            max_oomkill * (1 + self.oom_memory_buffer_percentage / 100),
+        )
+
     def calculate_cpu_percentile(self, data: PodsTimeData, percentile: float) -> float:
         if len(data) == 0:
             return float("NaN")
 
+        if self.cpu_sketch_accuracy is not None:
+            # NOTE: The sketches of the pods are merged, so the data points of the pods are never concatenated
+            return DDSketch.merged(data.values()).percentile(percentile)  # type: ignore
+
         if len(data) > 1:
             data_ = np.concatenate([values[:, 1] for values in data.values()])
         else:
@@ -66,6 +99,9 @@ class SimpleLimitStrategySettings(StrategySettings):
 
         return np.percentile(data_, percentile)
 
+    def calculate_cpu_percentiles(self, data: Union[RaggedArray, SketchArray], percentile: float) -> np.ndarray:
+        return data.percentile(percentile)
+
     def history_range_enough(self, history_range: tuple[timedelta, timedelta]) -> bool:
         start, end = history_range
         return (end - start) >= timedelta(hours=3)
@@ -79,17 +115,29 @@ class SimpleLimitStrategy(BaseStrategy[SimpleLimitStrategySettings]):
     @property
     def metrics(self) -> list[type[PrometheusMetric]]:
         metrics = [
-            CPULoader,
             MaxMemoryLoader,
             CPUAmountLoader,
             MemoryAmountLoader,
         ]
 
+        if not self.settings.cpu_pushdown:
+            metrics.insert(0, self.settings.cpu_loader)
+
         if self.settings.use_oomkill_data:
             metrics.append(MaxOOMKilledMemoryLoader)
 
         return metrics
 
+    @property
+    def reductions(self) -> dict[str, Reduction]:
+        if not self.settings.cpu_pushdown:
+            return {}
+
+        return {
+            "CPURequestPercentile": Reduction(CPULoader, "percentile", self.settings.cpu_request),
+            "CPULimitPercentile": Reduction(CPULoader, "percentile", self.settings.cpu_limit),
+        }
+
     @property
     def description(self):
         s = textwrap.dedent(f"""\
@@ -114,10 +162,10 @@ class SimpleLimitStrategy(BaseStrategy[SimpleLimitStrategySettings]):
     def __calculate_cpu_proposal(
         self, history_data: MetricsPodData, object_data: K8sObjectData
     ) -> ResourceRecommendation:
-        data = history_data["CPULoader"]
+        if self.settings.cpu_pushdown:
+            return self.__calculate_pushed_down_cpu_proposal(history_data, object_data)
 
-        if len(data) == 0:
-            return ResourceRecommendation.undefined(info="No data")
+        data = history_data[self.settings.cpu_loader.__name__]
 
         # NOTE: metrics for each pod are returned as list[values] where values is [timestamp, value]
         # As CPUAmountLoader returns only the last value (1 point), [0, 1] is used to get the value
@@ -125,20 +173,28 @@ class SimpleLimitStrategy(BaseStrategy[SimpleLimitStrategySettings]):
         data_count = {pod: values[0, 1] for pod, values in history_data["CPUAmountLoader"].items()}
         total_points_count = sum(data_count.values())
 
-        if total_points_count < self.settings.points_required:
-            return ResourceRecommendation.undefined(info="Not enough data")
-
-        if (
-            object_data.hpa is not None
-            and object_data.hpa.target_cpu_utilization_percentage is not None
-            and not self.settings.allow_hpa
-        ):
-            return ResourceRecommendation.undefined(info="HPA detected")
+        undefined = self.check_data(ResourceType.CPU, len(data) > 0, total_points_count, object_data)
+        if undefined is not None:
+            return undefined
 
         cpu_request = self.settings.calculate_cpu_percentile(data, self.settings.cpu_request)
         cpu_limit = self.settings.calculate_cpu_percentile(data, self.settings.cpu_limit)
         return ResourceRecommendation(request=cpu_request, limit=cpu_limit)
 
+    def __calculate_pushed_down_cpu_proposal(
+        self, history_data: MetricsPodData, object_data: K8sObjectData
+    ) -> ResourceRecommendation:
+        # NOTE: The percentiles of each pod are returned as a single point, so [0, 1] is used to get them
+        cpu_requests = [values[0, 1] for values in history_data["CPURequestPercentile"].values()]
+        cpu_limits = [values[0, 1] for values in history_data["CPULimitPercentile"].values()]
+        total_points_count = sum(values[0, 1] for values in history_data["CPUAmountLoader"].values())
+
+        undefined = self.check_data(ResourceType.CPU, len(cpu_requests) > 0, total_points_count, object_data)
+        if undefined is not None:
+            return undefined
+
+        return ResourceRecommendation(request=np.max(cpu_requests), limit=np.max(cpu_limits))
+
     def __calculate_memory_proposal(
         self, history_data: MetricsPodData, object_data: K8sObjectData
     ) -> ResourceRecommendation:
@@ -159,32 +215,84 @@ class SimpleLimitStrategy(BaseStrategy[SimpleLimitStrategySettings]):
         else:
             max_oomkill_value = 0
 
-        if len(data) == 0:
-            return ResourceRecommendation.undefined(info="No data")
-
         # NOTE: metrics for each pod are returned as list[values] where values is [timestamp, value]
         # As MemoryAmountLoader returns only the last value (1 point), [0, 1] is used to get the value
         # So each pod is string with pod name, and values is numpy array of shape (N, 2)
         data_count = {pod: values[0, 1] for pod, values in history_data["MemoryAmountLoader"].items()}
         total_points_count = sum(data_count.values())
 
-        if total_points_count < self.settings.points_required:
-            return ResourceRecommendation.undefined(info="Not enough data")
-
-        if (
-            object_data.hpa is not None
-            and object_data.hpa.target_memory_utilization_percentage is not None
-            and not self.settings.allow_hpa
-        ):
-            return ResourceRecommendation.undefined(info="HPA detected")
+        undefined = self.check_data(ResourceType.Memory, len(data) > 0, total_points_count, object_data)
+        if undefined is not None:
+            return undefined
 
         memory_usage = self.settings.calculate_memory_proposal(data, max_oomkill_value)
         return ResourceRecommendation(
             request=memory_usage, limit=memory_usage, info="OOMKill detected" if oomkill_detected else None
         )
 
+    def __calculate_cpu_proposals(
+        self, history_data: BatchMetricsData, objects_data: Sequence[K8sObjectData]
+    ) -> list[ResourceRecommendation]:
+        # NOTE: CPUAmountLoader returns a single point for each pod, so the sum is the total points count
+        points_counts = history_data["CPUAmountLoader"].sum()
+        if self.settings.cpu_pushdown:
+            data = history_data["CPURequestPercentile"]
+            cpu_requests = data.max()
+            cpu_limits = history_data["CPULimitPercentile"].max()
+        else:
+            data = history_data[self.settings.cpu_loader.__name__]
+            cpu_requests = self.settings.calculate_cpu_percentiles(data, self.settings.cpu_request)
+            cpu_limits = self.settings.calculate_cpu_percentiles(data, self.settings.cpu_limit)
+
+        return self.check_batch_data(
+            ResourceType.CPU,
+            data,
+            points_counts,
+            objects_data,
+            (
+                ResourceRecommendation(request=cpu_request, limit=cpu_limit)
+                for cpu_request, cpu_limit in zip(cpu_requests, cpu_limits)
+            ),
+        )
+
+    def __calculate_memory_proposals(
+        self, history_data: BatchMetricsData, objects_data: Sequence[K8sObjectData]
+    ) -> list[ResourceRecommendation]:
+        data = history_data["MaxMemoryLoader"]
+        # NOTE: MemoryAmountLoader returns a single point for each pod, so the sum is the total points count
+        points_counts = history_data["MemoryAmountLoader"].sum()
+
+        if self.settings.use_oomkill_data:
+            # NOTE: MaxOOMKilledMemoryLoader returns a single point for each pod too
+            max_oomkill_values = np.nan_to_num(history_data["MaxOOMKilledMemoryLoader"].max())
+        else:
+            max_oomkill_values = np.zeros(len(data))
+
+        memory_usages = self.settings.calculate_memory_proposals(data, max_oomkill_values)
+
+        return self.check_batch_data(
+            ResourceType.Memory,
+            data,
+            points_counts,
+            objects_data,
+            (
+                ResourceRecommendation(
+                    request=memory_usage, limit=memory_usage, info="OOMKill detected" if max_oomkill != 0 else None
+                )
+                for memory_usage, max_oomkill in zip(memory_usages, max_oomkill_values)
+            ),
+        )
+
     def run(self, history_data: MetricsPodData, object_data: K8sObjectData) -> RunResult:
         return {
             ResourceType.CPU: self.__calculate_cpu_proposal(history_data, object_data),
             ResourceType.Memory: self.__calculate_memory_proposal(history_data, object_data),
         }
+
+    def run_batch(self, history_data: BatchMetricsData, objects_data: Sequence[K8sObjectData]) -> list[RunResult]:
+        return self.combine_batch_proposals(
+            {
+                ResourceType.CPU: self.__calculate_cpu_proposals(history_data, objects_data),
+                ResourceType.Memory: self.__calculate_memory_proposals(history_data, objects_data),
+            }
+        )
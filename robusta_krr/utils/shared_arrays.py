@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Iterator, TypeVar
+
+import numpy as np
+
+from robusta_krr.core.abstract.strategies import RaggedArray, SteppedSeries
+
+_T = TypeVar("_T")
+
+# The offset of each of the arrays in the block is aligned, so that the views of the arrays are aligned too
+ALIGNMENT = 64
+
+
+@dataclass(frozen=True)
+class SharedArray:
+    """A reference to an array within a shared memory block, replacing the array in the pickled template."""
+
+    offset: int
+    shape: tuple[int, ...]
+    dtype: str
+
+
+class SharedArrays:
+    """
+    Copies all the numpy arrays of a structure (nested dicts, lists, `RaggedArray`s and `SteppedSeries`, e.g.
+    `MetricsPodData`) into a single shared memory block, so that it can be sent to another process without pickling
+    the arrays.
+
+    Only the `template` (the structure, with the arrays replaced by `SharedArray` references) and the `name`
+    of the block are sent, and the structure is then rebuilt from the block by `attach`, with views of the arrays.
+    The block is owned by the creating process: it should be closed (and so released) once the other process is done.
+    """
+
+    def __init__(self, data: Any) -> None:
+        arrays: list[tuple[int, np.ndarray]] = []
+        size = 0
+
+        def share(array: np.ndarray) -> SharedArray:
+            nonlocal size
+            arrays.append((size, np.ascontiguousarray(array)))
+            reference = SharedArray(size, array.shape, array.dtype.str)
+            size += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+            return reference
+
+        self.template = _map_arrays(data, np.ndarray, share)
+
+        # NOTE: A shared memory block can not be empty
+        self._memory = SharedMemory(create=True, size=max(size, 1))
+        for offset, array in arrays:
+            np.ndarray(array.shape, dtype=array.dtype, buffer=self._memory.buf, offset=offset)[...] = array
+
+    @property
+    def name(self) -> str:
+        return self._memory.name
+
+    def close(self) -> None:
+        self._memory.close()
+        self._memory.unlink()
+
+    def __enter__(self) -> SharedArrays:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+def _map_arrays(data: Any, kind: type, function: Callable[[Any], Any]) -> Any:
+    """Applies the function to all the items of the kind within the structure, keeping the rest of it."""
+
+    if isinstance(data, kind):
+        return function(data)
+    if isinstance(data, RaggedArray):
+        return RaggedArray(_map_arrays(data.values, kind, function), _map_arrays(data.offsets, kind, function))
+    if isinstance(data, SteppedSeries):
+        return SteppedSeries(data.start, data.step, _map_arrays(data.values, kind, function))
+    if isinstance(data, dict):
+        return {key: _map_arrays(value, kind, function) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_map_arrays(value, kind, function) for value in data]
+    return data
+
+
+@contextmanager
+def attach(name: str, template: Any) -> Iterator[Any]:
+    """Rebuilds the structure from a block created by `SharedArrays`, with views of the arrays in the block."""
+
+    memory = SharedMemory(name=name)
+    try:
+
+        def view(array: SharedArray) -> np.ndarray:
+            return np.ndarray(array.shape, dtype=np.dtype(array.dtype), buffer=memory.buf, offset=array.offset)
+
+        yield _map_arrays(template, SharedArray, view)
+    finally:
+        try:
+            memory.close()
+        except BufferError:
+            # NOTE: Some of the views are still referenced (e.g. kept by the function), the block is then
+            # released when they are garbage collected
+            pass
+
+
+def run_shared(function: Callable[..., _T], name: str, template: Any, *args: Any) -> _T:
+    """
+    Calls `function(data, *args)`, with the data rebuilt from a shared memory block.
+    It is meant to be called in a worker process, e.g. `executor.submit(run_shared, strategy.run, ...)`.
+    """
+
+    with attach(name, template) as data:
+        try:
+            return function(data, *args)
+        finally:
+            # NOTE: The views have to be released before the block is closed
+            del data
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import math
+from typing import Iterable
+
+import numpy as np
+
+
+class DDSketch:
+    """
+    A mergeable quantile sketch of non-negative values (DDSketch), with a bounded relative error.
+
+    The values are counted in logarithmic buckets, so that any value of a bucket is within `relative_accuracy`
+    of the bucket's representative value. Sketches of the same accuracy are merged by adding up the bucket counts,
+    so a sketch can be built per pod (or per chunk of a pod's samples) and then merged per workload.
+
+    The memory does not depend on the number of values: at most `max_buckets` buckets are kept,
+    collapsing the lowest ones when there are more (which only affects the accuracy of the lowest quantiles).
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048) -> None:
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("The relative accuracy should be between 0 and 1")
+
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+
+        self.keys = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.zero_count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    @classmethod
+    def from_values(cls, values: np.ndarray, relative_accuracy: float = 0.01) -> DDSketch:
+        sketch = cls(relative_accuracy)
+        sketch.add(values)
+        return sketch
+
+    @classmethod
+    def merged(cls, sketches: Iterable[DDSketch], relative_accuracy: float = 0.01) -> DDSketch:
+        """Merges the sketches (e.g. of the pods of a workload, or of the time shards of a series) into a new one."""
+
+        sketches = list(sketches)
+        sketch = cls(sketches[0].relative_accuracy if sketches else relative_accuracy)
+        for other in sketches:
+            sketch.merge(other)
+        return sketch
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + int(self.counts.sum())
+
+    def key(self, values: np.ndarray) -> np.ndarray:
+        """The keys of the buckets of positive values."""
+
+        return np.ceil(np.log(values) / self._log_gamma).astype(np.int64)
+
+    def value(self, keys: np.ndarray) -> np.ndarray:
+        """The representative values of the buckets, within the relative accuracy of all their values."""
+
+        return 2 * np.power(self.gamma, keys.astype(np.float64)) / (self.gamma + 1)
+
+    def round(self, values: np.ndarray) -> np.ndarray:
+        """Rounds the values to the representative values of their buckets, as they would be returned by `quantile`."""
+
+        values = np.asarray(values, dtype=np.float64)
+        positive = values > 0
+        result = np.where(np.isnan(values), np.nan, 0.0)
+        result[positive] = self.value(self.key(values[positive]))
+        return result
+
+    def add(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        positive = values[values > 0]
+        self.zero_count += len(values) - len(positive)
+        keys, counts = np.unique(self.key(positive), return_counts=True)
+        self._add_buckets(keys, counts)
+
+    def merge(self, other: DDSketch) -> None:
+        if other.gamma != self.gamma:
+            raise ValueError("Only sketches of the same relative accuracy can be merged")
+
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.zero_count += other.zero_count
+        self._add_buckets(other.keys, other.counts)
+
+    def _add_buckets(self, keys: np.ndarray, counts: np.ndarray) -> None:
+        keys, inverse = np.unique(np.concatenate([self.keys, keys]), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate([self.counts, counts]), minlength=len(keys))
+
+        if len(keys) > self.max_buckets:
+            # NOTE: The lowest buckets are collapsed into the lowest kept one
+            collapsed = len(keys) - self.max_buckets + 1
+            counts = np.concatenate([[counts[:collapsed].sum()], counts[collapsed:]])
+            keys = keys[collapsed - 1 :]
+
+        self.keys = keys
+        self.counts = counts.astype(np.int64)
+
+    def quantile(self, quantile: float) -> float:
+        """
+        Estimates the quantile (between 0 and 1) of the values: the value at the `quantile * (count - 1)` rank,
+        within the relative accuracy (like `np.quantile(values, quantile, method="lower")`). NaN if the sketch is empty.
+        """
+
+        count = self.count
+        if count == 0:
+            return float("NaN")
+
+        rank = math.floor(quantile * (count - 1))
+        if rank < self.zero_count:
+            return 0.0
+
+        index = int(np.searchsorted(np.cumsum(self.counts), rank - self.zero_count, side="right"))
+        return float(np.clip(self.value(self.keys[index]), self.min, self.max))
+
+    def percentile(self, percentile: float) -> float:
+        return self.quantile(percentile / 100)
@@ -1,5 +1,6 @@
 import random
 from datetime import datetime, timedelta
+from typing import Optional, Union
 from unittest.mock import AsyncMock, patch
 
 import numpy as np
@@ -26,6 +27,33 @@ TEST_OBJECT = K8sObjectData(
 )
 
 
+
+def make_object(
+    name: str = "app",
+    *,
+    container: str = "main",
+    kind: str = "Deployment",
+    cluster: Optional[str] = "mock-cluster",
+    pods: Union[int, list[str]] = 0,
+    deleted: bool = False,
+) -> K8sObjectData:
+    """
+    Makes a container of a workload without allocations, for the tests.
+    The pods are given either by their names, or by their number (named `<name>-<i>`).
+    """
+
+    pod_names = [f"{name}-{i}" for i in range(pods)] if isinstance(pods, int) else pods
+    return K8sObjectData(
+        cluster=cluster,
+        name=name,
+        container=container,
+        pods=[PodData(name=pod, deleted=deleted) for pod in pod_names],
+        namespace="default",
+        kind=kind,
+        allocations=ResourceAllocations(requests={}, limits={}),  # type: ignore
+    )
+
+
 @pytest.fixture(autouse=True, scope="session")
 def mock_list_clusters():
     with patch(
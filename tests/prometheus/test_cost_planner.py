@@ -0,0 +1,96 @@
+import datetime
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from robusta_krr.core.abstract.strategies import Reduction
+from robusta_krr.core.integrations.prometheus.cost_planner import QueryCostPlanner
+from robusta_krr.core.integrations.prometheus.metrics import CPULoader
+from robusta_krr.core.integrations.prometheus.reductions import ReductionPlan
+
+from conftest import make_object
+
+HISTORY = datetime.timedelta(days=14)
+STEP = datetime.timedelta(minutes=1)
+PERCENTILE = Reduction(CPULoader, "percentile", 95)
+
+
+def test_small_and_large_workloads_get_different_plans():
+    planner = QueryCostPlanner(max_samples=50_000_000, max_range_points=11000)
+
+    # NOTE: The range query of 14 days is split into 2 shards, which costs more than the subquery of a single pod,
+    # while the subquery reads twice as many raw samples as the points transferred by the range query
+    assert planner.choose(PERCENTILE, [make_object(pods=1)], HISTORY, STEP)
+    assert not planner.choose(PERCENTILE, [make_object(pods=50)], HISTORY, STEP)
+
+    small, large = planner.choices
+    assert small.pods == 1 and small.points == 20160
+    assert small.pushdown_cost < small.client_cost and large.pushdown_cost > large.client_cost
+
+
+def test_the_break_even_depends_on_the_backend():
+    # NOTE: e.g. Thanos, which query frontend splits and caches the range queries by day, but not the subqueries
+    planner = QueryCostPlanner(subquery_cost=2.0, range_shard_duration=datetime.timedelta(days=1))
+
+    assert planner.choose(PERCENTILE, [make_object(pods=10)], HISTORY, STEP)
+    assert not planner.choose(PERCENTILE, [make_object(pods=30)], HISTORY, STEP)
+    # a single shard costs as much as the subquery, so only the transferred points and the raw samples differ
+    assert not planner.choose(PERCENTILE, [make_object(pods=1)], datetime.timedelta(hours=6), STEP)
+
+
+def test_subqueries_loading_too_many_samples_are_not_chosen():
+    planner = QueryCostPlanner(max_samples=50_000_000, subquery_cost=0.1)
+
+    # NOTE: e.g. a workload with a lot of pod churn
+    assert not planner.choose(PERCENTILE, [make_object(pods=2000)], HISTORY, STEP)
+    assert planner.choices[0].reason == "the subquery would load too many samples"
+    assert planner.choices[0].pushdown_cost < planner.choices[0].client_cost
+
+
+def test_exported_samples_are_weighted_by_the_scrape_interval():
+    # NOTE: A single export transfers the raw samples, which the subquery would read anyway
+    assert not QueryCostPlanner(export=True).choose(PERCENTILE, [make_object(pods=10)], HISTORY, STEP)
+    assert QueryCostPlanner(export=True, transfer_cost=2.0).choose(PERCENTILE, [make_object(pods=10)], HISTORY, STEP)
+
+
+def test_calibration_from_the_tsdb_status():
+    planner = QueryCostPlanner(max_samples=50_000_000, max_range_points=11000)
+    objects = [make_object(pods=2)]
+    assert planner.choose(PERCENTILE, objects, HISTORY, STEP)
+
+    planner.calibrate(
+        {
+            "seriesCountByMetricName": [{"name": "container_cpu_usage_seconds_total", "value": 4000}],
+            "labelValueCountByLabelName": [{"name": "pod", "value": 1000}],
+        }
+    )
+
+    assert planner.get_series_per_pod(CPULoader) == 4
+    assert not planner.choose(PERCENTILE, objects, HISTORY, STEP)
+
+
+def test_the_choices_are_saved_and_used_by_the_reduction_plan(tmp_path):
+    planner = QueryCostPlanner(max_samples=50_000_000, max_range_points=11000)
+    strategy = MagicMock(metrics=[], reductions={"small": PERCENTILE})
+    objects = [make_object(pods=1), make_object(container="sidecar", pods=1)]
+
+    plan = ReductionPlan(
+        strategy, pushdown=True, choose=lambda reduction: planner.choose(reduction, objects, HISTORY, STEP)
+    )
+    planner.save(str(tmp_path / "plans.jsonl"))
+
+    assert plan.is_pushed_down("small")
+    [line] = (tmp_path / "plans.jsonl").read_text().splitlines()
+    assert json.loads(line)["pods"] == 1
+    assert json.loads(line)["metric"] == "CPULoader"
+
+
+@pytest.mark.parametrize("pushdown", [True, False])
+def test_the_planner_is_not_consulted_when_the_pushdown_is_disabled(pushdown: bool):
+    choose = MagicMock(return_value=False)
+
+    plan = ReductionPlan(MagicMock(metrics=[], reductions={"p": PERCENTILE}), pushdown=pushdown, choose=choose)
+
+    assert choose.call_count == (1 if pushdown else 0)
+    assert not plan.is_pushed_down("p")
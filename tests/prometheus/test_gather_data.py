@@ -0,0 +1,139 @@
+import asyncio
+import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from robusta_krr.core.integrations.prometheus.loader import PrometheusMetricsLoader
+from robusta_krr.core.integrations.prometheus.metrics import CPUAmountLoader, CPULoader, MaxMemoryLoader, MemoryAmountLoader
+
+from conftest import make_object
+
+TEST_OBJECT = make_object("mock-object-1", container="mock-container-1")
+
+# NOTE: gather_data is mocked for the whole session in conftest, so keep a reference to the real one
+gather_data = PrometheusMetricsLoader.gather_data
+
+
+def make_loader(gather_metric) -> PrometheusMetricsLoader:
+    loader = PrometheusMetricsLoader.__new__(PrometheusMetricsLoader)
+    loader.loader = MagicMock(gather_data=gather_metric)
+    loader._prefetched_data = {}
+    return loader
+
+
+def gather(loader: PrometheusMetricsLoader, metrics: list) -> dict:
+    return asyncio.run(
+        gather_data(loader, TEST_OBJECT, MagicMock(metrics=metrics), datetime.timedelta(days=1))
+    )
+
+
+@pytest.fixture(autouse=True)
+def fanout():
+    with patch("robusta_krr.core.integrations.prometheus.loader.settings", metrics_fanout=2, fuse_queries=False):
+        yield
+
+
+def test_metrics_are_gathered_concurrently_up_to_the_fanout():
+    running = 0
+    max_running = 0
+
+    async def gather_metric(object, LoaderClass, period, step):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return {"pod": LoaderClass.__name__}
+
+    result = gather(make_loader(gather_metric), [CPUAmountLoader, MaxMemoryLoader, MemoryAmountLoader])
+
+    assert max_running == 2
+    assert result == {name: {"pod": name} for name in ["CPUAmountLoader", "MaxMemoryLoader", "MemoryAmountLoader"]}
+
+
+def test_other_metrics_are_cancelled_on_failure():
+    cancelled = []
+
+    async def gather_metric(object, LoaderClass, period, step):
+        if LoaderClass is CPUAmountLoader:
+            raise RuntimeError("boom")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(LoaderClass)
+            raise
+
+    with pytest.raises(RuntimeError):
+        gather(make_loader(gather_metric), [CPUAmountLoader, MaxMemoryLoader, MemoryAmountLoader])
+
+    assert MaxMemoryLoader in cancelled
+    assert CPUAmountLoader not in cancelled
+
+
+def test_fusable_metrics_are_gathered_with_a_single_query():
+    fused = []
+
+    async def gather_metric(object, LoaderClass, period, step):
+        return {"pod": LoaderClass.__name__}
+
+    async def gather_fused_metrics(object, LoaderClasses, period, step):
+        fused.append(LoaderClasses)
+        return {LoaderClass.__name__: {"fused": LoaderClass.__name__} for LoaderClass in LoaderClasses}
+
+    loader = make_loader(gather_metric)
+    loader.loader.gather_fused_data = gather_fused_metrics
+
+    with patch("robusta_krr.core.integrations.prometheus.loader.settings", metrics_fanout=2, fuse_queries=True):
+        result = gather(loader, [CPUAmountLoader, CPULoader, MaxMemoryLoader])
+
+    assert fused == [[CPUAmountLoader, MaxMemoryLoader]]
+    assert list(result) == ["CPUAmountLoader", "CPULoader", "MaxMemoryLoader"]
+    assert result["CPULoader"] == {"pod": "CPULoader"}
+    assert result["MaxMemoryLoader"] == {"fused": "MaxMemoryLoader"}
+
+
+def test_bulk_prefetch_is_bounded_by_the_fanout_and_falls_back_per_namespace():
+    running = 0
+    max_running = 0
+
+    async def gather_namespace_data(namespace, objects, LoaderClass, period, step):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if namespace == "broken" and LoaderClass is MaxMemoryLoader:
+            raise RuntimeError("boom")
+        return {object: {"pod": LoaderClass.__name__} for object in objects}
+
+    loader = make_loader(None)
+    loader.loader.gather_namespace_data = gather_namespace_data
+    objects = [
+        make_object(name, pods=1).copy(update={"namespace": namespace})
+        for name, namespace in [("app", "default"), ("worker", "default"), ("app", "broken"), ("app", "other")]
+    ]
+    metrics = [CPUAmountLoader, MaxMemoryLoader, MemoryAmountLoader]
+
+    asyncio.run(loader.prefetch_bulk_data(objects, MagicMock(metrics=metrics), datetime.timedelta(days=1)))
+
+    assert max_running == 2
+    # NOTE: The objects which were not prefetched are gathered one by one by gather_data instead
+    assert set(loader._prefetched_data) == {objects[0], objects[1], objects[3]}
+    assert loader._prefetched_data[objects[0]] == {metric.__name__: {"pod": metric.__name__} for metric in metrics}
+
+
+def test_failed_workload_prefetch_falls_back_to_the_containers():
+    async def gather_workload_data(objects, LoaderClass, period, step):
+        if LoaderClass is MaxMemoryLoader:
+            raise RuntimeError("boom")
+        return {object: {"pod": LoaderClass.__name__} for object in objects}
+
+    loader = make_loader(None)
+    loader.loader.gather_workload_data = gather_workload_data
+    objects = [make_object(pods=1), make_object(container="sidecar", pods=1)]
+    strategy = MagicMock(metrics=[CPUAmountLoader, MaxMemoryLoader])
+
+    asyncio.run(loader.prefetch_workload_data(objects, strategy, datetime.timedelta(days=1)))
+
+    assert loader._prefetched_data == {}
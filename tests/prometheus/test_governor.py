@@ -0,0 +1,63 @@
+import asyncio
+
+from robusta_krr.core.integrations.prometheus.governor import ConcurrencyGovernor
+
+
+def test_aimd_limit():
+    governor = ConcurrencyGovernor("prometheus", max_limit=8, initial_limit=2)
+
+    for _ in range(100):
+        governor.on_success(0.1)
+    assert governor.limit == 8
+
+    governor.on_error()
+    assert governor.limit == 4
+    # queries that were in flight with the old limit do not decrease it again
+    governor.on_error()
+    assert governor.limit == 4
+
+    governor.on_success(0.1)
+    assert 4 < governor.limit < 5
+
+
+def test_growing_latency_decreases_the_limit():
+    governor = ConcurrencyGovernor("prometheus", max_limit=8, initial_limit=8)
+
+    for _ in range(20):
+        governor.on_success(0.01)
+    governor.on_success(1.0)
+
+    assert governor.limit == 4
+
+
+def test_in_flight_queries_are_limited():
+    governor = ConcurrencyGovernor("prometheus", max_limit=10, initial_limit=3)
+    max_in_flight = 0
+
+    async def query() -> None:
+        nonlocal max_in_flight
+        await governor.acquire()
+        try:
+            max_in_flight = max(max_in_flight, governor.in_flight)
+            await asyncio.sleep(0.01)
+        finally:
+            governor.release()
+
+    async def main() -> None:
+        await asyncio.gather(*[query() for _ in range(20)])
+
+    asyncio.run(main())
+
+    assert max_in_flight == 3
+    assert governor.in_flight == 0
+
+
+def test_retry_budget_is_shared():
+    governor = ConcurrencyGovernor("prometheus", max_limit=10)
+
+    assert sum(governor.try_retry() for _ in range(100)) == ConcurrencyGovernor.MIN_RETRIES
+
+    for _ in range(15):
+        governor.on_success(0.1)
+    assert governor.try_retry()
+    assert not governor.try_retry()
@@ -0,0 +1,208 @@
+import asyncio
+import gzip
+import json
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from aiohttp import web
+from prometheus_api_client import PrometheusApiClientException
+from prometrix import AWSPrometheusConfig, PrometheusConfig
+
+from robusta_krr.core.integrations.prometheus.http_client import AsyncPrometheusClient
+
+
+@pytest.fixture(autouse=True)
+def max_connections():
+    with patch(
+        "robusta_krr.core.integrations.prometheus.http_client.settings",
+        prometheus_max_connections=2,
+        prometheus_timeout=1,
+    ):
+        yield
+
+
+async def run_with_server(handler, config_factory, request_factory):
+    app = web.Application()
+    app.router.add_post("/api/v1/{api}", handler)
+    app.router.add_get("/api/v1/status/{api}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    client = AsyncPrometheusClient(config_factory(f"http://127.0.0.1:{port}"))
+    try:
+        return await request_factory(client)
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+def test_query_range_is_posted_and_gzip_decoded():
+    received = {}
+
+    async def handler(request: web.Request) -> web.Response:
+        received["api"] = request.match_info["api"]
+        received["form"] = dict(await request.post())
+        received["headers"] = dict(request.headers)
+        body = gzip.compress(json.dumps({"status": "success", "data": {"result": [{"metric": {}}]}}).encode())
+        return web.Response(body=body, headers={"Content-Encoding": "gzip", "Content-Type": "application/json"})
+
+    result = asyncio.run(
+        run_with_server(
+            handler,
+            lambda url: PrometheusConfig(url=url, headers={"Authorization": "Bearer token"}),
+            lambda client: client.query_range(
+                'up{pod=~"a|b"}', datetime.fromtimestamp(1000), datetime.fromtimestamp(2000), "60s"
+            ),
+        )
+    )
+
+    assert result == {"result": [{"metric": {}}]}
+    assert received["api"] == "query_range"
+    assert received["form"] == {"query": 'up{pod=~"a|b"}', "start": "1000", "end": "2000", "step": "60s"}
+    assert received["headers"]["Authorization"] == "Bearer token"
+    assert "gzip" in received["headers"]["Accept-Encoding"]
+
+
+def test_aws_requests_are_signed():
+    received = {}
+
+    async def handler(request: web.Request) -> web.Response:
+        received["headers"] = dict(request.headers)
+        return web.json_response({"status": "success", "data": {"result": []}})
+
+    asyncio.run(
+        run_with_server(
+            handler,
+            lambda url: AWSPrometheusConfig(
+                url=url, access_key="key", secret_access_key="secret", aws_region="us-east-1"
+            ),
+            lambda client: client.query("up"),
+        )
+    )
+
+    assert received["headers"]["Authorization"].startswith("AWS4-HMAC-SHA256 Credential=key/")
+    assert "X-Amz-Date" in received["headers"]
+
+
+def test_get_passes_the_parameters_in_the_url():
+    received = {}
+
+    async def handler(request: web.Request) -> web.Response:
+        received["method"] = request.method
+        received["query"] = dict(request.query)
+        return web.json_response({"status": "success", "data": {"seriesCountByMetricName": []}})
+
+    result = asyncio.run(
+        run_with_server(
+            handler,
+            lambda url: PrometheusConfig(url=url),
+            lambda client: client.get("/api/v1/status/tsdb", {"limit": 5}),
+        )
+    )
+
+    assert result == {"seriesCountByMetricName": []}
+    assert received == {"method": "GET", "query": {"limit": "5"}}
+
+
+def test_headers_are_read_from_the_shared_config_for_each_request():
+    received = []
+
+    async def handler(request: web.Request) -> web.Response:
+        received.append(request.headers["Authorization"])
+        return web.json_response({"status": "success", "data": {"result": []}})
+
+    async def query_twice(client: AsyncPrometheusClient) -> None:
+        await client.query("up")
+        client.config.headers["Authorization"] = "Bearer refreshed"
+        await client.query("up")
+
+    config = PrometheusConfig(url="", headers={"Authorization": "Bearer token"})
+
+    def config_factory(url: str) -> PrometheusConfig:
+        config.url = url
+        return config
+
+    asyncio.run(run_with_server(handler, config_factory, query_twice))
+
+    assert received == ["Bearer token", "Bearer refreshed"]
+
+
+def test_slow_response_times_out():
+    async def handler(request: web.Request) -> web.Response:
+        await asyncio.sleep(5)
+        return web.json_response({"status": "success", "data": {"result": []}})
+
+    with patch.object(AsyncPrometheusClient, "MAX_ATTEMPTS", 1):
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(
+                run_with_server(handler, lambda url: PrometheusConfig(url=url), lambda client: client.query("up"))
+            )
+
+
+def test_error_status_raises():
+    async def handler(request: web.Request) -> web.Response:
+        return web.Response(status=422, text="bad query")
+
+    with pytest.raises(PrometheusApiClientException, match="422"):
+        asyncio.run(run_with_server(handler, lambda url: PrometheusConfig(url=url), lambda client: client.query("(")))
+
+
+def test_stream_query_range_decodes_gzip_chunks():
+    series = [{"metric": {"pod": f"app-{i}"}, "values": [[1000 + j * 60, str(j)] for j in range(100)]} for i in range(50)]
+
+    async def handler(request: web.Request) -> web.Response:
+        body = gzip.compress(json.dumps({"status": "success", "data": {"result": series}}).encode())
+        return web.Response(body=body, headers={"Content-Encoding": "gzip", "Content-Type": "application/json"})
+
+    async def collect(client: AsyncPrometheusClient) -> list:
+        stream = client.stream_query_range("up", datetime.fromtimestamp(1000), datetime.fromtimestamp(7000), "60s")
+        return [series async for series in stream]
+
+    with patch.object(AsyncPrometheusClient, "STREAM_CHUNK_SIZE", 1024):
+        result = asyncio.run(run_with_server(handler, lambda url: PrometheusConfig(url=url), collect))
+
+    assert [s["metric"]["pod"] for s in result] == [f"app-{i}" for i in range(50)]
+    assert result[-1]["values"].shape == (100, 2)
+    assert result[-1]["values"][-1].tolist() == [1000 + 99 * 60, 99]
+
+
+def test_overloaded_backend_is_retried_after_the_requested_time():
+    responses = [
+        web.Response(status=429, headers={"Retry-After": "0"}),
+        web.Response(status=503, headers={"Retry-After": "0"}),
+        web.json_response({"status": "success", "data": {"result": []}}),
+    ]
+
+    async def handler(request: web.Request) -> web.Response:
+        return responses.pop(0)
+
+    with patch.object(AsyncPrometheusClient, "_get_backoff", side_effect=AssertionError("Retry-After is ignored")):
+        result = asyncio.run(
+            run_with_server(handler, lambda url: PrometheusConfig(url=url, headers={}), lambda client: client.query("up"))
+        )
+
+    assert result == {"result": []}
+    assert responses == []
+
+
+def test_retries_stop_when_the_budget_is_spent():
+    requests = 0
+
+    async def handler(request: web.Request) -> web.Response:
+        nonlocal requests
+        requests += 1
+        return web.Response(status=502)
+
+    async def query(client: AsyncPrometheusClient) -> dict:
+        client.governor.retry_budget = 2
+        return await client.query("up")
+
+    with patch.object(AsyncPrometheusClient, "_get_backoff", return_value=0):
+        with pytest.raises(PrometheusApiClientException, match="502"):
+            asyncio.run(run_with_server(handler, lambda url: PrometheusConfig(url=url, headers={}), query))
+
+    assert requests == 3
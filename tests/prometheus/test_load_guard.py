@@ -0,0 +1,92 @@
+import asyncio
+import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+import pytest
+
+from robusta_krr.core.integrations.prometheus.load_guard import LoadGuard
+from robusta_krr.core.integrations.prometheus.loader import PrometheusMetricsLoader
+from robusta_krr.core.integrations.prometheus.metrics import MaxMemoryLoader
+
+from conftest import make_object
+
+HISTORY = datetime.timedelta(days=14)
+STEP = datetime.timedelta(minutes=15)  # 1344 points
+
+# NOTE: gather_data is mocked for the whole session in conftest, so keep a reference to the real one
+gather_data = PrometheusMetricsLoader.gather_data
+
+
+@pytest.mark.parametrize(
+    "series, pods, action, step, max_pods",
+    [
+        (100, 100, "proceed", STEP, None),
+        (250, 250, "split", STEP, 84),
+        (2000, 2000, "downgrade", STEP * 2, 125),
+        (100_000, 100_000, "skip", STEP, None),
+    ],
+)
+def test_verdicts(series: int, pods: int, action: str, step: datetime.timedelta, max_pods):
+    guard = LoadGuard(max_series=1000, max_samples=150_000)
+
+    verdict = guard.judge(series, pods, HISTORY, STEP)
+
+    assert (verdict.action, verdict.step, verdict.max_pods) == (action, step, max_pods)
+    assert verdict.samples == series * 1344
+
+
+def test_the_series_of_a_single_pod_can_not_be_split():
+    verdict = LoadGuard(max_series=10).judge(50, 1, HISTORY, STEP)
+
+    assert verdict.action == "skip"
+    assert verdict.to_error([make_object(pods=1, deleted=True)]) == {
+        "name": "LoadGuardSkipped",
+        "object": "Deployment default/app/main",
+        "containers": ["main"],
+        "series": 50,
+        "samples": 50 * 1344,
+        "step": 900.0,
+        "max_pods": None,
+    }
+
+
+def test_the_batches_of_pods_are_gathered_one_after_another_and_merged():
+    running = 0
+    batches = []
+
+    async def gather_metric(object, LoaderClass, period, step):
+        nonlocal running
+        running += 1
+        assert running == 1
+        await asyncio.sleep(0.01)
+        running -= 1
+        batches.append([pod.name for pod in object.pods])
+        return {pod.name: np.array([[0.0, 1.0]]) for pod in object.pods}
+
+    loader = PrometheusMetricsLoader.__new__(PrometheusMetricsLoader)
+    loader.loader = MagicMock(gather_data=gather_metric)
+    loader._prefetched_data = {}
+
+    with patch("robusta_krr.core.integrations.prometheus.loader.settings", metrics_fanout=5, fuse_queries=False):
+        result = asyncio.run(
+            gather_data(
+                loader, make_object(pods=5, deleted=True), MagicMock(metrics=[MaxMemoryLoader]), HISTORY, max_pods=2
+            )
+        )
+
+    assert batches == [["app-0", "app-1"], ["app-2", "app-3"], ["app-4"]]
+    assert list(result["MaxMemoryLoader"]) == [f"app-{i}" for i in range(5)]
+
+
+def test_the_load_is_not_checked_without_a_budget():
+    loader = PrometheusMetricsLoader.__new__(PrometheusMetricsLoader)
+    loader.loader = MagicMock(count_series=AsyncMock(return_value=20_000))
+    loader.load_guard = None
+
+    assert asyncio.run(loader.check_load([make_object(pods=10, deleted=True)], HISTORY, STEP)) is None
+
+    loader.load_guard = LoadGuard(max_series=1000)
+    verdict = asyncio.run(loader.check_load([make_object(pods=10, deleted=True)], HISTORY, STEP))
+    assert verdict.action == "skip"
+    loader.loader.count_series.assert_awaited_once()
@@ -0,0 +1,152 @@
+import asyncio
+import datetime
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from robusta_krr.api.models import K8sObjectData
+from robusta_krr.core.integrations.prometheus.metrics import CPULoader, PercentileCPULoader
+from robusta_krr.core.integrations.prometheus.metrics.base import PrometheusMetricData
+from robusta_krr.core.integrations.prometheus.metrics_cache import CacheEntry, MetricsCache
+
+from conftest import make_object
+
+STEP = datetime.timedelta(minutes=1)
+PERIOD = datetime.timedelta(minutes=10)
+BASE = 1_700_000_040.0  # aligned to the step
+
+
+def time_range(end: float, period: datetime.timedelta = PERIOD) -> tuple[datetime.datetime, datetime.datetime]:
+    return (
+        datetime.datetime.fromtimestamp(end - period.total_seconds(), tz=datetime.timezone.utc),
+        datetime.datetime.fromtimestamp(end, tz=datetime.timezone.utc),
+    )
+
+
+class FakePrometheus:
+    """Returns a sample per step for every pod in the query, recording the queried windows."""
+
+    def __init__(self) -> None:
+        self.queries: list[PrometheusMetricData] = []
+
+    async def __call__(self, data: PrometheusMetricData) -> list[dict]:
+        self.queries.append(data)
+        pods = data.query.split('pod=~"')[1].split('"')[0].split("|")
+        timestamps = np.arange(data.start_time.timestamp(), data.end_time.timestamp() + 1, STEP.total_seconds())
+        return [
+            {"metric": {"pod": pod, "container": "main"}, "values": [[ts, "1"] for ts in timestamps]} for pod in pods
+        ]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = MetricsCache(tmp_path, ttl=60 * 60, max_size=1024**2)
+    yield cache
+    cache.close()
+
+
+@pytest.fixture(autouse=True)
+def no_cluster_label():
+    with patch(
+        "robusta_krr.core.integrations.prometheus.metrics.base.PrometheusMetric.get_prometheus_cluster_label",
+        return_value="",
+    ):
+        yield
+
+
+def load(loader: CPULoader, object: K8sObjectData, end: float, period: datetime.timedelta = PERIOD):
+    with patch.object(loader, "_get_time_range", return_value=time_range(end, period)):
+        return asyncio.run(loader.load_data(object, period, STEP))
+
+
+def test_rerun_fetches_only_the_tail(cache):
+    prometheus = FakePrometheus()
+    loader = CPULoader(prometheus=None, service_name="Prometheus", cache=cache)  # type: ignore
+
+    with patch.object(loader, "query_prometheus", prometheus):
+        load(loader, make_object(pods=["app-1"]), BASE)
+        second_end = BASE + 3 * STEP.total_seconds()
+        data = load(loader, make_object(pods=["app-1", "app-2"]), second_end)
+
+    first, *rerun = prometheus.queries
+    assert first.start_time.timestamp() == BASE - PERIOD.total_seconds()
+    windows = {q.query.split('pod=~"')[1].split('"')[0]: (q.start_time.timestamp(), q.end_time.timestamp()) for q in rerun}
+    # the known pod only fetches the samples after the cached window, the new pod fetches the whole window
+    assert windows == {
+        "app-1": (BASE + STEP.total_seconds(), second_end),
+        "app-2": (second_end - PERIOD.total_seconds(), second_end),
+    }
+
+    for pod in ["app-1", "app-2"]:
+        timestamps = data[pod][:, 0]
+        assert timestamps[0] == second_end - PERIOD.total_seconds()
+        assert timestamps[-1] == second_end
+        assert np.all(np.diff(timestamps) == STEP.total_seconds())
+
+
+def test_grown_period_fetches_the_head(cache):
+    prometheus = FakePrometheus()
+    loader = CPULoader(prometheus=None, service_name="Prometheus", cache=cache)  # type: ignore
+
+    with patch.object(loader, "query_prometheus", prometheus):
+        load(loader, make_object(pods=["app-1"]), BASE)
+        second_end = BASE + STEP.total_seconds()
+        data = load(loader, make_object(pods=["app-1"]), second_end, 2 * PERIOD)
+
+    _, *rerun = prometheus.queries
+    # the samples before the cached window are fetched too, instead of silently truncating the history
+    assert sorted((q.start_time.timestamp(), q.end_time.timestamp()) for q in rerun) == [
+        (second_end - 2 * PERIOD.total_seconds(), BASE - PERIOD.total_seconds() - STEP.total_seconds()),
+        (second_end, second_end),
+    ]
+
+    timestamps = data["app-1"][:, 0]
+    assert timestamps[0] == second_end - 2 * PERIOD.total_seconds()
+    assert timestamps[-1] == second_end
+    assert np.all(np.diff(timestamps) == STEP.total_seconds())
+
+
+def test_dropped_pods_and_stale_entries(cache):
+    prometheus = FakePrometheus()
+    loader = CPULoader(prometheus=None, service_name="Prometheus", cache=cache)  # type: ignore
+
+    with patch.object(loader, "query_prometheus", prometheus):
+        load(loader, make_object(pods=["app-1", "app-2"]), BASE)
+        data = load(loader, make_object(pods=["app-2"]), BASE)
+        assert list(data) == ["app-2"]
+        assert len(prometheus.queries) == 1
+
+        # the cached window is older than the new one, so everything is refetched
+        load(loader, make_object(pods=["app-2"]), BASE + 2 * PERIOD.total_seconds())
+        assert len(prometheus.queries) == 2
+        assert prometheus.queries[-1].start_time.timestamp() == BASE + PERIOD.total_seconds()
+
+
+def test_instant_queries_are_not_cached(cache):
+    prometheus = FakePrometheus()
+    loader = PercentileCPULoader(95)(prometheus=None, service_name="Prometheus", cache=cache)  # type: ignore
+
+    with patch.object(loader, "query_prometheus", prometheus):
+        load(loader, make_object(pods=["app-1"]), BASE)
+        load(loader, make_object(pods=["app-1"]), BASE)
+
+    assert len(prometheus.queries) == 2
+
+
+def test_eviction(tmp_path):
+    cache = MetricsCache(tmp_path, ttl=60 * 60, max_size=1024**2)
+    entry = CacheEntry(start=BASE - PERIOD.total_seconds(), end=BASE, pods={"app-1"}, data={"app-1": np.zeros((1000, 2))})
+    for key in ["old", "new"]:
+        asyncio.run(cache.put(key, "mock-cluster", 60, entry))
+    cache.close()
+
+    # each entry takes 16000 bytes, so only the most recently used one fits
+    cache = MetricsCache(tmp_path, ttl=60 * 60, max_size=20000)
+    assert asyncio.run(cache.get("old")) is None
+    assert asyncio.run(cache.get("new")) is not None
+    cache.close()
+
+    cache = MetricsCache(tmp_path, ttl=0, max_size=20000)
+    assert asyncio.run(cache.get("new")) is None
+    cache.close()
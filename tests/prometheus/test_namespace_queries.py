@@ -0,0 +1,154 @@
+import asyncio
+import datetime
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+import pytest
+
+from robusta_krr.core.integrations.prometheus.metrics import (
+    CPUAmountLoader,
+    CPULoader,
+    FusedMetric,
+    MaxMemoryLoader,
+    PercentileCPULoader,
+    QueryOptions,
+)
+from robusta_krr.core.integrations.prometheus.metrics.base import PrometheusMetricData
+
+from conftest import make_object
+
+
+def make_series(pod: str, container: str, job: str, value: float) -> dict:
+    return {
+        "metric": {"namespace": "default", "pod": pod, "container": container, "job": job},
+        "values": [[1700000000.0, str(value)]],
+    }
+
+
+@pytest.fixture(autouse=True)
+def no_cluster_label():
+    with patch(
+        "robusta_krr.core.integrations.prometheus.metrics.base.PrometheusMetric.get_prometheus_cluster_label",
+        return_value="",
+    ):
+        yield
+
+
+def test_supports_bulk():
+    class CustomLoader(MaxMemoryLoader):
+        def get_query(self, object, duration, step):
+            return "up"
+
+    assert MaxMemoryLoader.supports_bulk()
+    assert PercentileCPULoader(95).supports_bulk()
+    assert not CustomLoader.supports_bulk()
+
+
+def test_object_and_namespace_queries_share_the_expression():
+    loader = CPULoader(prometheus=None, service_name="Prometheus")  # type: ignore
+    object = make_object("app", pods=["app-1", "app-2"])
+
+    object_query = loader.get_query(object, "1d", "60s")
+    namespace_query = loader.build_query(loader.get_namespace_selector("default"), "1d", "60s")
+
+    assert 'pod=~"app-1|app-2"' in object_query
+    assert 'container="main"' in object_query
+    assert "pod=~" not in namespace_query
+    assert 'namespace="default"' in namespace_query
+
+
+def test_namespace_results_are_routed_to_objects():
+    app_main = make_object("app", pods=["app-1", "app-2"])
+    app_sidecar = make_object("app", container="sidecar", pods=["app-1", "app-2"])
+    worker = make_object("worker", pods=["worker-1"])
+    idle = make_object("idle", pods=["idle-1"])
+
+    loader = MaxMemoryLoader(prometheus=None, service_name="Prometheus")  # type: ignore
+    loader.query_prometheus = AsyncMock(
+        return_value=[
+            make_series("app-1", "main", "kubelet", 1),
+            make_series("app-1", "main", "cadvisor", 100),
+            make_series("app-2", "main", "kubelet", 2),
+            make_series("app-1", "sidecar", "kubelet", 3),
+            make_series("worker-1", "main", "kubelet", 4),
+            make_series("unrelated-1", "main", "kubelet", 5),
+        ]
+    )
+
+    result = asyncio.run(
+        loader.load_namespace_data(
+            "default", [app_main, app_sidecar, worker, idle], datetime.timedelta(days=1), datetime.timedelta(minutes=1)
+        )
+    )
+
+    assert loader.query_prometheus.await_count == 1
+    assert {pod: values[0, 1] for pod, values in result[app_main].items()} == {"app-1": 1, "app-2": 2}
+    assert {pod: values[0, 1] for pod, values in result[app_sidecar].items()} == {"app-1": 3}
+    assert {pod: values[0, 1] for pod, values in result[worker].items()} == {"worker-1": 4}
+    assert result[idle] == {}
+
+
+def test_long_namespace_ranges_are_sharded():
+    # The CPU usage of simple_limit: 14 days at a 1.25 minutes step are 16128 points, over the 11000 points limit
+    period, step = datetime.timedelta(days=14), datetime.timedelta(seconds=75)
+    app = make_object("app", pods=["app-1"])
+    worker = make_object("worker", pods=["worker-1"])
+
+    loader = CPULoader(  # type: ignore
+        prometheus=None, service_name="Prometheus", options=QueryOptions(max_range_points=11000)
+    )
+    shard_points = []
+
+    async def query_prometheus(data: PrometheusMetricData) -> list[dict]:
+        timestamps = np.arange(data.start_time.timestamp(), data.end_time.timestamp() + 1, step.total_seconds())
+        shard_points.append(len(timestamps))
+        return [
+            {"metric": {"pod": pod, "container": "main"}, "values": np.stack([timestamps, timestamps]).T}
+            for pod in ["app-1", "worker-1"]
+        ]
+
+    with patch.object(loader, "query_prometheus", query_prometheus):
+        result = asyncio.run(loader.load_namespace_data("default", [app, worker], period, step))
+
+    assert len(shard_points) == 2 and max(shard_points) <= 11000
+    for object, pod in [(app, "app-1"), (worker, "worker-1")]:
+        assert list(result[object]) == [pod]
+        values = result[object][pod]
+        assert len(values) == sum(shard_points) == period / step + 1
+        assert np.all(np.diff(values[:, 0]) == step.total_seconds())
+
+
+def test_fused_query_is_split_between_the_loaders():
+    FusedLoader = FusedMetric.fuse([PercentileCPULoader(95), CPUAmountLoader])
+    loader = FusedLoader(prometheus=None, service_name="Prometheus")  # type: ignore
+    object = make_object("app", pods=["app-1", "app-2"])
+
+    query = loader.get_query(object, "1d", "60s")
+    assert query.count("label_replace(") == 2
+    assert '"__krr_metric", "PercentileCPULoader"' in query
+    assert " or " in query
+
+    def fused_series(pod: str, metric: str, job: str, value: float) -> dict:
+        series = make_series(pod, "main", job, value)
+        series["metric"]["__krr_metric"] = metric
+        return series
+
+    result = [
+        fused_series("app-1", "PercentileCPULoader", "kubelet", 0.5),
+        fused_series("app-1", "PercentileCPULoader", "other", 0.7),
+        fused_series("app-2", "PercentileCPULoader", "kubelet", 0.1),
+        fused_series("app-1", "CPUAmountLoader", "kubelet", 100),
+    ]
+    with patch.object(loader, "query_prometheus", AsyncMock(return_value=result)):
+        data = asyncio.run(loader.load_fused_data(object, datetime.timedelta(days=1), datetime.timedelta(minutes=1)))
+
+    assert {pod: values[0][1] for pod, values in data["PercentileCPULoader"].items()} == {"app-1": 0.5, "app-2": 0.1}
+    assert {pod: values[0][1] for pod, values in data["CPUAmountLoader"].items()} == {"app-1": 100}
+
+
+def test_only_fusable_loaders_can_be_fused():
+    assert CPUAmountLoader.supports_fusion()
+    assert not CPULoader.supports_fusion()
+
+    with pytest.raises(ValueError):
+        FusedMetric.fuse([CPUAmountLoader, CPULoader])
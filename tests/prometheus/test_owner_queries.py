@@ -0,0 +1,68 @@
+from unittest.mock import patch
+
+import pytest
+
+from robusta_krr.core.integrations.prometheus.metrics import (
+    CPULoader,
+    FusedMetric,
+    MaxMemoryLoader,
+    PercentileCPULoader,
+    QueryOptions,
+)
+
+from conftest import make_object
+
+
+@pytest.fixture(autouse=True)
+def no_cluster_label():
+    with patch(
+        "robusta_krr.core.integrations.prometheus.metrics.base.PrometheusMetric.get_prometheus_cluster_label",
+        return_value="",
+    ):
+        yield
+
+
+@pytest.mark.parametrize("LoaderClass", [CPULoader, MaxMemoryLoader, FusedMetric.fuse([PercentileCPULoader(95)])])
+def test_query_size_does_not_depend_on_the_pods(LoaderClass):
+    loader = LoaderClass(  # type: ignore
+        prometheus=None, service_name="Prometheus", options=QueryOptions(owner_queries=True, max_query_size=1024)
+    )
+    few_pods = make_object(pods=["app-1"])
+    many_pods = make_object(pods=[f"app-{i:05d}" for i in range(1000)])
+
+    query = loader.get_query(few_pods, "14d", "1m")
+
+    assert query == loader.get_query(many_pods, "14d", "1m")
+    assert "app-1" not in query and 'namespace="default", container="main"' in query
+    assert loader.split_into_batches(many_pods, "14d", "1m") == [many_pods]
+
+
+@pytest.mark.parametrize(
+    "kind, owner_metric, pod_owner_kind",
+    [
+        ("Deployment", "kube_replicaset_owner", "ReplicaSet"),
+        ("Rollout", "kube_replicaset_owner", "ReplicaSet"),
+        ("DeploymentConfig", "kube_replicationcontroller_owner", "ReplicationController"),
+        ("CronJob", "kube_job_owner", "Job"),
+    ],
+)
+def test_pods_are_selected_through_the_owner_chain(kind: str, owner_metric: str, pod_owner_kind: str):
+    loader = MaxMemoryLoader(  # type: ignore
+        prometheus=None, service_name="Prometheus", options=QueryOptions(owner_queries=True)
+    )
+
+    query = loader.get_owner_pods_query(make_object(kind=kind, pods=["app-1"]), "14d")
+
+    assert f'kube_pod_owner{{namespace="default", owner_kind="{pod_owner_kind}"}}[14d]' in query
+    assert f'{owner_metric}{{namespace="default", owner_kind="{kind}", owner_name="app"}}[14d]' in query
+
+
+def test_directly_owned_pods_are_selected_at_each_point_of_range_queries():
+    loader = CPULoader(  # type: ignore
+        prometheus=None, service_name="Prometheus", options=QueryOptions(owner_queries=True)
+    )
+
+    query = loader.get_owner_pods_query(make_object(kind="StatefulSet", pods=["app-0"]), "14d")
+
+    assert "max_over_time" not in query
+    assert 'kube_pod_owner{namespace="default", owner_kind="StatefulSet", owner_name="app"}' in query
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from robusta_krr.api.models import PodData
+from robusta_krr.core.integrations.prometheus.ownership_index import OwnershipIndex
+
+from conftest import make_object
+
+
+def series(**labels: str) -> dict:
+    return {"metric": {"namespace": "default", **labels}, "value": [1700000000, "1"]}
+
+
+RESULTS = {
+    "kube_replicaset_owner": [
+        series(replicaset="app-1", owner_kind="Deployment", owner_name="app"),
+        series(replicaset="app-2", owner_kind="Deployment", owner_name="app"),
+        series(replicaset="other-1", owner_kind="Deployment", owner_name="other"),
+    ],
+    "kube_job_owner": [series(job_name="backup-1", owner_kind="CronJob", owner_name="backup")],
+    "kube_replicationcontroller_owner": [],
+    "kube_pod_owner": [
+        series(pod="app-1-a", owner_kind="ReplicaSet", owner_name="app-1"),
+        series(pod="app-2-a", owner_kind="ReplicaSet", owner_name="app-2"),
+        series(pod="other-1-a", owner_kind="ReplicaSet", owner_name="other-1"),
+        series(pod="backup-1-a", owner_kind="Job", owner_name="backup-1"),
+        series(pod="db-0", owner_kind="StatefulSet", owner_name="db"),
+    ],
+    "kube_pod_status_phase": [series(pod="app-2-a"), series(pod="db-0")],
+}
+
+
+@pytest.fixture
+def index() -> OwnershipIndex:
+    queries: list[str] = []
+
+    async def query(query: str) -> list[dict]:
+        queries.append(query)
+        [metric] = [metric for metric in RESULTS if metric in query]
+        return RESULTS[metric]
+
+    index = asyncio.run(OwnershipIndex.build(query, period="14d", selector='cluster="a"'))
+    # a query per owner metric, plus the pods and the running pods, for all the workloads at once
+    assert len(queries) == 5
+    assert all('cluster="a"' in query for query in queries)
+    return index
+
+
+@pytest.mark.parametrize(
+    "kind, name, pods",
+    [
+        ("Deployment", "app", {"app-1-a": True, "app-2-a": False}),
+        ("CronJob", "backup", {"backup-1-a": True}),
+        ("StatefulSet", "db", {"db-0": False}),
+        ("Deployment", "missing", {}),
+    ],
+)
+def test_pods_are_looked_up_through_the_owners(index: OwnershipIndex, kind: str, name: str, pods: dict):
+    assert sorted(index.get_pods(make_object(name, kind=kind)), key=lambda pod: pod.name) == [
+        PodData(name=pod, deleted=deleted) for pod, deleted in pods.items()
+    ]
@@ -0,0 +1,112 @@
+import asyncio
+import datetime
+from unittest.mock import patch
+from urllib.parse import urlencode
+
+import numpy as np
+import pytest
+
+from robusta_krr.core.integrations.prometheus.metrics import CPULoader, MaxOOMKilledMemoryLoader, QueryOptions
+from robusta_krr.core.integrations.prometheus.metrics.base import PrometheusMetricData
+
+from conftest import make_object
+
+
+@pytest.fixture(autouse=True)
+def no_cluster_label():
+    with patch(
+        "robusta_krr.core.integrations.prometheus.metrics.base.PrometheusMetric.get_prometheus_cluster_label",
+        return_value="",
+    ):
+        yield
+
+
+@pytest.mark.parametrize("LoaderClass", [CPULoader, MaxOOMKilledMemoryLoader])
+@pytest.mark.parametrize("name_length", [5, 60])
+def test_batches_fit_into_the_query_size(LoaderClass, name_length: int):
+    max_query_size = 4096
+    loader = LoaderClass(  # type: ignore
+        prometheus=None, service_name="Prometheus", options=QueryOptions(max_query_size=max_query_size)
+    )
+    object = make_object(pods=[f"{i:0{name_length}d}" for i in range(500)])
+
+    batches = loader.split_into_batches(object, "1d", "60s")
+
+    assert [pod for batch in batches for pod in batch.pods] == object.pods
+    sizes = [len(urlencode({"query": loader.get_query(batch, "1d", "60s")})) for batch in batches]
+    assert max(sizes) <= max_query_size
+    # every batch but the last one is packed close to the limit
+    assert min(sizes[:-1]) > max_query_size - 2 * (name_length + 3) * 2
+
+
+def test_pods_batch_size_limits_the_batches():
+    class LimitedLoader(CPULoader):
+        pods_batch_size = 3
+
+    loader = LimitedLoader(prometheus=None, service_name="Prometheus")  # type: ignore
+    batches = loader.split_into_batches(make_object(pods=[f"app-{i}" for i in range(7)]), "1d", "60s")
+
+    assert [batch.pods_count for batch in batches] == [3, 3, 1]
+
+
+def test_load_data_combines_the_batches():
+    loader = CPULoader(  # type: ignore
+        prometheus=None, service_name="Prometheus", options=QueryOptions(max_query_size=600)
+    )
+    object = make_object(pods=[f"app-{i:03d}" for i in range(100)])
+    queries: list[PrometheusMetricData] = []
+
+    async def query_prometheus(data: PrometheusMetricData) -> list[dict]:
+        queries.append(data)
+        pods = data.query.split('pod=~"')[1].split('"')[0].split("|")
+        return [{"metric": {"pod": pod}, "values": np.array([[1700000000, 1]])} for pod in pods]
+
+    with patch.object(loader, "query_prometheus", query_prometheus):
+        data = asyncio.run(loader.load_data(object, datetime.timedelta(days=1), datetime.timedelta(minutes=1)))
+
+    assert len(queries) > 1
+    assert sorted(data) == [pod.name for pod in object.pods]
+
+
+def test_long_ranges_are_split_into_step_aligned_shards():
+    step = datetime.timedelta(minutes=1)
+    loader = CPULoader(  # type: ignore
+        prometheus=None, service_name="Prometheus", options=QueryOptions(max_range_points=100)
+    )
+    end = datetime.datetime(2024, 1, 2, tzinfo=datetime.timezone.utc)
+    start = end - datetime.timedelta(minutes=249)
+
+    shards = loader.split_time_range(start, end, step)
+
+    assert [(shard_end - shard_start) / step + 1 for shard_start, shard_end in shards] == [100, 100, 50]
+    assert shards[0][0] == start and shards[-1][1] == end
+    assert all(next_start - prev_end == step for (_, prev_end), (next_start, _) in zip(shards, shards[1:]))
+
+    loader.range_shard_duration = datetime.timedelta(hours=1)
+    assert len(loader.split_time_range(start, end, step)) == 5
+
+    # instant queries are not sharded
+    instant_loader = MaxOOMKilledMemoryLoader(  # type: ignore
+        prometheus=None, service_name="Prometheus", options=QueryOptions(max_range_points=100)
+    )
+    assert len(instant_loader.split_time_range(start, end, step)) == 1
+
+
+def test_load_data_stitches_the_shards():
+    loader = CPULoader(  # type: ignore
+        prometheus=None, service_name="Prometheus", options=QueryOptions(max_range_points=60)
+    )
+    object = make_object(pods=["app-1", "app-2"])
+
+    async def query_prometheus(data: PrometheusMetricData) -> list[dict]:
+        timestamps = np.arange(data.start_time.timestamp(), data.end_time.timestamp() + 1, 60)
+        return [
+            {"metric": {"pod": pod}, "values": np.stack([timestamps, timestamps]).T} for pod in ["app-1", "app-2"]
+        ]
+
+    with patch.object(loader, "query_prometheus", query_prometheus):
+        data = asyncio.run(loader.load_data(object, datetime.timedelta(hours=3), datetime.timedelta(minutes=1)))
+
+    for values in data.values():
+        assert len(values) == 3 * 60 + 1
+        assert np.all(np.diff(values[:, 0]) == 60)
@@ -0,0 +1,89 @@
+import asyncio
+import datetime
+from unittest.mock import patch
+
+import pytest
+import yaml
+
+from robusta_krr.core.integrations.prometheus.metrics import (
+    CPUAmountLoader,
+    CPULoader,
+    MaxMemoryLoader,
+    PercentileCPULoader,
+    QueryOptions,
+)
+from robusta_krr.core.integrations.prometheus.metrics_service.prometheus_metrics_service import (
+    PrometheusMetricsService,
+)
+from robusta_krr.core.integrations.prometheus.recording_rules import (
+    CPU_USAGE_RECORD,
+    MEMORY_USAGE_RECORD,
+    generate_recording_rules,
+    render_recording_rules,
+)
+
+
+@pytest.fixture(autouse=True)
+def no_cluster_label():
+    with patch(
+        "robusta_krr.core.integrations.prometheus.metrics.base.PrometheusMetric.get_prometheus_cluster_label",
+        return_value="",
+    ):
+        yield
+
+
+def test_rules_keep_the_labels_of_the_selectors():
+    rules = generate_recording_rules(rate_interval="2m", cluster_label="cluster")
+    [group] = rules["groups"]
+
+    assert [rule["record"] for rule in group["rules"]] == [CPU_USAGE_RECORD, MEMORY_USAGE_RECORD]
+    for rule in group["rules"]:
+        assert "by (namespace, pod, container, job, cluster)" in rule["expr"]
+    assert "[2m]" in group["rules"][0]["expr"]
+
+    resource = yaml.safe_load(render_recording_rules(rules, prometheus_rule_name="krr", namespace="monitoring"))
+    assert resource["kind"] == "PrometheusRule"
+    assert resource["metadata"] == {"name": "krr", "namespace": "monitoring"}
+    assert resource["spec"] == rules
+
+
+@pytest.mark.parametrize("LoaderClass", [CPULoader, PercentileCPULoader(95), CPUAmountLoader, MaxMemoryLoader])
+def test_loaders_query_the_recorded_series(LoaderClass):
+    raw_loader = LoaderClass(prometheus=None, service_name="Prometheus")  # type: ignore
+    recorded_loader = LoaderClass(  # type: ignore
+        prometheus=None, service_name="Prometheus", options=QueryOptions(recording_rules=True)
+    )
+
+    raw_query = raw_loader.build_query('namespace="default"', "1d", "1m")
+    recorded_query = recorded_loader.build_query('namespace="default"', "1d", "1m")
+
+    assert "container_" in raw_query and "krr_" not in raw_query
+    assert "container_cpu_usage_seconds_total" not in recorded_query
+    assert "container_memory_working_set_bytes{" not in recorded_query
+    assert CPU_USAGE_RECORD in recorded_query or MEMORY_USAGE_RECORD in recorded_query
+
+
+@pytest.mark.parametrize("result, expected", [([{"value": [0, "10"]}], True), ([], False)])
+def test_recorded_series_are_detected_once(result: list, expected: bool):
+    service = PrometheusMetricsService.__new__(PrometheusMetricsService)
+    service._recorded_series = {}
+    queries: list[str] = []
+
+    async def query(query: str) -> list:
+        queries.append(query)
+        return result
+
+    service.query = query  # type: ignore
+    service.get_prometheus_cluster_label = lambda: ""  # type: ignore
+
+    async def detect() -> list[bool]:
+        return [await service.has_recorded_series(datetime.timedelta(days=14)) for _ in range(3)]
+
+    with patch(
+        "robusta_krr.core.integrations.prometheus.metrics_service.prometheus_metrics_service.settings",
+        recording_rules=True,
+    ):
+        assert asyncio.run(detect()) == [expected] * 3
+
+    assert len(queries) == 1
+    assert "offset 1209600s" in queries[0]
@@ -0,0 +1,174 @@
+import asyncio
+import datetime
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+from robusta_krr.core.abstract.strategies import (
+    WORKLOAD_REDUCTION_KEY,
+    Reduction,
+    ResourceType,
+    concatenate_metrics,
+)
+from robusta_krr.core.integrations.prometheus.loader import PrometheusMetricsLoader
+from robusta_krr.core.integrations.prometheus.metrics import (
+    CPUAmountLoader,
+    CPULoader,
+    MaxMemoryLoader,
+    PercentileCPULoader,
+    ReducedMetric,
+)
+from robusta_krr.core.integrations.prometheus.reductions import ReductionPlan
+from robusta_krr.strategies.simple_limit import SimpleLimitStrategy, SimpleLimitStrategySettings
+
+from conftest import make_object
+
+TEST_OBJECT = make_object(pods=["app-1", "app-2"])
+
+# NOTE: gather_data is mocked for the whole session in conftest, so keep a reference to the real one
+gather_data = PrometheusMetricsLoader.gather_data
+
+
+def make_pods_data(rng: np.random.Generator) -> dict:
+    return {
+        f"app-{i}": np.stack([np.arange(points, dtype=np.float64), rng.random(points)], axis=1)
+        for i, points in enumerate([50, 120])
+    }
+
+
+@pytest.fixture(autouse=True)
+def no_cluster_label():
+    with patch(
+        "robusta_krr.core.integrations.prometheus.metrics.base.PrometheusMetric.get_prometheus_cluster_label",
+        return_value="",
+    ):
+        yield
+
+
+def test_reductions_are_pushed_down_into_subqueries():
+    Loader = ReducedMetric.reduce(Reduction(CPULoader, "percentile", 95))
+    loader = Loader(prometheus=None, service_name="Prometheus")  # type: ignore
+
+    query = " ".join(loader.get_query(TEST_OBJECT, "1d", "60s").split())
+
+    assert Loader.__name__ == "CPULoader_percentile95"
+    assert Loader.supports_fusion()
+    assert query.startswith("quantile_over_time(0.95, ( max( rate( container_cpu_usage_seconds_total{")
+    assert query.endswith(")[1d:60s] )")
+    assert "max_over_time(" in ReducedMetric.reduce(Reduction(CPULoader, "max", scope="workload"))(
+        prometheus=None, service_name="Prometheus"  # type: ignore
+    ).get_query(TEST_OBJECT, "1d", "60s")
+
+
+def test_only_range_metrics_and_composable_workload_reductions_are_pushed_down():
+    assert ReducedMetric.supports_pushdown(Reduction(CPULoader, "count", scope="workload"))
+    assert not ReducedMetric.supports_pushdown(Reduction(CPULoader, "percentile", 95, scope="workload"))
+    assert not ReducedMetric.supports_pushdown(Reduction(PercentileCPULoader(95), "max"))
+    with pytest.raises(ValueError):
+        Reduction(CPULoader, "percentile")
+
+
+def test_client_side_reductions():
+    data = make_pods_data(np.random.default_rng(0))
+
+    percentiles = Reduction(CPULoader, "percentile", 66).reduce(data)
+    workload_percentile = Reduction(CPULoader, "percentile", 66, scope="workload").reduce(data)
+    workload_count = Reduction(CPULoader, "count", scope="workload")
+
+    assert {pod: values[0, 1] for pod, values in percentiles.items()} == {
+        pod: np.percentile(values[:, 1], 66) for pod, values in data.items()
+    }
+    assert workload_percentile[WORKLOAD_REDUCTION_KEY][0, 1] == np.percentile(
+        np.concatenate([values[:, 1] for values in data.values()]), 66
+    )
+    assert workload_count.reduce(data)[WORKLOAD_REDUCTION_KEY][0, 1] == 170
+    assert workload_count.combine(Reduction(CPULoader, "count").reduce(data))[WORKLOAD_REDUCTION_KEY][0, 1] == 170
+
+
+@pytest.mark.parametrize("pushdown", [True, False])
+def test_the_plan_gathers_the_pushed_down_or_the_raw_metrics(pushdown: bool):
+    rng = np.random.default_rng(0)
+    raw_data = make_pods_data(rng)
+    strategy = MagicMock(
+        metrics=[MaxMemoryLoader],
+        reductions={
+            "CPUPercentile": Reduction(CPULoader, "percentile", 90),
+            "CPUMax": Reduction(CPULoader, "max", scope="workload"),
+        },
+    )
+
+    async def gather_metric(object, LoaderClass, period, step):
+        if issubclass(LoaderClass, ReducedMetric):
+            # NOTE: The backend computes the same values as the client-side reduction
+            return LoaderClass.reduction.reduce(raw_data)
+        return raw_data
+
+    loader = PrometheusMetricsLoader.__new__(PrometheusMetricsLoader)
+    loader.loader = MagicMock(
+        gather_data=MagicMock(side_effect=gather_metric), supports_subqueries=True, cost_planner=None
+    )
+    loader._prefetched_data = {}
+
+    with patch(
+        "robusta_krr.core.integrations.prometheus.loader.settings",
+        metrics_fanout=5,
+        fuse_queries=False,
+        reduction_pushdown=pushdown,
+    ):
+        result = asyncio.run(gather_data(loader, TEST_OBJECT, strategy, datetime.timedelta(days=1)))
+
+    gathered = {call.args[1].__name__ for call in loader.loader.gather_data.call_args_list}
+    if pushdown:
+        assert gathered == {"MaxMemoryLoader", "CPULoader_percentile90", "CPULoader_max"}
+    else:
+        assert gathered == {"MaxMemoryLoader", "CPULoader"}
+
+    assert set(result) == {"MaxMemoryLoader", "CPUPercentile", "CPUMax"}
+    assert {pod: values[0, 1] for pod, values in result["CPUPercentile"].items()} == {
+        pod: np.percentile(values[:, 1], 90) for pod, values in raw_data.items()
+    }
+    assert result["CPUMax"][WORKLOAD_REDUCTION_KEY][0, 1] == max(values[:, 1].max() for values in raw_data.values())
+
+
+def test_the_plan_shares_the_raw_metric_between_the_strategy_and_the_reductions():
+    strategy = MagicMock(
+        metrics=[CPULoader, CPUAmountLoader],
+        reductions={"CPUPercentile": Reduction(CPULoader, "percentile", 90, scope="workload")},
+    )
+
+    plan = ReductionPlan(strategy, pushdown=True)
+
+    assert plan.metrics == [CPULoader, CPUAmountLoader]
+    assert not plan.is_pushed_down("CPUPercentile")
+
+
+def test_simple_limit_with_pushdown_recommends_the_max_of_the_pods_percentiles():
+    rng = np.random.default_rng(0)
+    strategy = SimpleLimitStrategy(SimpleLimitStrategySettings(cpu_pushdown=True))
+    raw_data = make_pods_data(rng)
+    history_data = {
+        **{name: reduction.reduce(raw_data) for name, reduction in strategy.reductions.items()},
+        "MaxMemoryLoader": Reduction(CPULoader, "max").reduce(raw_data),
+        "CPUAmountLoader": Reduction(CPULoader, "count").reduce(raw_data),
+        "MemoryAmountLoader": Reduction(CPULoader, "count").reduce(raw_data),
+    }
+
+    assert CPULoader not in strategy.metrics
+    result = strategy.run(history_data, TEST_OBJECT)
+    [batch_result] = strategy.run_batch(concatenate_metrics([history_data]), [TEST_OBJECT])
+
+    cpu = result[ResourceType.CPU]
+    assert cpu.request == max(np.percentile(values[:, 1], 66) for values in raw_data.values())
+    assert cpu.limit == max(np.percentile(values[:, 1], 96) for values in raw_data.values())
+    assert batch_result == result
+
+
+def test_the_loader_classes_are_created_once():
+    reduction = Reduction(CPULoader, "percentile", 95)
+    strategy = MagicMock(metrics=[], reductions={"p": reduction})
+
+    plans = [ReductionPlan(strategy, pushdown=True) for _ in range(2)]
+
+    assert plans[0].sources["p"] is plans[1].sources["p"]
+    assert plans[0].sources["p"] is ReducedMetric.reduce(Reduction(CPULoader, "percentile", 95))
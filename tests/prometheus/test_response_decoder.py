@@ -0,0 +1,84 @@
+import json
+
+import numpy as np
+import pytest
+
+from robusta_krr.core.integrations.prometheus.metrics.base import PrometheusMetric
+from robusta_krr.core.integrations.prometheus.response_decoder import SeriesStreamDecoder
+
+MATRIX_RESPONSE = {
+    "status": "success",
+    "data": {
+        "resultType": "matrix",
+        "result": [
+            {
+                "metric": {"pod": "app-1", "container": "main", "job": "kubelet", "note": 'a}"values":[{'},
+                "values": [[1700000000, "0.5"], [1700000060.5, "NaN"], [1700000120, "+Inf"]],
+            },
+            {"metric": {"pod": "app-2", "container": "main", "job": "cadvisor"}, "values": [[1700000000, "1e-05"]]},
+        ],
+    },
+}
+
+
+def decode(body: bytes, chunk_size: int) -> list[dict]:
+    decoder = SeriesStreamDecoder()
+    result = []
+    for i in range(0, len(body), chunk_size):
+        result.extend(decoder.feed(body[i : i + chunk_size]))
+    decoder.close()
+    return result
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+def test_decode_matrix(chunk_size: int):
+    result = decode(json.dumps(MATRIX_RESPONSE).encode(), chunk_size)
+
+    assert [series["metric"] for series in result] == [series["metric"] for series in MATRIX_RESPONSE["data"]["result"]]
+    np.testing.assert_array_equal(
+        result[0]["values"], np.array([[1700000000, 0.5], [1700000060.5, np.nan], [1700000120, np.inf]])
+    )
+    np.testing.assert_array_equal(result[1]["values"], np.array([[1700000000, 1e-05]]))
+    assert result[0]["values"].dtype == np.float64
+
+
+def test_decode_vector():
+    body = json.dumps(
+        {
+            "status": "success",
+            "data": {"resultType": "vector", "result": [{"metric": {"pod": "app-1"}, "value": [1700000000, "42"]}]},
+        }
+    ).encode()
+
+    (series,) = decode(body, 5)
+    np.testing.assert_array_equal(series["values"], np.array([[1700000000, 42]]))
+
+
+def test_truncated_response():
+    body = json.dumps(MATRIX_RESPONSE).encode()
+    decoder = SeriesStreamDecoder()
+    decoder.feed(body[: body.index(b"1e-05")])
+
+    with pytest.raises(ValueError):
+        decoder.close()
+
+
+def test_filter_prom_jobs_results():
+    def series(pod: str, job: str) -> dict:
+        return {"metric": {"pod": pod, "job": job}, "values": []}
+
+    result = PrometheusMetric.filter_prom_jobs_results(
+        [
+            series("app-1", "node-exporter"),
+            series("app-1", "kubelet"),
+            series("app-1", "cadvisor"),
+            series("app-2", "node-exporter"),
+            series("app-2", "cadvisor"),
+            {"metric": {"job": "kubelet"}, "values": []},
+        ]
+    )
+
+    assert sorted((series["metric"]["pod"], series["metric"]["job"]) for series in result) == [
+        ("app-1", "kubelet"),
+        ("app-2", "cadvisor"),
+    ]
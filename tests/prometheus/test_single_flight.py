@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from robusta_krr.core.integrations.prometheus.single_flight import SingleFlight
+
+
+class CountingFactory:
+    def __init__(self, result=None, error: Exception = None) -> None:
+        self.calls = 0
+        self.result = result
+        self.error = error
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def test_concurrent_requests_are_collapsed():
+    single_flight = SingleFlight()
+    factory = CountingFactory(result=[1, 2])
+
+    async def main():
+        return await asyncio.gather(*[single_flight.run("up", factory) for _ in range(5)])
+
+    results = asyncio.run(main())
+
+    assert factory.calls == 1
+    assert all(result is results[0] for result in results)
+    assert single_flight.hits == 4
+
+
+@pytest.mark.parametrize("keep_results", [True, False])
+def test_sequential_requests(keep_results: bool):
+    single_flight = SingleFlight(keep_results=keep_results)
+    factory = CountingFactory(result=[1])
+
+    async def main():
+        await single_flight.run("up", factory)
+        await single_flight.run("up", factory)
+
+    asyncio.run(main())
+
+    assert factory.calls == (1 if keep_results else 2)
+
+
+def test_failures_are_shared_but_not_kept():
+    single_flight = SingleFlight(keep_results=True)
+    factory = CountingFactory(error=ValueError("bad query"))
+
+    async def main():
+        results = await asyncio.gather(*[single_flight.run("up", factory) for _ in range(3)], return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        with pytest.raises(ValueError):
+            await single_flight.run("up", factory)
+
+    asyncio.run(main())
+
+    assert factory.calls == 2
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    single_flight = SingleFlight()
+    factory = CountingFactory(result="ok")
+
+    async def main():
+        first = asyncio.ensure_future(single_flight.run("up", factory))
+        second = asyncio.ensure_future(single_flight.run("up", factory))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "ok"
+    assert factory.calls == 1
@@ -0,0 +1,125 @@
+import asyncio
+import datetime
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from robusta_krr.core.abstract.strategies import SketchArray, concatenate_metrics
+from robusta_krr.core.integrations.prometheus.metrics import CPULoader, MaxMemoryLoader, QueryOptions, SketchedMetric
+from robusta_krr.core.integrations.prometheus.metrics.base import PrometheusMetricData, QueryType
+from robusta_krr.strategies.simple_limit import SimpleLimitStrategy, SimpleLimitStrategySettings
+from robusta_krr.utils.sketch import DDSketch
+
+from conftest import make_object
+
+STEP = datetime.timedelta(minutes=1)
+PERIOD = datetime.timedelta(hours=10)
+END = 1_700_000_040.0  # aligned to the step
+
+TEST_OBJECT = make_object(pods=["app-1", "app-2"])
+
+
+def usage(pod: str, timestamps: np.ndarray) -> np.ndarray:
+    # A deterministic usage of each pod at each timestamp
+    return (timestamps % 997) / 100 + (pod == "app-2")
+
+
+class Client:
+    """Streams a series of each pod (and a duplicate of another job), recording the streamed series."""
+
+    def __init__(self) -> None:
+        self.streamed: list[dict] = []
+
+    async def stream_query_range(self, query: str, start_time, end_time, step: str, params: dict):
+        timestamps = np.arange(start_time.timestamp(), end_time.timestamp() + 1, STEP.total_seconds())
+        for pod in ["app-1", "app-2"]:
+            for job in ["kubelet", "cadvisor"]:
+                series = {
+                    "metric": {"pod": pod, "container": "main", "job": job},
+                    "values": np.stack([timestamps, usage(pod, timestamps) * (job == "kubelet")], axis=1),
+                }
+                self.streamed.append(series)
+                yield series
+
+
+def make_loader(client: Client, **kwargs) -> SketchedMetric:
+    Loader = SketchedMetric.sketch(CPULoader, 0.01)
+    return Loader(prometheus=None, service_name="Prometheus", client=client, **kwargs)  # type: ignore
+
+
+@pytest.fixture(autouse=True)
+def no_cluster_label():
+    with patch(
+        "robusta_krr.core.integrations.prometheus.metrics.base.PrometheusMetric.get_prometheus_cluster_label",
+        return_value="",
+    ):
+        yield
+
+
+def load(loader: SketchedMetric) -> dict:
+    time_range = (
+        datetime.datetime.fromtimestamp(END - PERIOD.total_seconds(), tz=datetime.timezone.utc),
+        datetime.datetime.fromtimestamp(END, tz=datetime.timezone.utc),
+    )
+    with patch.object(loader, "_get_time_range", return_value=time_range):
+        return asyncio.run(loader.load_data(TEST_OBJECT, PERIOD, STEP))
+
+
+def test_sketch_loaders():
+    Loader = SketchedMetric.sketch(CPULoader, 0.01)
+
+    assert Loader is SketchedMetric.sketch(CPULoader, 0.01)
+    assert Loader.__name__ == "CPULoaderSketch"
+    assert Loader.supports_bulk() and Loader.supports_export()
+    assert Loader in SimpleLimitStrategy(SimpleLimitStrategySettings(cpu_sketch_accuracy=0.01)).metrics
+    with pytest.raises(ValueError):
+        SketchedMetric.sketch(MaxMemoryLoader, 0.01)
+
+
+def test_series_are_sketched_while_decoded():
+    client = Client()
+    loader = make_loader(client)
+
+    async def collect() -> list:
+        now = datetime.datetime.fromtimestamp(END, tz=datetime.timezone.utc)
+        return await loader._collect_series(client.stream_query_range("", now - STEP, now, "60s", {}))
+
+    series = asyncio.run(collect())
+
+    # The duplicated jobs are filtered out of the sketches, no samples are collected
+    assert [(s["metric"]["pod"], s["metric"]["job"]) for s in series] == [("app-1", "kubelet"), ("app-2", "kubelet")]
+    assert all(isinstance(s["values"], DDSketch) and s["values"].count == 2 for s in series)
+
+
+def test_sketches_of_the_shards_are_merged():
+    client = Client()
+    # 601 points, split into 4 shards
+    data = load(make_loader(client, options=QueryOptions(max_range_points=200)))
+
+    assert len({tuple(series["values"][[0, -1], 0]) for series in client.streamed}) == 4
+    timestamps = np.arange(END - PERIOD.total_seconds(), END + 1, STEP.total_seconds())
+    for pod in ["app-1", "app-2"]:
+        assert isinstance(data[pod], DDSketch)
+        assert data[pod].count == len(timestamps)
+        for percentile in [50, 95]:
+            expected = np.percentile(usage(pod, timestamps), percentile, method="lower")
+            assert data[pod].percentile(percentile) == pytest.approx(expected, rel=0.01)
+
+    # The sketches of the pods are merged for the strategies
+    [sketches] = concatenate_metrics([{"CPULoaderSketch": data}]).values()
+    assert isinstance(sketches, SketchArray)
+    assert list(sketches.lengths) == [2 * len(timestamps)]
+    expected = np.percentile(np.concatenate([usage(pod, timestamps) for pod in ["app-1", "app-2"]]), 66, method="lower")
+    assert sketches.percentile(66)[0] == pytest.approx(expected, rel=0.01)
+
+
+def test_sketched_and_raw_queries_do_not_share_results():
+    loader = make_loader(Client())
+    raw_loader = CPULoader(prometheus=None, service_name="Prometheus")  # type: ignore
+    start_time, end_time = loader._get_time_range(PERIOD, STEP)
+
+    query = PrometheusMetricData(
+        query="up", start_time=start_time, end_time=end_time, step="60s", type=QueryType.QueryRange
+    )
+    assert loader._get_single_flight_key(query) != raw_loader._get_single_flight_key(query)
@@ -0,0 +1,71 @@
+import asyncio
+import datetime
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+import pytest
+
+from robusta_krr.core.abstract.timeseries import SteppedSeries
+from robusta_krr.core.integrations.prometheus.metrics import CPULoader, QueryOptions
+
+from conftest import make_object
+
+
+@pytest.fixture(autouse=True)
+def no_cluster_label():
+    with patch(
+        "robusta_krr.core.integrations.prometheus.metrics.base.PrometheusMetric.get_prometheus_cluster_label",
+        return_value="",
+    ):
+        yield
+
+
+def test_stepped_series_behaves_like_the_samples_array():
+    # a gap of two steps between 1060 and 1240
+    samples = np.array([[1000.0, 1], [1060, 2.5], [1240, 4]])
+
+    series = SteppedSeries.from_samples(samples, 60)
+
+    assert isinstance(series, SteppedSeries)
+    assert series.values.dtype == np.float32 and len(series.values) == 5
+    assert len(series) == 3 and series.shape == (3, 2)
+    np.testing.assert_array_equal(series[:, 1], [1, 2.5, 4])
+    np.testing.assert_array_equal(series[:, 0], [1000, 1060, 1240])
+    assert series[0, 1] == 1 and series[-1, 0] == 1240
+    np.testing.assert_array_equal(np.asarray(series), samples)
+    np.testing.assert_array_equal(np.concatenate([series, series])[:, 1], [1, 2.5, 4, 1, 2.5, 4])
+
+
+def test_unaligned_samples_are_kept_as_an_array():
+    samples = [[1000.0, 1], [1030, 2]]
+
+    assert not isinstance(SteppedSeries.from_samples(samples, 60), SteppedSeries)
+    np.testing.assert_array_equal(SteppedSeries.from_samples(samples, 60), samples)
+
+
+def test_shards_are_concatenated_on_the_step_grid():
+    first = SteppedSeries.from_samples([[0.0, 1], [60, 2]], 60)
+    second = SteppedSeries.from_samples([[180.0, 4], [240, 5]], 60)
+
+    series = SteppedSeries.concatenate([first, second])
+
+    assert series.start == 0 and len(series.values) == 5
+    np.testing.assert_array_equal(series[:, 0], [0, 60, 180, 240])
+
+
+def test_loaders_produce_stepped_series_of_the_configured_precision():
+    object = make_object(pods=["app-1"])
+    step = datetime.timedelta(minutes=1)
+    timestamps = np.arange(1700000000, 1700000000 + 3600, 60)
+    result = [{"metric": {"pod": "app-1", "container": "main"}, "values": [[t, "0.5"] for t in timestamps]}]
+
+    loader = CPULoader(  # type: ignore
+        prometheus=None, service_name="Prometheus", options=QueryOptions(values_dtype="float32")
+    )
+    loader.query_prometheus = AsyncMock(return_value=result)
+    data = asyncio.run(loader.load_data(object, datetime.timedelta(hours=1), step))
+
+    assert isinstance(data["app-1"], SteppedSeries)
+    assert data["app-1"].nbytes == len(timestamps) * 4
+    np.testing.assert_array_equal(data["app-1"][:, 0], timestamps)
+    assert np.all(data["app-1"][:, 1] == 0.5)
@@ -0,0 +1,78 @@
+import asyncio
+import datetime
+from typing import Optional
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from robusta_krr.core.integrations.prometheus.metrics import (
+    CPUAmountLoader,
+    CPULoader,
+    FusedMetric,
+    MaxMemoryLoader,
+    PercentileCPULoader,
+    PrometheusMetric,
+)
+from robusta_krr.core.integrations.prometheus.metrics_service.prometheus_metrics_service import (
+    PrometheusMetricsService,
+)
+
+from conftest import make_object
+
+HISTORY = datetime.timedelta(days=14)
+STEP = datetime.timedelta(minutes=1)
+
+TEST_OBJECT = make_object(pods=["app-1"])
+
+
+def make_service(max_subquery_points: Optional[int]) -> PrometheusMetricsService:
+    service = PrometheusMetricsService.__new__(PrometheusMetricsService)
+    service.max_subquery_points = max_subquery_points
+    return service
+
+
+@pytest.mark.parametrize(
+    "LoaderClass, step",
+    [
+        # 14 days at a 1 minute step are 20160 points, so the instant subqueries are coarsened to fit into 10000
+        (PercentileCPULoader(95), datetime.timedelta(seconds=121)),
+        (CPUAmountLoader, datetime.timedelta(seconds=121)),
+        (MaxMemoryLoader, datetime.timedelta(seconds=121)),
+        (FusedMetric.fuse([PercentileCPULoader(95), MaxMemoryLoader]), datetime.timedelta(seconds=121)),
+        # while the range loaders are split into time shards instead
+        (CPULoader, STEP),
+    ],
+)
+def test_eks_raises_the_step_of_the_instant_loaders(LoaderClass: type[PrometheusMetric], step: datetime.timedelta):
+    assert make_service(10000).get_loader_step(LoaderClass, HISTORY, STEP) == step
+
+
+@pytest.mark.parametrize(
+    "max_subquery_points, step",
+    [(None, STEP), (10000, datetime.timedelta(hours=1))],
+)
+def test_the_step_is_kept_when_it_fits(max_subquery_points: Optional[int], step: datetime.timedelta):
+    assert make_service(max_subquery_points).get_loader_step(PercentileCPULoader(95), HISTORY, step) == step
+
+
+def test_eks_subquery_is_sent_with_the_raised_step():
+    queries: list[str] = []
+
+    class Client:
+        async def stream_query(self, query: str, params: dict):
+            queries.append(query)
+            yield {"metric": {"pod": "app-1", "container": "main"}, "values": np.array([[1700000000, 1.0]])}
+
+    async def create_loader(LoaderClass, period, step):
+        return LoaderClass(prometheus=None, service_name="EKS", client=Client())  # type: ignore
+
+    service = make_service(10000)
+    service._create_loader = create_loader  # type: ignore
+
+    with patch.object(PrometheusMetric, "get_prometheus_cluster_label", return_value=""):
+        data = asyncio.run(service.gather_data(TEST_OBJECT, PercentileCPULoader(95), HISTORY, STEP))
+
+    assert list(data) == ["app-1"]
+    [query] = queries
+    assert "[14d:121s]" in query
@@ -0,0 +1,59 @@
+import asyncio
+import datetime
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from robusta_krr.core.integrations.prometheus.metrics import MaxMemoryLoader, QueryOptions
+from robusta_krr.core.integrations.prometheus.metrics_service.thanos_metrics_service import ThanosMetricsService
+
+from conftest import make_object
+
+
+def make_service() -> ThanosMetricsService:
+    service = ThanosMetricsService.__new__(ThanosMetricsService)
+    service.used_resolutions = {}
+    return service
+
+
+@pytest.mark.parametrize(
+    "history, step, resolution",
+    [
+        (datetime.timedelta(days=14), datetime.timedelta(minutes=1.25), "0s"),
+        (datetime.timedelta(days=14), datetime.timedelta(minutes=30), "300s"),
+        (datetime.timedelta(days=14), datetime.timedelta(hours=6), "3600s"),
+        (datetime.timedelta(days=3), datetime.timedelta(hours=6), "300s"),
+        (datetime.timedelta(hours=24), datetime.timedelta(hours=6), "0s"),
+    ],
+)
+def test_resolution_tier_depends_on_history_and_step(
+    history: datetime.timedelta, step: datetime.timedelta, resolution: str
+):
+    service = make_service()
+
+    params = service.get_query_params(history, step)
+
+    assert params == {"max_source_resolution": resolution, "partial_response": "false", "dedup": "true"}
+    assert (history, step) in service.used_resolutions
+
+
+def test_loaders_send_the_query_params():
+    sent_params: list[dict] = []
+
+    class Client:
+        async def stream_query(self, query: str, params: dict):
+            sent_params.append(params)
+            yield {"metric": {"pod": "app-1", "container": "main"}, "values": np.array([[1700000000, 1.0]])}
+
+    params = make_service().get_query_params(datetime.timedelta(days=14), datetime.timedelta(hours=1))
+    loader = MaxMemoryLoader(  # type: ignore
+        prometheus=None, service_name="Thanos", client=Client(), options=QueryOptions(query_params=params)
+    )
+    object = make_object(pods=["app-1"])
+
+    with patch.object(loader, "get_prometheus_cluster_label", return_value=""):
+        data = asyncio.run(loader.load_data(object, datetime.timedelta(days=14), datetime.timedelta(hours=1)))
+
+    assert list(data) == ["app-1"]
+    assert sent_params == [params]
@@ -0,0 +1,121 @@
+import asyncio
+import datetime
+import json
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from robusta_krr.core.integrations.prometheus.metrics import CPULoader, MaxMemoryLoader, MemoryLoader, QueryOptions
+from robusta_krr.core.integrations.prometheus.metrics.resample import last_over_grid, rate_over_grid
+from robusta_krr.core.integrations.prometheus.response_decoder import ExportStreamDecoder
+
+from conftest import make_object
+
+
+@pytest.fixture(autouse=True)
+def no_cluster_label():
+    with patch(
+        "robusta_krr.core.integrations.prometheus.metrics.base.PrometheusMetric.get_prometheus_cluster_label",
+        return_value="",
+    ):
+        yield
+
+
+def test_export_lines_are_decoded_across_chunks():
+    lines = [
+        {"metric": {"__name__": "m", "pod": "app-1"}, "values": [1, 2.5], "timestamps": [1700000000000, 1700000015000]},
+        {"metric": {"__name__": "m", "pod": "app-2"}, "values": [3], "timestamps": [1700000000000]},
+    ]
+    body = ("\n".join(json.dumps(line) for line in lines)).encode()
+
+    decoder = ExportStreamDecoder()
+    series = [s for i in range(0, len(body), 7) for s in decoder.feed(body[i : i + 7])] + decoder.close()
+
+    assert [s["metric"]["pod"] for s in series] == ["app-1", "app-2"]
+    np.testing.assert_array_equal(series[0]["values"], [[1700000000, 1], [1700000015, 2.5]])
+
+    decoder = ExportStreamDecoder()
+    decoder.feed(body[:-3])
+    with pytest.raises(ValueError):
+        decoder.close()
+
+
+def test_resampling_follows_the_promql_semantics():
+    timestamps = np.arange(0, 600, 15, dtype=np.float64)
+    grid = np.array([0.0, 60, 300, 870])
+
+    np.testing.assert_array_equal(last_over_grid(timestamps, timestamps * 2, grid), [0, 120, 600, 1170])
+    # no samples within the lookback
+    assert np.isnan(last_over_grid(timestamps, timestamps, np.array([1000.0]))).all()
+
+    # a counter growing by 1 per second, reset between 285 and 300
+    counter = np.where(timestamps < 300, timestamps, timestamps - 285)
+    rates = rate_over_grid(timestamps, counter, grid, 60)
+    assert np.isnan(rates[0]) and np.isnan(rates[-1])
+    np.testing.assert_allclose(rates[1:3], [1, 1])
+
+
+def test_exported_samples_are_aggregated_like_the_query():
+    objects = [make_object("app", pods=["app-1", "app-2"]), make_object("other", pods=["other-1"])]
+    matches: list[str] = []
+
+    class Client:
+        async def stream_export(self, match: str, start_time: datetime.datetime, end_time: datetime.datetime):
+            matches.append(match)
+            timestamps = np.arange(start_time.timestamp(), end_time.timestamp() + 1, 15)
+            for pod, job, value in [("app-1", "kubelet", 1), ("app-1", "cadvisor", 5), ("app-2", "kubelet", 2)]:
+                for part, half in enumerate(np.array_split(timestamps, 2)):
+                    # the same series of app-1 exported twice with different ids, and in two parts
+                    for id in ["a", "b"] if pod == "app-1" else ["a"]:
+                        yield {
+                            "metric": {"pod": pod, "container": "main", "job": job, "id": id},
+                            "values": np.stack([half, np.full(len(half), value * (1 + (id == "b")))], axis=1),
+                        }
+
+    loader = MemoryLoader(  # type: ignore
+        prometheus=None, service_name="Victoria Metrics", client=Client(), options=QueryOptions(export=True)
+    )
+    step = datetime.timedelta(minutes=1)
+    data = asyncio.run(loader.load_namespace_data("default", objects, datetime.timedelta(hours=1), step))
+
+    assert matches == ['container_memory_working_set_bytes{namespace="default", container!="", container!="POD"}']
+    assert sorted(data[objects[0]]) == ["app-1", "app-2"] and data[objects[1]] == {}
+    # max by (container, pod, job), then the kubelet job is picked
+    assert len(data[objects[0]]["app-1"]) == 61
+    assert np.all(data[objects[0]]["app-1"][:, 1] == 2)
+    assert np.all(data[objects[0]]["app-2"][:, 1] == 2)
+
+
+def test_only_range_loaders_with_an_exported_metric_can_be_exported():
+    assert CPULoader.supports_export() and MemoryLoader.supports_export()
+    assert not MaxMemoryLoader.supports_export()
+
+    options = QueryOptions(export=True)
+    assert CPULoader(prometheus=None, service_name="Victoria Metrics", options=options).export  # type: ignore
+    assert not MaxMemoryLoader(prometheus=None, service_name="Victoria Metrics", options=options).export  # type: ignore
+
+    # the export API only takes series selectors, so the owner pods can not be joined
+    with pytest.raises(ValueError):
+        QueryOptions(export=True, owner_queries=True)
+
+
+def test_export_is_split_into_the_batches_of_pods():
+    object = make_object("app", pods=4)
+    matches: list[str] = []
+
+    class Client:
+        async def stream_export(self, match: str, start_time: datetime.datetime, end_time: datetime.datetime):
+            matches.append(match)
+            timestamps = np.arange(start_time.timestamp(), end_time.timestamp() + 1, 15)
+            for pod in [pod.name for pod in object.pods if pod.name in match]:
+                yield {"metric": {"pod": pod, "container": "main"}, "values": np.stack([timestamps] * 2, axis=1)}
+
+    options = QueryOptions(export=True, max_query_size=275)
+    loader = MemoryLoader(  # type: ignore
+        prometheus=None, service_name="Victoria Metrics", client=Client(), options=options
+    )
+    data = asyncio.run(loader.load_data(object, datetime.timedelta(hours=1), datetime.timedelta(minutes=1)))
+
+    assert len(matches) == len(loader.split_into_batches(object, "3600s", "60s")) > 1
+    assert sorted(data) == ["app-0", "app-1", "app-2", "app-3"]
@@ -0,0 +1,87 @@
+import asyncio
+import datetime
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from robusta_krr.core.integrations.prometheus.metrics import (
+    CPUAmountLoader,
+    FusedMetric,
+    MaxMemoryLoader,
+    PercentileCPULoader,
+)
+
+from conftest import make_object
+
+PODS = ["app-1", "app-2"]
+
+
+def make_series(pod: str, container: str, value: float, **labels: str) -> dict:
+    return {
+        "metric": {"namespace": "default", "pod": pod, "container": container, "job": "kubelet", **labels},
+        "values": [[1700000000.0, str(value)]],
+    }
+
+
+@pytest.fixture(autouse=True)
+def no_cluster_label():
+    with patch(
+        "robusta_krr.core.integrations.prometheus.metrics.base.PrometheusMetric.get_prometheus_cluster_label",
+        return_value="",
+    ):
+        yield
+
+
+def test_containers_are_selected_by_a_single_query():
+    loader = MaxMemoryLoader(prometheus=None, service_name="Prometheus")  # type: ignore
+    objects = [make_object(pods=PODS), make_object(container="sidecar", pods=PODS)]
+
+    query = loader.get_query(loader.get_workload(objects), "1d", "60s")
+
+    assert 'container=~"main|sidecar"' in query
+    assert 'pod=~"app-1|app-2"' in query
+    assert 'container="main"' in loader.get_query(objects[0], "1d", "60s")
+
+
+def test_workload_results_are_split_by_container():
+    main, sidecar, idle = [make_object(container=container, pods=PODS) for container in ["main", "sidecar", "idle"]]
+
+    loader = MaxMemoryLoader(prometheus=None, service_name="Prometheus")  # type: ignore
+    loader.query_prometheus = AsyncMock(
+        return_value=[
+            make_series("app-1", "main", 1),
+            make_series("app-2", "main", 2),
+            make_series("app-1", "sidecar", 3),
+        ]
+    )
+
+    result = asyncio.run(
+        loader.load_workload_data([main, sidecar, idle], datetime.timedelta(days=1), datetime.timedelta(minutes=1))
+    )
+
+    assert loader.query_prometheus.await_count == 1
+    assert {pod: values[0, 1] for pod, values in result[main].items()} == {"app-1": 1, "app-2": 2}
+    assert {pod: values[0, 1] for pod, values in result[sidecar].items()} == {"app-1": 3}
+    assert result[idle] == {}
+
+
+def test_fused_workload_results_are_split_by_container_and_loader():
+    FusedLoader = FusedMetric.fuse([PercentileCPULoader(95), CPUAmountLoader])
+    loader = FusedLoader(prometheus=None, service_name="Prometheus")  # type: ignore
+    main, sidecar = make_object(pods=PODS), make_object(container="sidecar", pods=PODS)
+
+    result = [
+        make_series("app-1", "main", 0.5, __krr_metric="PercentileCPULoader"),
+        make_series("app-1", "sidecar", 0.1, __krr_metric="PercentileCPULoader"),
+        make_series("app-1", "sidecar", 100, __krr_metric="CPUAmountLoader"),
+    ]
+    with patch.object(loader, "query_prometheus", AsyncMock(return_value=result)) as query_prometheus:
+        data = asyncio.run(
+            loader.load_fused_workload_data([main, sidecar], datetime.timedelta(days=1), datetime.timedelta(minutes=1))
+        )
+
+    assert query_prometheus.await_count == 1
+    assert {pod: values[0][1] for pod, values in data[main]["PercentileCPULoader"].items()} == {"app-1": 0.5}
+    assert data[main]["CPUAmountLoader"] == {}
+    assert {pod: values[0][1] for pod, values in data[sidecar]["PercentileCPULoader"].items()} == {"app-1": 0.1}
+    assert {pod: values[0][1] for pod, values in data[sidecar]["CPUAmountLoader"].items()} == {"app-1": 100}
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from robusta_krr.core.abstract.strategies import RaggedArray, ResourceType, concatenate_metrics
+from robusta_krr.core.models.objects import HPAData
+from robusta_krr.utils.sketch import DDSketch
+from robusta_krr.strategies.simple import SimpleStrategy, SimpleStrategySettings
+from robusta_krr.strategies.simple_limit import SimpleLimitStrategy, SimpleLimitStrategySettings
+
+from conftest import make_object
+
+
+def make_pods_data(rng: np.random.Generator, pods: int, points: int) -> dict:
+    return {
+        f"pod-{i}": np.stack([np.arange(points, dtype=np.float64), rng.random(points) * 100], axis=1)
+        for i in range(pods)
+    }
+
+
+def make_history_data(rng: np.random.Generator, cpu_loader: str, pods: int, points: int, oomkill: float) -> dict:
+    def amount(count: int) -> dict:
+        return {f"pod-{i}": np.array([[0.0, count]]) for i in range(pods)}
+
+    cpu_data = make_pods_data(rng, pods, points)
+    if cpu_loader.endswith("Sketch"):
+        cpu_data = {pod: DDSketch.from_values(values[:, 1], 0.01) for pod, values in cpu_data.items()}
+
+    return {
+        cpu_loader: cpu_data,
+        "MaxMemoryLoader": make_pods_data(rng, pods, points),
+        "CPUAmountLoader": amount(points),
+        "MemoryAmountLoader": amount(points),
+        "MaxOOMKilledMemoryLoader": {"pod-0": np.array([[0.0, oomkill]])} if pods > 0 else {},
+    }
+
+
+def test_ragged_reductions_match_numpy():
+    rng = np.random.default_rng(0)
+    segments = [rng.random(n) for n in [5, 0, 1, 0, 12, 2, 0]]
+    data = RaggedArray(
+        np.concatenate(segments), np.concatenate([[0], np.cumsum([len(segment) for segment in segments])])
+    )
+
+    def expected(reduce, empty: float) -> list[float]:
+        return [reduce(segment) if len(segment) > 0 else empty for segment in segments]
+
+    np.testing.assert_allclose(data.max(), expected(np.max, np.nan))
+    np.testing.assert_allclose(data.sum(), expected(np.sum, 0))
+    for percentile in [0, 33, 66, 95, 100]:
+        np.testing.assert_allclose(
+            data.percentile(percentile), expected(lambda segment: np.percentile(segment, percentile), np.nan)
+        )
+
+
+@pytest.mark.parametrize(
+    "strategy, cpu_loader",
+    [
+        (SimpleStrategy(SimpleStrategySettings(use_oomkill_data=True)), "PercentileCPULoader"),
+        (SimpleStrategy(SimpleStrategySettings()), "PercentileCPULoader"),
+        (SimpleLimitStrategy(SimpleLimitStrategySettings(use_oomkill_data=True)), "CPULoader"),
+        (SimpleLimitStrategy(SimpleLimitStrategySettings(cpu_sketch_accuracy=0.01)), "CPULoaderSketch"),
+    ],
+)
+def test_batch_results_match_the_per_object_results(strategy, cpu_loader: str):
+    rng = np.random.default_rng(0)
+    # no pods, not enough points, an OOMKill, and a regular object
+    history_data = [
+        make_history_data(rng, cpu_loader, pods, points, oomkill)
+        for pods, points, oomkill in [(0, 0, 0), (2, 10, 0), (3, 200, 1000), (1, 150, 0)]
+    ]
+    objects = [make_object(f"app-{i}") for i in range(len(history_data))]
+    # an HPA scaling on the CPU
+    objects[-1] = objects[-1].copy(
+        update={"hpa": HPAData(max_replicas=3, desired_replicas=1, target_cpu_utilization_percentage=80)}
+    )
+
+    batch_results = strategy.run_batch(concatenate_metrics(history_data), objects)
+    results = [strategy.run(data, object) for data, object in zip(history_data, objects)]
+
+    def values(results: list) -> np.ndarray:
+        return np.array(
+            [[[r[resource].request, r[resource].limit] for resource in sorted(r)] for r in results], dtype=np.float64
+        )
+
+    assert strategy.supports_batch()
+    # NOTE: the percentiles are interpolated in a different order than np.percentile, so they may differ by rounding
+    np.testing.assert_allclose(values(batch_results), values(results), equal_nan=True)
+    assert [{resource: r[resource].info for resource in r} for r in batch_results] == [
+        {resource: r[resource].info for resource in r} for r in results
+    ]
+
+
+    assert batch_results[-1][ResourceType.CPU].info == "HPA detected"
+    assert batch_results[-1][ResourceType.Memory].info is None
@@ -0,0 +1,134 @@
+import asyncio
+from typing import Any, Optional
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from robusta_krr.api.models import K8sObjectData, PodData
+from robusta_krr.core.abstract.strategies import ResourceRecommendation, RunResult
+from robusta_krr.core.models.result import ResourceType
+from robusta_krr.core.integrations.kubernetes import KubernetesLoader
+from robusta_krr.core.runner import Runner
+
+from conftest import make_object
+
+# NOTE: list_scannable_objects is mocked for the whole session in conftest, so keep a reference to the real one
+list_scannable_objects = KubernetesLoader.list_scannable_objects
+
+
+class FakeClusterLoader:
+    def __init__(self, cluster: Optional[str] = None) -> None:
+        if cluster == "unreachable":
+            raise ValueError("No such context")
+        self.cluster = cluster
+
+    async def list_scannable_objects(self) -> list[K8sObjectData]:
+        if self.cluster == "broken":
+            raise RuntimeError("Forbidden")
+        await asyncio.sleep(0.01)
+        return [make_object("app", cluster=self.cluster)]
+
+
+def test_clusters_failing_to_be_discovered_are_skipped():
+    loader = KubernetesLoader()
+    with patch("robusta_krr.core.integrations.kubernetes.ClusterLoader", FakeClusterLoader):
+        objects = asyncio.run(list_scannable_objects(loader, ["a", "unreachable", "broken", "b"]))
+
+    assert [object.cluster for object in objects] == ["a", "b"]
+    assert set(loader.cluster_loaders) == {"a", "broken", "b"}
+
+
+def test_no_cluster_loaded():
+    loader = KubernetesLoader()
+    with patch("robusta_krr.core.integrations.kubernetes.ClusterLoader", FakeClusterLoader):
+        assert asyncio.run(list_scannable_objects(loader, ["unreachable"])) == []
+
+
+def test_slow_cluster_does_not_hold_up_the_others():
+    events: list[str] = []
+
+    async def discover(clusters: Optional[list[str]]) -> list[K8sObjectData]:
+        [cluster] = clusters  # type: ignore
+        if cluster == "slow":
+            await asyncio.sleep(0.1)
+        events.append(f"discovered {cluster}")
+        return [make_object(f"app-{i}", cluster=cluster) for i in range(4)]
+
+    async def gather(objects: list[K8sObjectData]) -> list[None]:
+        await asyncio.sleep(0.01)
+        events.append(f"scanned {objects[0].name} in {objects[0].cluster}")
+        return [None]
+
+    runner = Runner.__new__(Runner)
+    runner._k8s_loader = MagicMock(list_scannable_objects=AsyncMock(side_effect=discover))
+    runner._batchers = {}
+    runner._loading_slots = {}
+    runner._strategy = MagicMock(supports_batch=MagicMock(return_value=False))
+    runner._Runner__progressbar = MagicMock(total=None)
+
+    async def scan() -> list[list[None]]:
+        return await asyncio.gather(runner._scan_cluster("slow"), runner._scan_cluster("fast"))
+
+    with patch("robusta_krr.core.runner.settings", bulk_queries=False, cluster_concurrency=2), patch.multiple(
+        Runner,
+        _connect_prometheus=AsyncMock(),
+        _check_data_availability=AsyncMock(),
+        _gather_workload_allocations=AsyncMock(side_effect=gather),
+    ):
+        scans = asyncio.run(scan())
+
+    assert [len(cluster_scans) for cluster_scans in scans] == [4, 4]
+    # All the workloads of the fast cluster are scanned before the slow one is even discovered
+    assert events.index("discovered slow") > max(
+        index for index, event in enumerate(events) if event.endswith("in fast")
+    )
+
+
+def test_batched_cluster_with_more_workloads_than_the_concurrency():
+    in_flight = max_in_flight = 0
+
+    async def gather_data(object: K8sObjectData, *args: Any, **kwargs: Any) -> dict:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.001)
+        in_flight -= 1
+        return {}
+
+    async def run_strategy_batch(metrics: list[dict], objects: list[K8sObjectData]) -> list[RunResult]:
+        return [
+            {resource: ResourceRecommendation(request=1.0, limit=1.0) for resource in ResourceType}
+            for _ in objects
+        ]
+
+    prometheus_loader = MagicMock(
+        load_pods=AsyncMock(return_value=[PodData(name="pod", deleted=False)]),
+        check_load=AsyncMock(return_value=None),
+        gather_data=AsyncMock(side_effect=gather_data),
+    )
+    workloads = [make_object(f"app-{i}", cluster="cluster") for i in range(60)]
+
+    runner = Runner.__new__(Runner)
+    runner._k8s_loader = MagicMock(list_scannable_objects=AsyncMock(return_value=workloads))
+    runner._batchers = {}
+    runner._loading_slots = {}
+    runner._load_verdicts = {}
+    runner._strategy = MagicMock(supports_batch=MagicMock(return_value=True))
+    runner._Runner__progressbar = MagicMock(total=None)
+
+    with patch(
+        "robusta_krr.core.runner.settings",
+        bulk_queries=False,
+        cluster_concurrency=5,
+        cpu_min_value=10,
+        memory_min_value=100,
+    ), patch.multiple(
+        Runner,
+        _connect_prometheus=AsyncMock(),
+        _check_data_availability=AsyncMock(),
+        _get_prometheus_loader=MagicMock(return_value=prometheus_loader),
+        _run_strategy_batch=AsyncMock(side_effect=run_strategy_batch),
+    ):
+        # NOTE: All the workloads wait for the single batch, so holding their slots meanwhile would deadlock
+        scans = asyncio.run(asyncio.wait_for(runner._scan_cluster("cluster"), timeout=5))
+
+    assert len(scans) == 60 and all(scan is not None for scan in scans)
+    assert max_in_flight == 5
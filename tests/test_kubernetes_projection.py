@@ -0,0 +1,101 @@
+import asyncio
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from robusta_krr.core.integrations.kubernetes import ClusterLoader
+from robusta_krr.core.integrations.kubernetes.projection import LabelSelector, Workload
+from robusta_krr.core.models.allocations import ResourceType
+
+POD_SPEC = {
+    "containers": [
+        {"name": "main", "image": "app:1", "resources": {"requests": {"cpu": "100m"}, "limits": {"memory": "1Gi"}}},
+        {"name": "sidecar", "image": "proxy:1"},
+    ],
+    "volumes": [{"name": "data", "emptyDir": {}}],
+}
+SELECTOR = {
+    "matchLabels": {"app": "web"},
+    "matchExpressions": [
+        {"key": "tier", "operator": "In", "values": ["a", "b"]},
+        {"key": "canary", "operator": "DoesNotExist"},
+    ],
+}
+
+
+def make_item(spec: dict, **metadata) -> dict:
+    return {
+        "metadata": {"name": "web", "namespace": "default", "uid": "uid-1", "labels": {"team": "a"}, **metadata},
+        "spec": spec,
+        "status": {"replicas": 3},
+    }
+
+
+@pytest.mark.parametrize(
+    "kind, spec",
+    [
+        ("Deployment", {"replicas": 3, "selector": SELECTOR, "template": {"spec": POD_SPEC}}),
+        ("Rollout", {"replicas": 3, "selector": SELECTOR, "template": {"spec": POD_SPEC}}),
+        ("CronJob", {"jobTemplate": {"spec": {"selector": SELECTOR, "template": {"spec": POD_SPEC}}}}),
+        ("StrimziPodSet", {"selector": SELECTOR, "pods": [{"spec": POD_SPEC}, {"spec": {"containers": []}}]}),
+    ],
+)
+def test_workload_projection(kind: str, spec: dict):
+    workload = Workload.from_json(make_item(spec), kind)
+
+    assert workload.metadata.name == "web"
+    assert workload.metadata.labels == {"team": "a"}
+    assert workload.metadata.annotations == {}
+    assert [container.name for container in workload.containers] == ["main", "sidecar"]
+    assert workload.containers[0].resources.requests == {"cpu": "100m"}
+    assert workload.containers[1].resources.limits == {}
+    assert ClusterLoader._build_selector_query(workload.selector) == "app=web,tier In (a,b),!canary"
+
+
+def test_deploymentconfig_selector_is_a_label_map():
+    item = make_item({"selector": {"app": "web"}, "template": {"spec": POD_SPEC}})
+    workload = Workload.from_json(item, "DeploymentConfig")
+
+    assert workload.selector == LabelSelector(match_labels={"app": "web"})
+    assert ClusterLoader._build_selector_query(workload.selector) == "app=web"
+    assert ClusterLoader._build_selector_query(LabelSelector(match_labels={})) is None
+
+
+def test_rollout_with_workload_ref():
+    item = make_item({"workloadRef": {"kind": "Deployment", "name": "web-template"}})
+    workload = Workload.from_json(item, "Rollout")
+
+    assert workload.containers is None
+    assert workload.workload_ref == "web-template"
+
+
+def test_list_scannable_objects_from_raw_json():
+    items = [
+        make_item({"selector": SELECTOR, "template": {"spec": POD_SPEC}}),
+        make_item(
+            {"selector": SELECTOR, "template": {"spec": POD_SPEC}},
+            name="cron-web-1",
+            ownerReferences=[{"kind": "CronJob", "name": "cron-web", "uid": "uid-0"}],
+        ),
+    ]
+    request = MagicMock(return_value=MagicMock(data=json.dumps({"items": items}).encode()))
+
+    loader = ClusterLoader.__new__(ClusterLoader)
+    loader.cluster = "mock-cluster"
+    loader._ClusterLoader__kind_available = {"Job": True}
+    loader._ClusterLoader__hpa_list = {}
+    loader._ClusterLoader__namespaces = "*"
+    loader.executor = None
+    loader.batch = MagicMock(list_job_for_all_namespaces=request)
+
+    with patch("robusta_krr.core.integrations.kubernetes.settings", resources="*", selector=None):
+        objects = asyncio.run(loader._list_all_jobs())
+
+    assert request.call_args.kwargs["_preload_content"] is False
+    # NOTE: The jobs of a CronJob are skipped
+    assert [(object.name, object.container) for object in objects] == [("web", "main"), ("web", "sidecar")]
+    assert objects[0].allocations.requests[ResourceType.CPU] == 0.1
+    assert objects[0].allocations.limits[ResourceType.Memory] == 1024**3
+    assert objects[0].labels == {"team": "a"}
+    assert objects[0].selector == Workload.from_json(items[0], "Job").selector
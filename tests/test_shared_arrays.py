@@ -0,0 +1,61 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from robusta_krr.core.abstract.strategies import RaggedArray, concatenate_metrics
+from robusta_krr.strategies.simple import SimpleStrategy, SimpleStrategySettings
+from robusta_krr.utils.shared_arrays import SharedArrays, attach, run_shared
+
+from conftest import make_object
+
+OBJECT = make_object()
+
+
+def make_history_data(points: int) -> dict:
+    rng = np.random.default_rng(points)
+
+    def pods_data() -> dict:
+        timestamps = np.arange(points, dtype=np.float64)
+        return {f"app-{i}": np.stack([timestamps, rng.random(points)], axis=1) for i in range(3)}
+
+    return {
+        "PercentileCPULoader": pods_data(),
+        "MaxMemoryLoader": pods_data(),
+        "CPUAmountLoader": {f"app-{i}": np.array([[0.0, points]]) for i in range(3)},
+        "MemoryAmountLoader": {f"app-{i}": np.array([[0.0, points]]) for i in range(3)},
+        "Empty": {},
+    }
+
+
+def test_arrays_are_rebuilt_from_the_shared_memory():
+    data = {"metrics": make_history_data(50), "ragged": RaggedArray(np.arange(5.0), np.array([0, 2, 5])), "n": 1}
+
+    with SharedArrays(data) as shared:
+        assert "PercentileCPULoader" in shared.template["metrics"]
+        with attach(shared.name, shared.template) as rebuilt:
+            assert rebuilt["n"] == 1 and rebuilt["metrics"]["Empty"] == {}
+            for metric, pods in data["metrics"].items():
+                for pod, values in pods.items():
+                    np.testing.assert_array_equal(rebuilt["metrics"][metric][pod], values)
+            np.testing.assert_array_equal(rebuilt["ragged"].max(), [1, 4])
+            del rebuilt
+
+
+def test_strategy_runs_in_another_process():
+    strategy = SimpleStrategy(SimpleStrategySettings())
+    history_data = [make_history_data(points) for points in [10, 200]]
+
+    with ProcessPoolExecutor(1) as executor:
+        results = []
+        for data in history_data:
+            with SharedArrays(data) as shared:
+                results.append(executor.submit(run_shared, strategy.run, shared.name, shared.template, OBJECT).result())
+
+        with SharedArrays(concatenate_metrics(history_data)) as shared:
+            batch_results = executor.submit(
+                run_shared, strategy.run_batch, shared.name, shared.template, [OBJECT, OBJECT]
+            ).result()
+
+    assert results[1] == strategy.run(history_data[1], OBJECT)
+    assert results[0][next(iter(results[0]))].info == "Not enough data"
+    assert batch_results[1] == results[1]
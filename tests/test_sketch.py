@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from robusta_krr.utils.sketch import DDSketch
+
+
+@pytest.mark.parametrize("relative_accuracy", [0.01, 0.05])
+def test_quantiles_are_within_the_relative_accuracy(relative_accuracy: float):
+    rng = np.random.default_rng(0)
+    values = np.concatenate([rng.lognormal(-3, 2, 10_000), np.zeros(100)])
+
+    sketch = DDSketch.from_values(values, relative_accuracy)
+
+    assert sketch.count == len(values)
+    for percentile in [0, 1, 50, 66, 95, 99, 100]:
+        expected = np.percentile(values, percentile, method="lower")
+        assert sketch.percentile(percentile) == pytest.approx(expected, rel=relative_accuracy, abs=0)
+    assert sketch.percentile(0) == 0 and sketch.percentile(100) <= values.max()
+
+
+def test_merged_sketches_match_a_single_sketch():
+    rng = np.random.default_rng(0)
+    pods = [rng.random(n) * 10 for n in [100, 1, 2000]]
+
+    merged = DDSketch(0.02)
+    for values in pods:
+        merged.merge(DDSketch.from_values(values, 0.02))
+    single = DDSketch.from_values(np.concatenate(pods), 0.02)
+
+    np.testing.assert_array_equal(merged.keys, single.keys)
+    np.testing.assert_array_equal(merged.counts, single.counts)
+    assert [merged.percentile(p) for p in [50, 95]] == [single.percentile(p) for p in [50, 95]]
+
+    with pytest.raises(ValueError):
+        merged.merge(DDSketch(0.01))
+
+
+def test_memory_is_bounded():
+    sketch = DDSketch(0.01, max_buckets=100)
+    sketch.add(np.logspace(-10, 10, 100_000))
+
+    assert len(sketch.keys) == 100
+    assert sketch.count == 100_000
+    assert sketch.percentile(99) == pytest.approx(np.percentile(np.logspace(-10, 10, 100_000), 99), rel=0.01)
+    assert np.isnan(DDSketch().percentile(50))